@@ -0,0 +1,228 @@
+import bisect
+import itertools
+import math
+import os
+import re
+import uuid
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from indicators import _rolling_moments
+
+OPEN, HIGH, LOW, CLOSE, VOLUME = range(5)
+OHLCV = ("open", "high", "low", "close", "volume")
+SYMBOL_RE = re.compile(r"^[A-Za-z0-9._-]{1,32}$")
+
+# name -> (default, lower bound, upper bound); every sweep parameter must be listed here.
+PARAMETERS = {
+    "fast": (20, 2, 500),
+    "slow": (50, 3, 2000),
+    "stop_loss": (0.02, 0.001, 0.5),
+    "take_profit": (0.0, 0.0, 5.0),
+    "risk_fraction": (0.01, 0.001, 1.0),
+}
+
+
+class BacktestError(ValueError):
+    pass
+
+
+class PriceStore:
+    """OHLCV files (``<symbol>.csv`` or ``.parquet``) converted once to ``.npy`` and memory-mapped.
+
+    Pool workers open the same ``.npy`` read-only, so every process shares
+    the OS page cache instead of receiving a pickled copy of the prices.
+    """
+
+    def __init__(self, data_dir: Path):
+        self.data_dir = Path(data_dir)
+        self.cache_dir = self.data_dir / ".npy"
+
+    def _source(self, symbol: str) -> Optional[Path]:
+        if not SYMBOL_RE.match(symbol):
+            return None
+        for suffix in (".parquet", ".csv"):
+            path = self.data_dir / f"{symbol}{suffix}"
+            if path.is_file():
+                return path
+        return None
+
+    def has(self, symbol: str) -> bool:
+        return self._source(symbol) is not None
+
+    def symbols(self) -> List[str]:
+        if not self.data_dir.is_dir():
+            return []
+        return sorted({
+            path.stem for path in self.data_dir.iterdir()
+            if path.suffix in (".csv", ".parquet") and SYMBOL_RE.match(path.stem)
+        })
+
+    def array_path(self, symbol: str) -> Path:
+        """Path of the ``(rows, 5)`` float64 array for ``symbol``, rebuilt when the source is newer."""
+        source = self._source(symbol)
+        if source is None:
+            raise BacktestError(f"Unknown symbol {symbol!r}")
+        target = self.cache_dir / f"{symbol}.npy"
+        if target.exists() and target.stat().st_mtime >= source.stat().st_mtime:
+            return target
+
+        import pandas as pd
+
+        frame = pd.read_parquet(source) if source.suffix == ".parquet" else pd.read_csv(source)
+        frame.columns = [str(column).strip().lower() for column in frame.columns]
+        missing = [column for column in OHLCV[:4] if column not in frame]
+        if missing:
+            raise BacktestError(f"{source.name} is missing columns: {', '.join(missing)}")
+        if "volume" not in frame:
+            frame["volume"] = 0.0
+        prices = frame[list(OHLCV)].to_numpy(dtype=np.float64)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # Write-then-rename so a concurrent reader never maps a half-written file;
+        # unique per call, as two threads of one process may rebuild the same symbol.
+        partial = target.with_name(f"{target.stem}.{os.getpid()}.{uuid.uuid4().hex[:12]}.tmp.npy")
+        np.save(partial, np.ascontiguousarray(prices))
+        os.replace(partial, target)
+        return target
+
+
+def count_combos(axes: Dict[str, List[float]]) -> int:
+    """Number of combinations with fast < slow, without building them."""
+    slow = sorted(axes["slow"])
+    pairs = sum(len(slow) - bisect.bisect_right(slow, fast) for fast in axes["fast"])
+    return pairs * math.prod(len(values) for name, values in axes.items() if name not in ("fast", "slow"))
+
+
+def grid(sweep: Dict[str, Iterable[float]], max_combos: Optional[int] = None) -> List[Dict[str, float]]:
+    unknown = set(sweep) - set(PARAMETERS)
+    if unknown:
+        raise BacktestError(f"Unknown parameters: {', '.join(sorted(unknown))}")
+    axes = {name: list(sweep.get(name) or [default]) for name, (default, _, _) in PARAMETERS.items()}
+    for name, values in axes.items():
+        _, low, high = PARAMETERS[name]
+        for value in values:
+            if not low <= value <= high:
+                raise BacktestError(f"{name} must be between {low} and {high}")
+            if isinstance(low, int) and value != int(value):
+                raise BacktestError(f"{name} must be a whole number")
+        if isinstance(low, int):
+            axes[name] = [int(value) for value in values]
+    # Checked before the product is built: a sweep over the limit is rejected in O(values).
+    if max_combos is not None and not 1 <= count_combos(axes) <= max_combos:
+        raise BacktestError(f"A sweep must have between 1 and {max_combos} valid combinations (fast < slow)")
+    combos = [dict(zip(axes, values)) for values in itertools.product(*axes.values())]
+    return [combo for combo in combos if combo["fast"] < combo["slow"]]
+
+
+def simulate(prices: np.ndarray, fast: int, slow: int, stop_loss: float, take_profit: float, risk_fraction: float,
+             initial_equity: float = 10_000.0, commission_bps: float = 5.0, slippage_bps: float = 2.0) -> Dict[str, float]:
+    """Long-only SMA crossover with a stop-loss, optional take-profit and fixed-fractional sizing.
+
+    Signals are computed for the whole series at once; trades fill at the
+    next bar's open. Each trade risks ``risk_fraction`` of equity between
+    entry and stop (never more than 100% of equity in the position), and
+    the stop/target scan is one vectorized search per trade.
+    """
+    fast, slow = int(fast), int(slow)
+    n = len(prices)
+    close = np.asarray(prices[:, CLOSE])
+    fast_ma = _rolling_moments(close, fast)[0]
+    slow_ma = _rolling_moments(close, slow)[0]
+    with np.errstate(invalid="ignore"):
+        above = fast_ma > slow_ma
+    # Entry when the fast average crosses above, exit when it crosses back; fill on the next open.
+    crosses = np.flatnonzero(above[1:] != above[:-1]) + 1
+    entries = crosses[above[crosses]] + 1
+    exits = crosses[~above[crosses]] + 1
+
+    opens, highs, lows = prices[:, OPEN], prices[:, HIGH], prices[:, LOW]
+    cost = (commission_bps + slippage_bps) / 10_000
+    equity = initial_equity
+    peak = equity
+    max_drawdown = 0.0
+    returns = []
+    bars_in_market = 0
+    position_end = -1
+    for entry in entries:
+        if entry >= n or entry <= position_end:
+            continue
+        next_exit = exits[np.searchsorted(exits, entry, side="right"):][:1]
+        signal_exit = int(next_exit[0]) if len(next_exit) and next_exit[0] < n else n - 1
+
+        entry_price = opens[entry] * (1 + cost)
+        stop_price = entry_price * (1 - stop_loss)
+        window = slice(entry, signal_exit)
+        hit_stop = lows[window] <= stop_price
+        hit_target = highs[window] >= entry_price * (1 + take_profit) if take_profit else np.zeros_like(hit_stop)
+        hits = np.flatnonzero(hit_stop | hit_target)
+        if len(hits):
+            exit_bar = entry + int(hits[0])
+            if hit_stop[hits[0]]:
+                # Gapping through the stop fills at the open, not the stop.
+                exit_price = min(opens[exit_bar], stop_price) if exit_bar > entry else stop_price
+            else:
+                exit_price = max(opens[exit_bar], entry_price * (1 + take_profit)) if exit_bar > entry else entry_price * (1 + take_profit)
+        else:
+            exit_bar = signal_exit
+            exit_price = opens[exit_bar]
+        exit_price *= 1 - cost
+
+        units = min(equity * risk_fraction / (entry_price - stop_price), equity / entry_price)
+        pnl = units * (exit_price - entry_price)
+        returns.append(pnl / equity)
+        equity += pnl
+        peak = max(peak, equity)
+        max_drawdown = max(max_drawdown, 1 - equity / peak)
+        bars_in_market += exit_bar - entry + 1
+        position_end = exit_bar
+        if equity <= 0:
+            break
+
+    trade_returns = np.array(returns)
+    wins = trade_returns[trade_returns > 0]
+    losses = trade_returns[trade_returns < 0]
+    return {
+        "final_equity": round(float(equity), 2),
+        "total_return": float(equity / initial_equity - 1),
+        "max_drawdown": float(max_drawdown),
+        "trades": len(trade_returns),
+        "win_rate": len(wins) / len(trade_returns) if len(trade_returns) else 0.0,
+        "profit_factor": float(wins.sum() / -losses.sum()) if len(losses) and len(wins) else None,
+        "avg_trade_return": float(trade_returns.mean()) if len(trade_returns) else 0.0,
+        "exposure": float(bars_in_market / n) if n else 0.0,
+    }
+
+
+# path -> (st_mtime_ns, mapping); a rebuilt file is a new inode, so the old mapping would go stale.
+_mapped: Dict[str, Tuple[int, np.ndarray]] = {}
+
+
+def run_chunk(array_path: str, combos: List[Dict[str, float]], settings: Dict[str, float]) -> List[dict]:
+    """Pool task: evaluate a slice of the sweep against the memory-mapped prices."""
+    version = os.stat(array_path).st_mtime_ns
+    cached = _mapped.get(array_path)
+    if cached is None or cached[0] != version:
+        cached = _mapped[array_path] = (version, np.load(array_path, mmap_mode="r"))
+    prices = cached[1]
+    results = []
+    for combo in combos:
+        metrics = simulate(prices, **combo, **settings)
+        results.append({"params": combo, **{key: _finite(value) for key, value in metrics.items()}})
+    return results
+
+
+def _finite(value):
+    return None if isinstance(value, float) and not math.isfinite(value) else value
+
+
+def synthetic_prices(rows: int, seed: int = 7) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0001, 0.01, rows)))
+    opens = np.concatenate(([close[0]], close[:-1])) * (1 + rng.normal(0, 0.001, rows))
+    spread = np.abs(rng.normal(0, 0.004, rows)) * close
+    prices = np.column_stack([
+        opens, np.maximum(opens, close) + spread, np.minimum(opens, close) - spread, close, rng.integers(1, 1000, rows)
+    ])
+    return prices.astype(np.float64)
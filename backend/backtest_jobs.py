@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import math
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+ACTIVE = ("queued", "running")
+STALE_ERROR = "Backtest worker stopped before the job finished"
+
+
+class BacktestLimitExceeded(Exception):
+    pass
+
+
+class BacktestRunner:
+    """Runs backtest jobs stored in ``backtest_jobs`` on a shared process pool.
+
+    numpy and the pool are only started by the first job. Each job keeps at
+    most ``max_workers`` chunks in flight, so concurrent jobs interleave on
+    the pool instead of queueing behind one large sweep. Jobs are executed
+    by the worker that accepted them and heartbeat on a timer while
+    running. A user's concurrent jobs each hold one of ``max_active`` slots,
+    claimed by inserting with a unique ``(user_id, slot)`` among active jobs,
+    so simultaneous submits cannot overshoot the limit; a job whose worker
+    died is marked failed, freeing its slot, once its heartbeat goes stale.
+    """
+
+    def __init__(self, collection, data_dir: Path, max_workers: Optional[int] = None,
+                 heartbeat_seconds: float = 2.0, stale_after_seconds: float = 60.0,
+                 retention: timedelta = timedelta(days=7)):
+        self.collection = collection
+        self.data_dir = Path(data_dir)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.heartbeat_seconds = heartbeat_seconds
+        self.stale_after_seconds = stale_after_seconds
+        self.retention = retention
+        self._pool = None
+        self._store = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def store(self):
+        if self._store is None:
+            from backtest import PriceStore
+            self._store = PriceStore(self.data_dir)
+        return self._store
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            from concurrent.futures import ProcessPoolExecutor
+            from multiprocessing import get_context
+            # spawn: forking a process with a running event loop and Mongo client is unsafe.
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=get_context("spawn"))
+        return self._pool
+
+    @property
+    def running(self) -> int:
+        return len(self._tasks)
+
+    def _stale_before(self) -> datetime:
+        return datetime.now(timezone.utc) - timedelta(seconds=self.stale_after_seconds)
+
+    async def submit(self, user_id: str, symbol: str, combos: List[Dict[str, float]], settings: Dict[str, float],
+                     max_active: int) -> dict:
+        now = datetime.now(timezone.utc)
+        await self.collection.update_many(
+            {"user_id": user_id, "active": True, "heartbeat_at": {"$lt": self._stale_before()}},
+            {"$set": {"status": "failed", "error": STALE_ERROR, "finished_at": now}, "$unset": {"active": ""}},
+        )
+        job = {
+            "job_id": f"bt_{uuid.uuid4().hex[:16]}",
+            "user_id": user_id,
+            "symbol": symbol,
+            "settings": settings,
+            "status": "queued",
+            "total": len(combos),
+            "completed": 0,
+            "results": None,
+            "error": None,
+            "created_at": now,
+            "heartbeat_at": now,
+            "finished_at": None,
+            "expires_at": now + self.retention,
+        }
+        for slot in range(max_active):
+            try:
+                await self.collection.insert_one({**job, "slot": slot, "active": True})
+                break
+            except DuplicateKeyError:
+                continue
+        else:
+            raise BacktestLimitExceeded(f"At most {max_active} backtest(s) can run at once on your plan")
+        task = asyncio.create_task(self._run(job["job_id"], symbol, combos, settings))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def get(self, job_id: str, user_id: str) -> Optional[dict]:
+        job = await self.collection.find_one({"job_id": job_id, "user_id": user_id},
+                                             {"_id": 0, "slot": 0, "active": 0})
+        if job and job["status"] in ACTIVE and job["heartbeat_at"] < self._stale_before():
+            job.update(status="failed", error=STALE_ERROR)
+        return job
+
+    async def _update(self, job_id: str, **fields):
+        await self.collection.update_one({"job_id": job_id}, {"$set": fields})
+
+    async def _finish(self, job_id: str, **fields):
+        """Record the outcome and free the job's slot."""
+        await self.collection.update_one({"job_id": job_id},
+                                         {"$set": {**fields, "finished_at": datetime.now(timezone.utc)},
+                                          "$unset": {"active": ""}})
+
+    async def _heartbeat(self, job_id: str, results: List[dict]):
+        # On a timer rather than per chunk, so a chunk that runs (or waits for
+        # the shared pool) longer than stale_after_seconds is not reported dead.
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            try:
+                await self.collection.update_one(
+                    {"job_id": job_id, "active": True},
+                    {"$set": {"completed": len(results), "heartbeat_at": datetime.now(timezone.utc)}},
+                )
+            except Exception:
+                logger.warning("Could not heartbeat backtest %s", job_id, exc_info=True)
+
+    async def _run(self, job_id: str, symbol: str, combos: List[Dict[str, float]], settings: Dict[str, Any]):
+        import backtest
+
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        results: List[dict] = []
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, results))
+        try:
+            array_path = str(await loop.run_in_executor(None, self.store.array_path, symbol))
+            await self._update(job_id, status="running", heartbeat_at=datetime.now(timezone.utc))
+            size = max(1, min(50, math.ceil(len(combos) / (self.max_workers * 4))))
+            chunks = [combos[i:i + size] for i in range(0, len(combos), size)]
+            in_flight = asyncio.Semaphore(self.max_workers)
+
+            async def run(chunk):
+                async with in_flight:
+                    results.extend(await loop.run_in_executor(self.pool, backtest.run_chunk, array_path, chunk, settings))
+
+            await asyncio.gather(*(run(chunk) for chunk in chunks))
+            heartbeat.cancel()
+            results.sort(key=lambda result: result["total_return"], reverse=True)
+            await self._finish(job_id, status="done", completed=len(results), results=results,
+                               duration_seconds=time.perf_counter() - started)
+        except asyncio.CancelledError:
+            await asyncio.shield(self._finish(job_id, status="failed", error="Server shut down during the backtest"))
+            raise
+        except backtest.BacktestError as e:
+            await self._finish(job_id, status="failed", error=str(e))
+        except Exception:
+            logger.exception("Backtest %s failed", job_id)
+            await self._finish(job_id, status="failed", error="Backtest failed")
+        finally:
+            heartbeat.cancel()
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,426 @@
+import argparse
+import asyncio
+import hashlib
+import io
+import logging
+import math
+import os
+import re
+import unicodedata
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+# Part of every content hash: bump it when rendering changes so the next import re-renders every post.
+RENDER_VERSION = 1
+WORDS_PER_MINUTE = 230
+EXCERPT_CHARS = 200
+IMAGE_WIDTHS = (480, 960, 1600)
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+DEFAULT_AUTHOR = "Trading Academy Team"
+IMAGE_SIZES = "(max-width: 768px) 100vw, 768px"
+
+FRONT_MATTER_RE = re.compile(r"\A---[ \t]*\r?\n(.*?)\r?\n---[ \t]*(?:\r?\n|\Z)", re.S)
+EXTERNAL_RE = re.compile(r"^[a-z][a-z0-9+.-]*:|^//|^/", re.I)
+
+
+class ContentError(ValueError):
+    pass
+
+
+def slugify(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode().lower()
+    return re.sub(r"[^a-z0-9]+", "-", text).strip("-")
+
+
+def split_front_matter(text: str) -> Tuple[dict, str]:
+    """YAML between leading ``---`` lines, and the Markdown body after it."""
+    match = FRONT_MATTER_RE.match(text)
+    if match is None:
+        return {}, text
+    import yaml
+
+    try:
+        meta = yaml.safe_load(match.group(1)) or {}
+    except yaml.YAMLError as e:
+        raise ContentError(f"Invalid front matter: {e}")
+    if not isinstance(meta, dict):
+        raise ContentError("Front matter must be a mapping")
+    return meta, text[match.end():]
+
+
+_markdown = None
+
+
+def markdown():
+    """CommonMark plus tables and strikethrough. Raw HTML is escaped and unsafe link schemes are dropped."""
+    global _markdown
+    if _markdown is None:
+        from markdown_it import MarkdownIt
+
+        md = MarkdownIt("commonmark", {"html": False}).enable(["table", "strikethrough"])
+        md.add_render_rule("image", _render_image)
+        md.add_render_rule("link_open", _render_link_open)
+        _markdown = md
+    return _markdown
+
+
+def _render_image(renderer, tokens, idx, options, env):
+    from markdown_it.common.utils import escapeHtml
+
+    token = tokens[idx]
+    alt = renderer.renderInlineAsText(token.children or [], options, env)
+    image = env.get("images", {}).get(token.attrGet("src"))
+    if image is None:
+        token.attrSet("alt", alt)
+        token.attrSet("loading", "lazy")
+        return renderer.renderToken(tokens, idx, options, env)
+    title = token.attrGet("title")
+    return (
+        f'<picture><source type="image/webp" srcset="{escapeHtml(image["webp_srcset"])}" sizes="{IMAGE_SIZES}">'
+        f'<img src="{escapeHtml(image["src"])}" width="{image["width"]}" height="{image["height"]}" '
+        f'alt="{escapeHtml(alt)}"' + (f' title="{escapeHtml(title)}"' if title else "") +
+        ' loading="lazy" decoding="async"></picture>'
+    )
+
+
+def _render_link_open(renderer, tokens, idx, options, env):
+    href = tokens[idx].attrGet("href") or ""
+    if href.startswith(("http://", "https://", "//")):
+        tokens[idx].attrSet("rel", "nofollow noopener")
+    return renderer.renderToken(tokens, idx, options, env)
+
+
+def is_local(src: str) -> bool:
+    return bool(src) and not EXTERNAL_RE.match(src)
+
+
+def local_images(tokens) -> List[str]:
+    found = []
+    for token in tokens:
+        for child in token.children or []:
+            if child.type == "image" and is_local(child.attrGet("src") or "") and child.attrGet("src") not in found:
+                found.append(child.attrGet("src"))
+    return found
+
+
+def _inline_text(token) -> str:
+    return "".join(child.content for child in token.children or [] if child.type in ("text", "code_inline"))
+
+
+def render(tokens, images: Dict[str, dict]) -> dict:
+    """HTML, table of contents, excerpt and reading time for parsed Markdown.
+
+    ``images`` maps a local image path as written in the Markdown to its
+    responsive variants; other images are left pointing where they point.
+    """
+    toc = []
+    ids: Dict[str, int] = {}
+    words = 0
+    first_paragraph = None
+    for i, token in enumerate(tokens):
+        if token.type == "inline":
+            text = _inline_text(token)
+            words += len(text.split())
+            if first_paragraph is None and tokens[i - 1].type == "paragraph_open" and text.strip():
+                first_paragraph = " ".join(text.split())
+        elif token.type in ("fence", "code_block"):
+            words += len(token.content.split())
+        elif token.type == "heading_open" and token.tag in ("h2", "h3"):
+            title = _inline_text(tokens[i + 1]).strip()
+            anchor = slugify(title) or "section"
+            ids[anchor] = ids.get(anchor, 0) + 1
+            if ids[anchor] > 1:
+                anchor = f"{anchor}-{ids[anchor]}"
+            token.attrSet("id", anchor)
+            toc.append({"level": int(token.tag[1]), "id": anchor, "title": title})
+    html = markdown().renderer.render(tokens, markdown().options, {"images": images})
+    return {
+        "content_html": html,
+        "toc": toc,
+        "excerpt": truncate(first_paragraph or "", EXCERPT_CHARS),
+        "word_count": words,
+        "reading_time_minutes": max(1, math.ceil(words / WORDS_PER_MINUTE)),
+    }
+
+
+def truncate(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(" ", 1)[0].rstrip(".,;:!?-") + "…"
+
+
+def responsive_image(variants: dict, media_url: str) -> dict:
+    return {
+        "src": f"{media_url}/{variants['fallback']}",
+        "width": variants["width"],
+        "height": variants["height"],
+        "webp_srcset": ", ".join(f"{media_url}/{name} {width}w" for name, width in variants["webp"]),
+    }
+
+
+def make_variants(source: str, output_dir: str, widths=IMAGE_WIDTHS) -> dict:
+    """Write WebP copies of ``source`` at each of ``widths`` (never upscaled) and a JPEG/PNG fallback.
+
+    Runs in a worker process. Files are named after the source's content
+    hash, so an image already processed by an earlier import is only
+    opened to read its size.
+    """
+    from PIL import Image, ImageOps
+
+    data = Path(source).read_bytes()
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    out = Path(output_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    with Image.open(io.BytesIO(data)) as image:
+        width, height = image.size
+        transposed = image.getexif().get(0x0112) in (5, 6, 7, 8)
+        if transposed:
+            width, height = height, width
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        targets = sorted({min(target, width) for target in widths})
+        sizes = [(target, max(1, round(height * target / width))) for target in targets]
+        fallback = f"{digest}-{targets[-1]}.{'png' if has_alpha else 'jpg'}"
+        webp = [(f"{digest}-{target}.webp", target) for target in targets]
+        missing = [name for name, _ in webp if not (out / name).exists()] + [fallback] * (not (out / fallback).exists())
+        if missing:
+            # JPEG decoders can scale by 1/2..1/8 while decoding, far cheaper than resizing the full image.
+            largest = sizes[-1][::-1] if transposed else sizes[-1]
+            image.draft("RGB", largest)
+            image = ImageOps.exif_transpose(image).convert("RGBA" if has_alpha else "RGB")
+            for (name, _), size in zip(webp, sizes):
+                if name in missing:
+                    _save(image.resize(size, Image.LANCZOS, reducing_gap=3.0) if image.size != size else image,
+                          out / name, "WEBP", quality=WEBP_QUALITY, method=4)
+            if fallback in missing:
+                resized = image.resize(sizes[-1], Image.LANCZOS, reducing_gap=3.0) if image.size != sizes[-1] else image
+                if has_alpha:
+                    _save(resized, out / fallback, "PNG", optimize=True)
+                else:
+                    _save(resized, out / fallback, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return {"digest": digest, "width": sizes[-1][0], "height": sizes[-1][1], "webp": webp, "fallback": fallback}
+
+
+def _save(image, path: Path, format: str, **options):
+    partial = path.with_name(path.name + f".{os.getpid()}.tmp")
+    image.save(partial, format, **options)
+    os.replace(partial, path)
+
+
+def scan_post(path: str, root: str) -> dict:
+    """Parse one Markdown file and hash everything its rendering depends on (runs in a worker process)."""
+    file = Path(path)
+    text = file.read_text(encoding="utf-8")
+    meta, body = split_front_matter(text)
+    slug = str(meta.get("slug") or slugify(file.stem))
+    if not slug or not re.fullmatch(r"[a-z0-9]+(?:-[a-z0-9]+)*", slug):
+        raise ContentError(f"Invalid slug {slug!r}")
+    if not meta.get("title"):
+        raise ContentError("Front matter needs a title")
+    digest = hashlib.sha256(f"{RENDER_VERSION}\0{text}".encode())
+    sources = local_images(markdown().parse(body))
+    cover = str(meta.get("image") or "")
+    if is_local(cover):
+        sources.insert(0, cover)
+    images = {}
+    base, root_dir = file.parent.resolve(), Path(root).resolve()
+    for src in sources:
+        resolved = (base / src).resolve()
+        if not resolved.is_relative_to(root_dir) or not resolved.is_file():
+            raise ContentError(f"Image not found: {src}")
+        images[src] = str(resolved)
+        digest.update(b"\0" + hashlib.sha256(resolved.read_bytes()).digest())
+    return {"file": os.path.relpath(file, root), "slug": slug, "meta": meta, "body": body, "images": images, "content_hash": digest.hexdigest()}
+
+
+def build_post(scanned: dict, variants: Dict[str, dict], media_url: str) -> dict:
+    """The stored post for a scanned file, with everything a read needs precomputed (runs in a worker process)."""
+    meta = scanned["meta"]
+    images = {src: responsive_image(variants[path], media_url) for src, path in scanned["images"].items()}
+    rendered = render(markdown().parse(scanned["body"]), images)
+    cover = str(meta.get("image") or "")
+    tags = meta.get("tags") or []
+    post = {
+        "post_id": str(meta.get("post_id") or f"post_{hashlib.sha1(scanned['slug'].encode()).hexdigest()[:12]}"),
+        "slug": scanned["slug"],
+        "title": str(meta["title"]),
+        "author": str(meta.get("author") or DEFAULT_AUTHOR),
+        "tags": [str(tag) for tag in (tags if isinstance(tags, list) else [tags])],
+        "content": scanned["body"],
+        **rendered,
+        "image_url": images[cover]["src"] if cover in images else cover,
+        "image": images.get(cover),
+        "content_hash": scanned["content_hash"],
+        "source_file": scanned["file"],
+    }
+    if meta.get("excerpt"):
+        post["excerpt"] = truncate(" ".join(str(meta["excerpt"]).split()), EXCERPT_CHARS)
+    published = meta.get("published_at") or meta.get("date")
+    if isinstance(published, str):
+        try:
+            published = datetime.fromisoformat(published)
+        except ValueError:
+            raise ContentError(f"Invalid published_at {published!r}")
+    if isinstance(published, date) and not isinstance(published, datetime):
+        published = datetime(published.year, published.month, published.day)
+    if isinstance(published, datetime):
+        post["published_at"] = published if published.tzinfo else published.replace(tzinfo=timezone.utc)
+    return post
+
+
+class BlogImporter:
+    """Imports a directory of Markdown posts, rendering everything reads need once, at write time.
+
+    Parsing, image variants and rendering run in a process pool. A post
+    whose file, referenced images and renderer version hash to its stored
+    ``content_hash`` is skipped without being rendered.
+    """
+
+    def __init__(self, collection, media_dir: Path, media_url: str, max_workers: Optional[int] = None):
+        self.collection = collection
+        self.media_dir = Path(media_dir)
+        self.media_url = media_url.rstrip("/")
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._pool = None
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            from concurrent.futures import ProcessPoolExecutor
+            from multiprocessing import get_context
+            # spawn: forking a process with a running event loop and Mongo client is unsafe.
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=get_context("spawn"))
+        return self._pool
+
+    async def _map(self, function, *argument_lists):
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(
+            *(loop.run_in_executor(self.pool, function, *arguments) for arguments in zip(*argument_lists)),
+            return_exceptions=True,
+        )
+
+    async def import_directory(self, directory: Path, force: bool = False) -> dict:
+        """Import every ``*.md`` under ``directory``; returns the changed slugs and per-file errors."""
+        files = sorted(str(path) for path in Path(directory).rglob("*.md"))
+        root = str(directory)
+        errors = []
+        scanned = []
+        for path, result in zip(files, await self._map(scan_post, files, [root] * len(files))):
+            if isinstance(result, Exception):
+                errors.append({"file": os.path.relpath(path, root), "error": str(result)})
+            else:
+                scanned.append(result)
+        by_slug: Dict[str, dict] = {}
+        for post in scanned:
+            if post["slug"] in by_slug:
+                errors.append({"file": post["file"], "error": f"Duplicate slug {post['slug']!r}"})
+            else:
+                by_slug[post["slug"]] = post
+        stored = {doc["slug"]: doc.get("content_hash") async for doc in
+                  self.collection.find({"slug": {"$in": list(by_slug)}}, {"_id": 0, "slug": 1, "content_hash": 1})}
+        changed = [post for slug, post in by_slug.items() if force or stored.get(slug) != post["content_hash"]]
+
+        sources = sorted({path for post in changed for path in post["images"].values()})
+        results = await self._map(make_variants, sources, [str(self.media_dir)] * len(sources))
+        variants = dict(zip(sources, results))
+        ready = []
+        for post in changed:
+            failed = next((f"{src}: {variants[path]}" for src, path in post["images"].items()
+                           if isinstance(variants[path], Exception)), None)
+            if failed:
+                errors.append({"file": post["file"], "error": f"Image processing failed for {failed}"})
+            else:
+                ready.append(post)
+
+        built = await self._map(
+            build_post, ready, [{path: variants[path] for path in post["images"].values()} for post in ready],
+            [self.media_url] * len(ready),
+        )
+        now = datetime.now(timezone.utc)
+        operations = []
+        imported = []
+        for post, doc in zip(ready, built):
+            if isinstance(doc, Exception):
+                errors.append({"file": post["file"], "error": str(doc)})
+                continue
+            on_insert = {"post_id": doc.pop("post_id"), "created_at": now}
+            if "published_at" not in doc:
+                on_insert["published_at"] = now
+            operations.append(UpdateOne({"slug": doc["slug"]}, {"$set": {**doc, "updated_at": now}, "$setOnInsert": on_insert},
+                                        upsert=True))
+            imported.append(post)
+        if operations:
+            try:
+                await self.collection.bulk_write(operations, ordered=False)
+            except BulkWriteError as e:
+                # e.g. a front matter post_id already used by another slug.
+                failed = {error["index"]: error.get("errmsg", "Write failed") for error in e.details.get("writeErrors", [])}
+                errors.extend({"file": imported[index]["file"], "error": message} for index, message in failed.items())
+                imported = [post for index, post in enumerate(imported) if index not in failed]
+        imported = [post["slug"] for post in imported]
+        return {
+            "created": [slug for slug in imported if slug not in stored],
+            "updated": [slug for slug in imported if slug in stored],
+            "unchanged": len(by_slug) - len(changed),
+            "images": len(sources),
+            "errors": errors,
+        }
+
+    async def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+async def render_stored_posts(db) -> dict:
+    """Precompute HTML, TOC and reading time for posts stored before imports rendered them."""
+    rendered = 0
+    collection = db.blog_posts
+    async for post in collection.find({"content_html": {"$exists": False}}, {"_id": 1, "content": 1, "excerpt": 1}):
+        fields = render(markdown().parse(post.get("content") or ""), {})
+        if post.get("excerpt"):
+            del fields["excerpt"]
+        await collection.update_one({"_id": post["_id"]}, {"$set": fields})
+        rendered += 1
+    return {"rendered": rendered}
+
+
+async def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Import blog posts from a directory of Markdown files")
+    parser.add_argument("directory", type=Path)
+    parser.add_argument("--force", action="store_true", help="re-render posts whose content hash is unchanged")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    root = Path(__file__).parent
+    load_dotenv(root / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+    importer = BlogImporter(
+        client[os.environ['DB_NAME']].blog_posts,
+        Path(os.environ.get('BLOG_MEDIA_DIR', root / 'media' / 'blog')),
+        os.environ.get('BLOG_MEDIA_URL', '/api/media/blog'),
+        args.workers,
+    )
+    try:
+        report = await importer.import_directory(args.directory, args.force)
+    finally:
+        await importer.close()
+        client.close()
+    print(f"created {len(report['created'])}, updated {len(report['updated'])}, unchanged {report['unchanged']}, "
+          f"images {report['images']}, errors {len(report['errors'])}")
+    for error in report["errors"]:
+        print(f"  {error['file']}: {error['error']}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
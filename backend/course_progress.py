@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class ProgressQueueFull(Exception):
+    pass
+
+
+def merge_lesson(lessons: Dict[str, dict], lesson_id: str, update: dict):
+    """Fold ``update`` into ``lessons[lesson_id]``: furthest position, first completion, latest activity."""
+    lesson = lessons.get(lesson_id)
+    if lesson is None:
+        lessons[lesson_id] = dict(update)
+        return
+    lesson["position_seconds"] = max(lesson.get("position_seconds", 0), update.get("position_seconds", 0))
+    lesson["updated_at"] = max(lesson["updated_at"], update["updated_at"])
+    if update.get("completed"):
+        lesson["completed"] = True
+        lesson["completed_at"] = min(lesson.get("completed_at") or update["completed_at"], update["completed_at"])
+
+
+def merge_progress(progress: dict, partial: dict):
+    """Fold a pending partial document into a (cached) course progress document."""
+    lessons = progress.setdefault("lessons", {})
+    for lesson_id, update in partial["lessons"].items():
+        merge_lesson(lessons, lesson_id, update)
+    if partial["updated_at"] >= progress.get("updated_at", partial["updated_at"]):
+        progress["updated_at"] = partial["updated_at"]
+        progress["last_lesson_id"] = partial["last_lesson_id"]
+        progress["last_position_seconds"] = partial["last_position_seconds"]
+
+
+def progress_update(partial: dict) -> List[dict]:
+    """One upsert (an update pipeline) for everything pending for a (user, course).
+
+    Applies the same rules as ``merge_progress`` on the server, so flushes
+    from several workers commute: the resume point only moves if this
+    partial is at least as recent as the stored ``updated_at`` (every
+    expression in the stage sees the document as it was before it).
+    """
+    newer = {"$gte": [partial["updated_at"], {"$ifNull": ["$updated_at", EPOCH]}]}
+    stage: Dict[str, Any] = {
+        "updated_at": {"$max": ["$updated_at", partial["updated_at"]]},
+        "last_lesson_id": {"$cond": [newer, {"$literal": partial["last_lesson_id"]}, "$last_lesson_id"]},
+        "last_position_seconds": {"$cond": [newer, partial["last_position_seconds"], "$last_position_seconds"]},
+    }
+    for lesson_id, lesson in partial["lessons"].items():
+        path = f"lessons.{lesson_id}"
+        stage[f"{path}.position_seconds"] = {"$max": [f"${path}.position_seconds", lesson["position_seconds"]]}
+        stage[f"{path}.updated_at"] = {"$max": [f"${path}.updated_at", lesson["updated_at"]]}
+        if lesson.get("completed"):
+            stage[f"{path}.completed"] = {"$literal": True}
+            stage[f"{path}.completed_at"] = {"$min": [f"${path}.completed_at", lesson["completed_at"]]}
+    return [{"$set": stage}]
+
+
+class ProgressCache:
+    """Bounded LRU of user_id -> {course_id: progress}, kept current with the user's own events."""
+
+    def __init__(self, maxsize: int = 100_000, ttl: float = 30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[Dict[str, dict], float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user_id: str) -> Optional[Dict[str, dict]]:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[1] < time.monotonic():
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry[0]
+
+    def peek(self, user_id: str) -> Optional[Dict[str, dict]]:
+        entry = self._entries.get(user_id)
+        return entry[0] if entry is not None else None
+
+    def set(self, user_id: str, courses: Dict[str, dict]):
+        self._entries[user_id] = (courses, time.monotonic() + self.ttl)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+class ProgressIngestor:
+    """Coalesces lesson progress events per (user, course) and flushes them as bulk upserts.
+
+    Events are deduplicated on (user_id, event_id) over the last
+    ``dedupe_size`` events, so client retries of a batch are harmless. A
+    learner's heartbeats between two flushes become a single upsert of
+    their course document. Progress accepted since the last flush (one
+    ``flush_interval``) is lost if the process dies; shutdown flushes it.
+    """
+
+    def __init__(self, collection, cache: ProgressCache, flush_interval: float = 5.0, max_pending: int = 200_000,
+                 dedupe_size: int = 1_000_000):
+        self.collection = collection
+        self.cache = cache
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.dedupe_size = dedupe_size
+        self.accepted = 0
+        self.duplicates = 0
+        self.flushes = 0
+        self.writes = 0
+        self.errors = 0
+        self.last_flush_seconds = 0.0
+        self._pending: Dict[str, Dict[str, dict]] = {}
+        self._pending_count = 0
+        self._seen: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+        self._stopping = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        return self._pending_count
+
+    def submit(self, user_id: str, events: Iterable[dict]) -> Dict[str, int]:
+        """Events: ``course_id``, ``lesson_id``, ``event_id``, ``position_seconds``, ``completed``, ``at``."""
+        accepted = duplicates = 0
+        cached = self.cache.peek(user_id)
+        for event in events:
+            seen_key = (user_id, event["event_id"])
+            if seen_key in self._seen:
+                duplicates += 1
+                continue
+            courses = self._pending.setdefault(user_id, {})
+            partial = courses.get(event["course_id"])
+            if partial is None:
+                if self._pending_count >= self.max_pending:
+                    raise ProgressQueueFull()
+                partial = courses[event["course_id"]] = {"lessons": {}, "updated_at": event["at"]}
+                self._pending_count += 1
+            self._seen[seen_key] = None
+            if len(self._seen) > self.dedupe_size:
+                self._seen.popitem(last=False)
+
+            at = event["at"]
+            update = {"position_seconds": event["position_seconds"], "updated_at": at}
+            if event.get("completed"):
+                update.update(completed=True, completed_at=at)
+            merge_lesson(partial["lessons"], event["lesson_id"], update)
+            if at >= partial["updated_at"] or "last_lesson_id" not in partial:
+                partial.update(updated_at=at, last_lesson_id=event["lesson_id"], last_position_seconds=event["position_seconds"])
+            if cached is not None:
+                single = {"lessons": {event["lesson_id"]: update}, "updated_at": at,
+                          "last_lesson_id": event["lesson_id"], "last_position_seconds": event["position_seconds"]}
+                merge_progress(cached.setdefault(event["course_id"], {"course_id": event["course_id"]}), single)
+            accepted += 1
+        self.accepted += accepted
+        self.duplicates += duplicates
+        return {"accepted": accepted, "duplicates": duplicates}
+
+    async def load(self, user_id: str) -> Dict[str, dict]:
+        """All of a user's course progress (one indexed query on a miss), including unflushed events."""
+        courses = self.cache.get(user_id)
+        if courses is not None:
+            return courses
+        courses = {doc["course_id"]: doc async for doc in self.collection.find({"user_id": user_id}, {"_id": 0, "user_id": 0})}
+        for course_id, partial in self._pending.get(user_id, {}).items():
+            merge_progress(courses.setdefault(course_id, {"course_id": course_id}), partial)
+        self.cache.set(user_id, courses)
+        return courses
+
+    async def flush(self):
+        pending, self._pending, self._pending_count = self._pending, {}, 0
+        if not pending:
+            return
+        operations = [
+            UpdateOne({"user_id": user_id, "course_id": course_id}, progress_update(partial), upsert=True)
+            for user_id, courses in pending.items() for course_id, partial in courses.items()
+        ]
+        started = time.perf_counter()
+        try:
+            await self.collection.bulk_write(operations, ordered=False)
+        except Exception:
+            self.errors += 1
+            logger.exception("Failed to flush progress for %d learners; retrying next interval", len(operations))
+            for user_id, courses in pending.items():
+                current = self._pending.setdefault(user_id, {})
+                for course_id, partial in courses.items():
+                    if course_id in current:
+                        merge_progress(partial, current[course_id])
+                    else:
+                        self._pending_count += 1
+                    current[course_id] = partial
+            return
+        self.last_flush_seconds = time.perf_counter() - started
+        self.flushes += 1
+        self.writes += len(operations)
+
+    def start(self):
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._stopping.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            waiter = asyncio.ensure_future(self._stopping.wait())
+            try:
+                await asyncio.wait({waiter}, timeout=self.flush_interval)
+            finally:
+                waiter.cancel()
+            await self.flush()
+
+    def stats(self) -> dict:
+        return {"accepted": self.accepted, "duplicates": self.duplicates, "pending": self.pending,
+                "flushes": self.flushes, "writes": self.writes, "errors": self.errors}
+
+
+def resume_point(courses: Dict[str, dict]) -> Optional[dict]:
+    """The lesson and position the user was most recently active in."""
+    latest = max(courses.values(), key=lambda progress: progress["updated_at"], default=None)
+    if latest is None:
+        return None
+    return {
+        "course_id": latest["course_id"],
+        "lesson_id": latest["last_lesson_id"],
+        "position_seconds": latest["last_position_seconds"],
+        "updated_at": latest["updated_at"],
+    }
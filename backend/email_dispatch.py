@@ -0,0 +1,829 @@
+import argparse
+import asyncio
+import base64
+import logging
+import os
+import random
+import re
+import socket
+import ssl
+import time
+import uuid
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from email.utils import formatdate
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pymongo import DeleteOne, ReturnDocument, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+WELCOME_JOB_ID = "welcome"
+WELCOME_SUBJECT = "Welcome to Trading Academy"
+WELCOME_BODY = """Hi {name},
+
+Thanks for signing up! Your free beginner trading course is waiting for you:
+five short lessons on markets, charts, risk management, psychology and
+building your first trading plan.
+
+See you inside,
+The Trading Academy Team
+"""
+
+
+class SmtpError(Exception):
+    """A refused SMTP command; code 0 means the connection failed."""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+    @property
+    def transient(self) -> bool:
+        return self.code < 500
+
+
+NOT_SENT = SmtpError(0, "Not sent")
+
+
+class LeaseLost(Exception):
+    pass
+
+
+@dataclass
+class Message:
+    recipient: str
+    data: bytes
+    attempts: int = 0
+    error: Optional[SmtpError] = field(default=NOT_SENT, repr=False)
+
+    @property
+    def domain(self) -> str:
+        return self.recipient.rpartition("@")[2].lower()
+
+
+class SmtpConnection:
+    """Minimal asyncio SMTP client: EHLO, implicit TLS or STARTTLS, AUTH PLAIN and PIPELINING."""
+
+    def __init__(self, host: str, port: int, tls: str = "none", username: Optional[str] = None,
+                 password: Optional[str] = None, timeout: float = 30.0, local_hostname: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.tls = tls
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.local_hostname = local_hostname or socket.getfqdn()
+        self.pipelining = False
+        self.chunking = False
+        self.sent = 0
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def connect(self):
+        context = ssl.create_default_context() if self.tls == "ssl" else None
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=context), self.timeout
+        )
+        await asyncio.wait_for(self._handshake(), self.timeout)
+
+    async def _handshake(self):
+        await self._expect(220)
+        extensions = await self._ehlo()
+        if self.tls == "starttls":
+            await self._command(b"STARTTLS", 220)
+            await self.writer.start_tls(ssl.create_default_context())
+            extensions = await self._ehlo()
+        if self.username:
+            token = base64.b64encode(f"\0{self.username}\0{self.password or ''}".encode()).decode()
+            await self._command(f"AUTH PLAIN {token}".encode(), 235)
+        self.pipelining = "PIPELINING" in extensions
+        self.chunking = "CHUNKING" in extensions
+
+    async def _ehlo(self) -> List[str]:
+        _, text = await self._command(f"EHLO {self.local_hostname}".encode(), 250)
+        return [line.split(" ")[0].upper() for line in text.splitlines()[1:]]
+
+    async def _reply(self) -> Tuple[int, str]:
+        lines = []
+        while True:
+            line = await self.reader.readline()
+            if not line.endswith(b"\n"):
+                raise SmtpError(0, "Connection closed by server")
+            lines.append(line[4:].strip().decode(errors="replace"))
+            if line[3:4] != b"-":
+                return int(line[:3]), "\n".join(lines)
+
+    async def _expect(self, code: int) -> Tuple[int, str]:
+        reply = await self._reply()
+        if reply[0] != code:
+            raise SmtpError(*reply)
+        return reply
+
+    async def _command(self, line: bytes, code: int) -> Tuple[int, str]:
+        self.writer.write(line + b"\r\n")
+        return await self._expect(code)
+
+    @staticmethod
+    def _data(data: bytes) -> bytes:
+        data = (b"." + data if data.startswith(b".") else data).replace(b"\n.", b"\n..")
+        return data + (b".\r\n" if data.endswith(b"\r\n") else b"\r\n.\r\n")
+
+    async def send_many(self, sender: str, messages: List[Message]):
+        """Send ``messages`` in order, setting each one's ``error`` to None or the server's refusal.
+
+        With PIPELINING and CHUNKING (BDAT) the whole batch is one write and
+        the replies are read afterwards. With PIPELINING alone a message's
+        MAIL/RCPT/DATA go out in the same write as the previous message's
+        body, one round trip per message instead of four. A connection
+        failure raises, leaving the messages not yet confirmed with their
+        error unchanged.
+        """
+        if self.pipelining and self.chunking:
+            send = self._chunked
+        else:
+            send = self._pipelined if self.pipelining else self._sequential
+        await asyncio.wait_for(send(sender, messages), self.timeout + len(messages))
+
+    async def _chunked(self, sender: str, messages: List[Message]):
+        mail = f"MAIL FROM:<{sender}>\r\n".encode()
+        self.writer.write(b"".join(
+            b"%sRCPT TO:<%s>\r\nBDAT %d LAST\r\n%s" % (mail, message.recipient.encode(), len(message.data), message.data)
+            for message in messages
+        ))
+        for message in messages:
+            replies = [await self._reply() for _ in range(3)]
+            refused = next((reply for reply in replies if reply[0] != 250), None)
+            message.error = SmtpError(*refused) if refused else None
+            self.sent += 1
+        await self.writer.drain()
+
+    async def _pipelined(self, sender: str, messages: List[Message]):
+        previous: Optional[Message] = None
+        for message in [*messages, None]:
+            chunk = self._data(previous.data) if previous is not None else b""
+            if message is not None:
+                chunk += f"MAIL FROM:<{sender}>\r\nRCPT TO:<{message.recipient}>\r\nDATA\r\n".encode()
+            self.writer.write(chunk)
+            if previous is not None:
+                code, text = await self._reply()
+                previous.error = None if code == 250 else SmtpError(code, text)
+                self.sent += 1
+                previous = None
+            if message is None:
+                break
+            replies = [await self._reply() for _ in range(3)]
+            refused = next((reply for reply in replies[:2] if reply[0] != 250), None)
+            if replies[2][0] != 354:
+                message.error = SmtpError(*(refused or replies[2]))
+            elif refused:
+                # DATA was accepted despite a refused MAIL/RCPT; end it empty.
+                self.writer.write(b".\r\n")
+                await self._reply()
+                message.error = SmtpError(*refused)
+            else:
+                previous = message
+        await self.writer.drain()
+
+    async def _sequential(self, sender: str, messages: List[Message]):
+        for message in messages:
+            try:
+                await self._command(f"MAIL FROM:<{sender}>".encode(), 250)
+                await self._command(f"RCPT TO:<{message.recipient}>".encode(), 250)
+                await self._command(b"DATA", 354)
+                self.writer.write(self._data(message.data))
+                await self._expect(250)
+                message.error = None
+            except SmtpError as e:
+                if e.code == 0:
+                    raise
+                message.error = e
+                await self._command(b"RSET", 250)
+            self.sent += 1
+
+    async def close(self):
+        if self.writer is None:
+            return
+        try:
+            self.writer.write(b"QUIT\r\n")
+            await asyncio.wait_for(self.writer.drain(), 1)
+        except (OSError, asyncio.TimeoutError):
+            pass
+        self.writer.close()
+        self.writer = self.reader = None
+
+
+class SmtpPool:
+    """At most ``size`` open connections, reused until one fails or has sent ``max_messages``."""
+
+    def __init__(self, factory: Callable[[], SmtpConnection], size: int = 4, max_messages: int = 1000):
+        self.factory = factory
+        self.size = size
+        self.max_messages = max_messages
+        self.opened = 0
+        self._idle: List[SmtpConnection] = []
+        self._slots = asyncio.Semaphore(size)
+
+    async def acquire(self) -> SmtpConnection:
+        await self._slots.acquire()
+        if self._idle:
+            return self._idle.pop()
+        connection = self.factory()
+        try:
+            await connection.connect()
+        except BaseException:
+            self._slots.release()
+            raise
+        self.opened += 1
+        return connection
+
+    async def release(self, connection: SmtpConnection, healthy: bool = True):
+        try:
+            if healthy and connection.sent < self.max_messages:
+                self._idle.append(connection)
+            else:
+                await connection.close()
+        finally:
+            self._slots.release()
+
+    async def close(self):
+        while self._idle:
+            await self._idle.pop().close()
+
+
+class MessageTemplate:
+    """A job's message rendered once, with the recipient, Message-ID, Date and ``{name}`` spliced in per lead.
+
+    Building every message with EmailMessage costs about a millisecond, a
+    quarter of an hour of CPU per million leads; it is kept for subjects,
+    bodies, addresses or names that are not plain ASCII.
+    """
+
+    _TOKEN = re.compile(rb"\x00(to|id|date|name)\x00")
+
+    def __init__(self, sender: str, subject: str, body: str, message_id_domain: str):
+        self.sender = sender
+        self.subject = subject
+        self.body = body
+        self.message_id_domain = message_id_domain
+        self._date: Tuple[int, str] = (0, "")
+        self._parts: Optional[List[bytes]] = None
+        if subject.isascii() and body.isascii():
+            # The Date header is parsed, so it is rendered with a real date and swapped for its token afterwards.
+            epoch = formatdate(0, usegmt=True)
+            rendered = self._render("\x00to\x00", "\x00id\x00", epoch, "\x00name\x00")
+            rendered = re.sub(rb"\r\nDate: [^\r]*", b"\r\nDate: \x00date\x00", rendered, count=1)
+            # Alternating literal bytes and token names.
+            self._parts = self._TOKEN.split(rendered)
+
+    def _render(self, recipient: str, message_id: str, date: str, name: str) -> bytes:
+        # The email package is only needed once a job runs; keep it out of server startup.
+        from email.message import EmailMessage
+        from email.policy import SMTP
+
+        message = EmailMessage(policy=SMTP)
+        message["From"] = self.sender
+        message["To"] = recipient
+        message["Subject"] = self.subject
+        message["Date"] = date
+        message["Message-ID"] = f"<{message_id}@{self.message_id_domain}>"
+        body = self.body.replace("{name}", name)
+        message.set_content(body, cte="7bit" if body.isascii() else "quoted-printable")
+        return bytes(message)
+
+    def date(self) -> str:
+        now = int(time.time())
+        if now != self._date[0]:
+            self._date = (now, formatdate(now, usegmt=True))
+        return self._date[1]
+
+    def render(self, recipient: str, message_id: str, name: Optional[str]) -> bytes:
+        name = " ".join((name or "").split())[:100] or "there"
+        if self._parts is None or not (recipient.isascii() and name.isascii()):
+            return self._render(recipient, message_id, self.date(), name)
+        values = {b"to": recipient.encode(), b"id": message_id.encode(), b"date": self.date().encode(), b"name": name.encode()}
+        parts = self._parts
+        return b"".join([part if i % 2 == 0 else values[part] for i, part in enumerate(parts)])
+
+
+class Mailer:
+    """Sends batches of messages over an SmtpPool with a per-recipient-domain concurrency cap.
+
+    Messages are grouped by domain into chunks of up to ``chunk_size``, each
+    sent on one connection; the chunks of different domains are interleaved
+    so a big domain cannot occupy every connection while its cap holds them
+    back. Transient refusals (4xx, dropped connections) are retried up to
+    ``max_attempts`` times with exponential backoff and jitter; that rides
+    out a dropped connection, not greylisting, so messages still refused
+    transiently after that are handed back for a much later retry.
+    """
+
+    def __init__(self, pool: SmtpPool, sender: str, domain_concurrency: int = 2, chunk_size: int = 50,
+                 max_attempts: int = 4, retry_delay: float = 2.0, max_retry_delay: float = 60.0):
+        self.pool = pool
+        self.sender = sender
+        self.domain_concurrency = domain_concurrency
+        self.chunk_size = chunk_size
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.sent = 0
+        self.refused = 0
+        self.deferred = 0
+        self.retried = 0
+        self.connection_errors = 0
+
+    async def deliver(self, messages: List[Message]) -> List[Message]:
+        """Send ``messages``; returns the ones not delivered, refused permanently or (``error.transient``) deferred."""
+        failed: List[Message] = []
+        pending = messages
+        while pending:
+            await self._send_round(pending)
+            retry = []
+            for message in pending:
+                message.attempts += 1
+                if message.error is None:
+                    self.sent += 1
+                elif message.error.transient and message.attempts < self.max_attempts:
+                    retry.append(message)
+                else:
+                    failed.append(message)
+            if retry:
+                self.retried += len(retry)
+                delay = min(self.max_retry_delay, self.retry_delay * 2 ** (retry[0].attempts - 1))
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+            pending = retry
+        deferred = sum(message.error.transient for message in failed)
+        self.deferred += deferred
+        self.refused += len(failed) - deferred
+        return failed
+
+    async def _send_round(self, messages: List[Message]):
+        by_domain: Dict[str, List[List[Message]]] = defaultdict(list)
+        for message in messages:
+            message.error = NOT_SENT
+            chunks = by_domain[message.domain]
+            if not chunks or len(chunks[-1]) >= self.chunk_size:
+                chunks.append([])
+            chunks[-1].append(message)
+        queue = deque()
+        lists = [deque((domain, chunk) for chunk in chunks) for domain, chunks in by_domain.items()]
+        while lists:
+            lists = [chunks for chunks in lists if chunks]
+            queue.extend(chunks.popleft() for chunks in lists)
+
+        limits: Dict[str, asyncio.Semaphore] = defaultdict(lambda: asyncio.Semaphore(self.domain_concurrency))
+
+        async def worker():
+            while queue:
+                domain, chunk = queue.popleft()
+                async with limits[domain]:
+                    await self._send_chunk(chunk)
+
+        await asyncio.gather(*(worker() for _ in range(min(self.pool.size, len(queue)))))
+
+    async def _send_chunk(self, chunk: List[Message]):
+        try:
+            connection = await self.pool.acquire()
+        except (SmtpError, OSError, asyncio.TimeoutError) as e:
+            self.connection_errors += 1
+            logger.warning("SMTP connect failed: %s", e)
+            return
+        healthy = False
+        try:
+            await connection.send_many(self.sender, chunk)
+            healthy = True
+        except (SmtpError, OSError, asyncio.TimeoutError) as e:
+            self.connection_errors += 1
+            logger.warning("SMTP connection failed after %d messages: %s", sum(m.error is None for m in chunk), e)
+        finally:
+            await self.pool.release(connection, healthy)
+
+    def stats(self) -> dict:
+        return {"sent": self.sent, "refused": self.refused, "deferred": self.deferred, "retried": self.retried,
+                "connection_errors": self.connection_errors, "connections_opened": self.pool.opened}
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def new_job(kind: str, subject: str, body: str, job_id: Optional[str] = None) -> dict:
+    now = utcnow()
+    return {
+        "job_id": job_id or f"email_{uuid.uuid4().hex[:12]}",
+        "kind": kind,
+        "subject": subject,
+        "body": body,
+        "status": "queued",
+        "cursor": None,
+        "sent": 0,
+        "failed": 0,
+        "deferred": 0,
+        "leads_done": False,
+        "created_at": now,
+        "updated_at": now,
+        "next_run_at": now,
+        "lease_owner": None,
+        "lease_expires_at": None,
+    }
+
+
+async def cancel_job(jobs, job_id: str) -> bool:
+    result = await jobs.update_one(
+        {"job_id": job_id, "kind": {"$ne": "welcome"}, "status": {"$in": ["queued", "running"]}},
+        {"$set": {"status": "cancelled", "updated_at": utcnow(), "lease_owner": None, "lease_expires_at": None}},
+    )
+    return result.modified_count == 1
+
+
+class EmailDispatcher:
+    """Runs email jobs from ``email_jobs`` against ``email_leads`` in the background.
+
+    A job is claimed with a lease, so several workers can share the queue
+    and a job whose worker died is picked up again once its lease expires.
+    Leads are read a page at a time in ``_id`` order. The lease is renewed
+    while a page is sent, and after each page the job's cursor and counts
+    are written, so a resumed job continues from the last finished page and
+    memory stays bounded by one page whatever the list size. Delivery is at
+    least once: the page in flight when a worker dies is sent again.
+
+    Recipients still refused with a 4xx after the mailer's quick retries
+    (greylisting, full mailboxes, rate limits) go to ``deferred`` and are
+    retried from ``defer_delay`` later, doubling, for up to ``max_defer``
+    before they are recorded in ``failures``; their job stays queued until
+    then.
+
+    ``newsletter`` jobs go to every lead and finish. The recurring
+    ``welcome`` job sends to leads created with ``welcome_pending`` and
+    clears the flag, then sleeps for ``welcome_interval``. Cancelling a job
+    stops its worker at its next lease renewal.
+    """
+
+    def __init__(self, jobs, leads, failures, deferred, mailer: Mailer, from_header: Optional[str] = None,
+                 page_size: int = 500, lease_seconds: float = 120.0, poll_interval: float = 5.0,
+                 welcome_interval: float = 60.0, defer_delay: float = 300.0, max_defer: float = 86400.0):
+        self.jobs = jobs
+        self.leads = leads
+        self.failures = failures
+        self.deferred = deferred
+        self.mailer = mailer
+        self.from_header = from_header or mailer.sender
+        self.message_id_domain = mailer.sender.rpartition("@")[2]
+        self.page_size = page_size
+        self.lease = timedelta(seconds=lease_seconds)
+        self.poll_interval = poll_interval
+        self.welcome_interval = timedelta(seconds=welcome_interval)
+        self.defer_delay = timedelta(seconds=defer_delay)
+        self.max_defer = timedelta(seconds=max_defer)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.pages = 0
+        self.errors = 0
+        self.active_job: Optional[str] = None
+        self._stopping = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def claim(self) -> Optional[dict]:
+        now = utcnow()
+        return await self.jobs.find_one_and_update(
+            {
+                "status": {"$in": ["queued", "running"]},
+                "next_run_at": {"$lte": now},
+                "$or": [{"lease_expires_at": None}, {"lease_expires_at": {"$lt": now}}],
+            },
+            {"$set": {"status": "running", "lease_owner": self.owner, "lease_expires_at": now + self.lease, "updated_at": now}},
+            sort=[("next_run_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _checkpoint(self, job_id: str, update: dict):
+        now = utcnow()
+        fields = update.setdefault("$set", {})
+        fields["updated_at"] = now
+        # A release sets its own (None) expiry; anything else renews the lease.
+        fields.setdefault("lease_expires_at", now + self.lease)
+        result = await self.jobs.update_one({"job_id": job_id, "lease_owner": self.owner, "status": "running"}, update)
+        if result.matched_count == 0:
+            raise LeaseLost(job_id)
+
+    async def _renewing(self, job_id: str, awaitable):
+        """Await ``awaitable`` while renewing the job's lease every third of its length.
+
+        A page against a slow relay (plus retry backoff) can outlast the lease;
+        if the lease is lost meanwhile (cancelled, or taken over) the send is
+        abandoned and LeaseLost raised.
+        """
+        task = asyncio.ensure_future(awaitable)
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=self.lease.total_seconds() / 3)
+                if done:
+                    return task.result()
+                await self._checkpoint(job_id, {})
+        finally:
+            task.cancel()
+
+    def _page(self, job: dict, cursor) -> "asyncio.Future":
+        query = {"welcome_pending": True} if job["kind"] == "welcome" else {}
+        if cursor is not None:
+            query["_id"] = {"$gt": cursor}
+        return asyncio.ensure_future(self.leads.find(
+            query, {"email": 1, "name": 1}, sort=[("_id", 1)], limit=self.page_size
+        ).to_list(self.page_size))
+
+    def _messages(self, template: MessageTemplate, job_id: str, recipients: List[dict]) -> List[Message]:
+        # ``recipients`` are leads, or deferred entries carrying the lead's id as ``lead_id``.
+        return [
+            Message(r["email"], template.render(r["email"], f"{job_id}.{r.get('lead_id', r['_id'])}", r.get("name")))
+            for r in recipients
+        ]
+
+    async def _record_failures(self, job_id: str, messages: List[Message]):
+        if messages:
+            now = utcnow()
+            await self.failures.insert_many([
+                {"job_id": job_id, "email": m.recipient, "code": m.error.code, "error": str(m.error),
+                 "attempts": m.attempts, "created_at": now}
+                for m in messages
+            ])
+
+    async def _release(self, job_id: str):
+        await self._checkpoint(job_id, {"$set": {"status": "queued", "lease_owner": None, "lease_expires_at": None}})
+
+    async def run_job(self, job: dict):
+        """Send ``job`` from its cursor to the end of the lead list, checkpointing after every page, then retry its due deferrals."""
+        template = MessageTemplate(self.from_header, job["subject"], job["body"], self.message_id_domain)
+        job_id = job["job_id"]
+        if not job.get("leads_done"):
+            if not await self._send_leads(job, template):
+                return
+        if not await self._retry_deferred(job_id, template):
+            return
+        next_retry = await self.deferred.find_one({"job_id": job_id}, {"next_attempt_at": 1},
+                                                  sort=[("next_attempt_at", 1)])
+        if job["kind"] == "welcome":
+            next_run_at = utcnow() + self.welcome_interval
+            if next_retry is not None:
+                next_run_at = min(next_run_at, next_retry["next_attempt_at"])
+            finished = {"status": "queued", "cursor": None, "next_run_at": next_run_at}
+        elif next_retry is not None:
+            finished = {"status": "queued", "leads_done": True, "next_run_at": next_retry["next_attempt_at"]}
+        else:
+            finished = {"status": "done", "finished_at": utcnow()}
+        await self._checkpoint(job_id, {"$set": {**finished, "lease_owner": None, "lease_expires_at": None}})
+
+    async def _send_leads(self, job: dict, template: MessageTemplate) -> bool:
+        """The page loop; False if the job was released because the dispatcher is stopping."""
+        job_id = job["job_id"]
+        cursor = job.get("cursor")
+        page = self._page(job, cursor)
+        try:
+            while True:
+                leads = await page
+                if not leads:
+                    return True
+                cursor = leads[-1]["_id"]
+                # Read the next page while this one is being sent.
+                page = self._page(job, cursor)
+                messages = self._messages(template, job_id, leads)
+                failed = await self._renewing(job_id, self.mailer.deliver(messages))
+                refused = [m for m in failed if not m.error.transient]
+                await self._record_failures(job_id, refused)
+                deferred = [(lead, m) for lead, m in zip(leads, messages) if m.error is not None and m.error.transient]
+                if deferred:
+                    now = utcnow()
+                    await self.deferred.bulk_write([
+                        UpdateOne({"job_id": job_id, "lead_id": lead["_id"]}, {
+                            "$set": self._deferral(m, 0, now),
+                            "$setOnInsert": {"email": lead["email"], "name": lead.get("name"), "created_at": now,
+                                             "expires_at": now + self.max_defer + timedelta(days=1)},
+                        }, upsert=True)
+                        for lead, m in deferred
+                    ], ordered=False)
+                if job["kind"] == "welcome":
+                    await self.leads.update_many({"_id": {"$in": [lead["_id"] for lead in leads]}},
+                                                 {"$unset": {"welcome_pending": ""}})
+                await self._checkpoint(job_id, {"$set": {"cursor": cursor}, "$inc": {
+                    "sent": len(messages) - len(failed), "failed": len(refused), "deferred": len(deferred)}})
+                self.pages += 1
+                if self._stopping.is_set():
+                    await self._release(job_id)
+                    return False
+        finally:
+            page.cancel()
+
+    def _deferral(self, message: Message, deferrals: int, now: datetime) -> dict:
+        return {"deferrals": deferrals + 1, "next_attempt_at": now + self.defer_delay * 2 ** deferrals,
+                "code": message.error.code, "error": str(message.error)}
+
+    async def _retry_deferred(self, job_id: str, template: MessageTemplate) -> bool:
+        """Resend the job's deferred recipients that are due; False if the job was released for shutdown."""
+        while True:
+            now = utcnow()
+            due = await self.deferred.find(
+                {"job_id": job_id, "next_attempt_at": {"$lte": now}}, sort=[("next_attempt_at", 1)], limit=self.page_size
+            ).to_list(self.page_size)
+            if not due:
+                return True
+            messages = self._messages(template, job_id, due)
+            await self._renewing(job_id, self.mailer.deliver(messages))
+            operations, refused = [], []
+            for entry, message in zip(due, messages):
+                if message.error is not None and message.error.transient and now - entry["created_at"] < self.max_defer:
+                    operations.append(UpdateOne({"_id": entry["_id"]}, {"$set": self._deferral(message, entry["deferrals"], now)}))
+                    continue
+                operations.append(DeleteOne({"_id": entry["_id"]}))
+                if message.error is not None:
+                    refused.append(message)
+            await self._record_failures(job_id, refused)
+            await self.deferred.bulk_write(operations, ordered=False)
+            resolved = sum(isinstance(operation, DeleteOne) for operation in operations)
+            await self._checkpoint(job_id, {"$inc": {"sent": resolved - len(refused), "failed": len(refused),
+                                                     "deferred": -resolved}})
+            if self._stopping.is_set():
+                await self._release(job_id)
+                return False
+
+    def start(self):
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Finish the page being sent, release the job for the next worker, and stop."""
+        self._stopping.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self.mailer.pool.close()
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            job = None
+            try:
+                job = await self.claim()
+                if job is not None:
+                    self.active_job = job["job_id"]
+                    await self.run_job(job)
+                    continue
+            except LeaseLost as e:
+                logger.warning("Email job %s was cancelled or taken over by another worker", e)
+            except Exception:
+                self.errors += 1
+                logger.exception("Email job %s failed; it resumes when its lease expires",
+                                 job["job_id"] if job else "claim")
+            finally:
+                self.active_job = None
+            waiter = asyncio.ensure_future(self._stopping.wait())
+            try:
+                await asyncio.wait({waiter}, timeout=self.poll_interval)
+            finally:
+                waiter.cancel()
+
+    def stats(self) -> dict:
+        return {"active_job": self.active_job, "pages": self.pages, "errors": self.errors, **self.mailer.stats()}
+
+
+class _SinkProtocol(asyncio.Protocol):
+    def __init__(self, sink: "SmtpSink"):
+        self.sink = sink
+        self.buffer = bytearray()
+        self.recipient: Optional[str] = None
+        self.in_data = False
+        self.bdat: Optional[int] = None
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.write(b"220 sink ESMTP\r\n")
+
+    def connection_lost(self, exc):
+        self.transport = None
+
+    def data_received(self, data: bytes):
+        # Every complete command in the buffer is answered in one write, as a pipelining server does.
+        self.buffer += data
+        replies = []
+        while self.transport is not None:
+            if self.bdat is not None:
+                if len(self.buffer) < self.bdat:
+                    break
+                body = bytes(self.buffer[:self.bdat])
+                del self.buffer[:self.bdat]
+                self.bdat = None
+                replies.append(self._deliver(body))
+            elif self.in_data:
+                if self.buffer.startswith(b".\r\n"):
+                    body, end = b"", 3
+                else:
+                    end = self.buffer.find(b"\r\n.\r\n")
+                    if end < 0:
+                        break
+                    body, end = bytes(self.buffer[:end + 2]).replace(b"\r\n..", b"\r\n."), end + 5
+                del self.buffer[:end]
+                self.in_data = False
+                replies.append(self._deliver(body))
+            else:
+                end = self.buffer.find(b"\n")
+                if end < 0:
+                    break
+                line = bytes(self.buffer[:end + 1])
+                del self.buffer[:end + 1]
+                replies.append(self._command(line))
+        if replies and self.transport is not None:
+            self.transport.write("".join(replies).encode())
+        if replies and replies[-1].startswith("221"):
+            self.transport.close()
+
+    def _deliver(self, body: bytes) -> str:
+        if self.recipient is None:
+            return "554 No valid recipients\r\n"
+        self.sink.received += 1
+        if self.sink.keep:
+            self.sink.messages.append((self.recipient, body))
+        self.recipient = None
+        return "250 Queued\r\n"
+
+    def _command(self, line: bytes) -> str:
+        verb = line[:4].upper()
+        if verb in (b"EHLO", b"HELO"):
+            extensions = ["sink", "8BITMIME"] + self.sink.extensions
+            return "".join(f"250-{extension}\r\n" for extension in extensions[:-1]) + f"250 {extensions[-1]}\r\n"
+        if verb == b"MAIL":
+            self.recipient = None
+            return "250 OK\r\n"
+        if verb == b"RCPT":
+            address = line[line.index(b"<") + 1:line.rindex(b">")].decode()
+            local = address.partition("@")[0]
+            if "fail" in local:
+                return "550 No such user\r\n"
+            if "defer" in local:
+                return "451 Try again later\r\n"
+            self.recipient = address
+            return "250 OK\r\n"
+        if verb == b"DATA":
+            if self.recipient is None:
+                return "503 No valid recipients\r\n"
+            self.in_data = True
+            return "354 End data with <CR><LF>.<CR><LF>\r\n"
+        if verb == b"BDAT":
+            self.bdat = int(line.split()[1])
+            return ""
+        if verb == b"AUTH":
+            return "235 Authenticated\r\n"
+        if verb == b"QUIT":
+            return "221 Bye\r\n"
+        self.recipient = None
+        return "250 OK\r\n"
+
+
+class SmtpSink:
+    """Local SMTP server that accepts and discards mail, for tests and benchmarks.
+
+    Recipients whose local part contains ``fail`` are refused with 550 and
+    ``defer`` with 451. Advertises PIPELINING and CHUNKING unless
+    ``extensions`` says otherwise; ``keep`` stores what was received.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, extensions=("PIPELINING", "CHUNKING"), keep: bool = False):
+        self.host = host
+        self.port = port
+        self.extensions = list(extensions)
+        self.keep = keep
+        self.received = 0
+        self.messages: List[Tuple[str, bytes]] = []
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self._server = await loop.create_server(lambda: _SinkProtocol(self), self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+
+def run_sink(port: int, ready, extensions=("PIPELINING", "CHUNKING")):
+    async def serve():
+        sink = SmtpSink(port=port, extensions=extensions)
+        await sink.start()
+        ready.set()
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local SMTP sink for testing the email dispatcher")
+    parser.add_argument("--port", type=int, default=2525)
+    args = parser.parse_args()
+    logging.info("SMTP sink listening on 127.0.0.1:%d", args.port)
+    run_sink(args.port, asyncio.Event())
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
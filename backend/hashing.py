@@ -0,0 +1,122 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from typing import TYPE_CHECKING, Optional, Tuple
+
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
+
+
+class HashPoolSaturated(Exception):
+    pass
+
+
+@lru_cache(maxsize=None)
+def _context(rounds: int) -> "CryptContext":
+    from passlib.context import CryptContext
+
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
+
+
+def _warm(rounds: int):
+    _context(rounds).handler("bcrypt").get_backend()
+
+
+def _hash(rounds: int, password: str) -> str:
+    return _context(rounds).hash(password)
+
+
+def _verify_and_update(rounds: int, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    try:
+        return _context(rounds).verify_and_update(password, hashed_password)
+    except ValueError:
+        return False, None
+
+
+class PasswordHasher:
+    """Runs bcrypt off the event loop on a bounded thread or process pool.
+
+    At most ``max_workers`` hashes run at once and ``max_queue`` more may wait;
+    beyond that callers get HashPoolSaturated so the API can shed load.
+    ``in_flight`` counts jobs on the pool, including those whose caller gave up.
+    """
+
+    def __init__(self, rounds: int = 12, max_workers: int = 4, max_queue: int = 64, mode: str = "thread"):
+        self.rounds = rounds
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.mode = mode
+        self.in_flight = 0
+        self.rejected = 0
+        self._executor: Optional[Executor] = None
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self.in_flight - self.max_workers)
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.mode == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, fn, *args):
+        if self.in_flight >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise HashPoolSaturated()
+        loop = asyncio.get_running_loop()
+        job = self.executor.submit(fn, *args)
+        self.in_flight += 1
+        # Released when the job finishes, not when the caller stops waiting:
+        # a cancelled request leaves its bcrypt job running on a worker.
+        job.add_done_callback(lambda _: self._release_from(loop))
+        return await asyncio.wrap_future(job)
+
+    def _release_from(self, loop: asyncio.AbstractEventLoop):
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            pass  # the loop has closed; nothing is left to count
+
+    def _release(self):
+        self.in_flight -= 1
+
+    async def warm(self):
+        """Import passlib and load the bcrypt backend on every pool worker.
+
+        Run in the background at startup so neither the import nor the
+        backend probe lands on the first login.
+        """
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.executor, _warm, self.rounds) for _ in range(self.max_workers)))
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, self.rounds, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        if not hashed_password:
+            return False, None
+        return await self._run(_verify_and_update, self.rounds, password, hashed_password)
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "max_workers": self.max_workers,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
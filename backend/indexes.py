@@ -0,0 +1,205 @@
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True),
+    ],
+    "user_sessions": [
+        IndexModel([("session_token", ASCENDING)], name="session_token_unique", unique=True),
+        IndexModel([("user_id", ASCENDING)], name="user_id"),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "blog_posts": [
+        IndexModel([("slug", ASCENDING)], name="slug_unique", unique=True),
+        IndexModel([("post_id", ASCENDING)], name="post_id_unique", unique=True),
+        IndexModel([("published_at", DESCENDING), ("post_id", DESCENDING)], name="published_at_post_id"),
+        IndexModel(
+            [("tags", ASCENDING), ("published_at", DESCENDING), ("post_id", DESCENDING)],
+            name="tags_published_at_post_id",
+        ),
+        IndexModel([("updated_at", DESCENDING)], name="updated_at"),
+    ],
+    "token_revocations": [
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "email_leads": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel(
+            [("welcome_pending", ASCENDING), ("_id", ASCENDING)],
+            name="welcome_pending_id",
+            partialFilterExpression={"welcome_pending": True},
+        ),
+    ],
+    "courses": [
+        IndexModel([("course_id", ASCENDING)], name="course_id_unique", unique=True),
+    ],
+    "course_progress": [
+        IndexModel([("user_id", ASCENDING), ("course_id", ASCENDING)], name="user_id_course_id_unique", unique=True),
+    ],
+    "post_stats_daily": [
+        IndexModel([("slug", ASCENDING), ("day", ASCENDING)], name="slug_day_unique", unique=True),
+        IndexModel([("day", ASCENDING)], name="day"),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "backtest_jobs": [
+        IndexModel([("job_id", ASCENDING)], name="job_id_unique", unique=True),
+        IndexModel(
+            [("user_id", ASCENDING), ("slot", ASCENDING)],
+            name="user_id_slot_active_unique",
+            unique=True,
+            partialFilterExpression={"active": True},
+        ),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "email_jobs": [
+        IndexModel([("job_id", ASCENDING)], name="job_id_unique", unique=True),
+        IndexModel([("status", ASCENDING), ("next_run_at", ASCENDING)], name="status_next_run_at"),
+    ],
+    "email_failures": [
+        IndexModel([("job_id", ASCENDING), ("created_at", ASCENDING)], name="job_id_created_at"),
+    ],
+    "email_deferred": [
+        IndexModel([("job_id", ASCENDING), ("lead_id", ASCENDING)], name="job_id_lead_id_unique", unique=True),
+        IndexModel([("job_id", ASCENDING), ("next_attempt_at", ASCENDING)], name="job_id_next_attempt_at"),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+}
+
+BLOG_LISTING_SORT = [("published_at", DESCENDING), ("post_id", DESCENDING)]
+
+# Every query shape a request handler sends to Mongo; verify_query_plans
+# fails if any of them would be answered by a collection scan.
+QUERY_SHAPES: List[Tuple[str, dict, Optional[list]]] = [
+    ("users", {"email": "probe@example.com"}, None),
+    ("users", {"user_id": "user_probe"}, None),
+    ("user_sessions", {"session_token": "session_probe"}, None),
+    ("user_sessions", {"user_id": "user_probe"}, None),
+    ("blog_posts", {"slug": "probe"}, None),
+    ("blog_posts", {}, BLOG_LISTING_SORT),
+    ("blog_posts", {"tags": "probe"}, BLOG_LISTING_SORT),
+    ("email_leads", {"email": "probe@example.com"}, None),
+    ("course_progress", {"user_id": "user_probe"}, None),
+    ("course_progress", {"user_id": "user_probe", "course_id": "probe"}, None),
+    ("post_stats_daily", {"slug": "probe", "day": "2024-01-01"}, None),
+    ("post_stats_daily", {"day": {"$gte": "2024-01-01"}}, None),
+    ("blog_posts", {"slug": {"$in": ["probe"]}}, None),
+    ("blog_posts", {}, [("updated_at", DESCENDING)]),
+    ("blog_posts", {"updated_at": {"$gte": datetime(2024, 1, 1)}}, None),
+    ("backtest_jobs", {"job_id": "bt_probe", "user_id": "user_probe"}, None),
+    ("backtest_jobs", {"user_id": "user_probe", "active": True, "heartbeat_at": {"$lt": datetime(2024, 1, 1)}}, None),
+    ("email_jobs", {"job_id": "email_probe"}, None),
+    ("email_jobs", {"status": {"$in": ["queued", "running"]}, "next_run_at": {"$lte": datetime(2024, 1, 1)}}, [("next_run_at", ASCENDING)]),
+    ("email_leads", {"welcome_pending": True}, [("_id", ASCENDING)]),
+    ("email_leads", {}, [("_id", ASCENDING)]),
+    ("email_deferred", {"job_id": "email_probe", "next_attempt_at": {"$lte": datetime(2024, 1, 1)}}, [("next_attempt_at", ASCENDING)]),
+    ("email_deferred", {"job_id": "email_probe"}, [("next_attempt_at", ASCENDING)]),
+]
+
+
+def index_fingerprint() -> str:
+    """Short digest of INDEXES, so a changed registry is applied again at startup."""
+    spec = repr(sorted((collection, sorted(repr(sorted(model.document.items())) for model in models))
+                       for collection, models in INDEXES.items()))
+    return hashlib.sha1(spec.encode()).hexdigest()[:12]
+
+
+async def duplicate_keys(collection, fields: List[str], limit: int = 10) -> List[dict]:
+    """Up to ``limit`` values of ``fields`` shared by more than one document, with their counts."""
+    pipeline = [
+        {"$group": {"_id": {field: f"${field}" for field in fields}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": limit},
+    ]
+    return [{**doc["_id"], "count": doc["count"]} async for doc in collection.aggregate(pipeline, allowDiskUse=True)]
+
+
+async def ensure_indexes(db) -> List[str]:
+    failed = []
+    for collection, models in INDEXES.items():
+        for model in models:
+            name = model.document["name"]
+            try:
+                await db[collection].create_indexes([model])
+            except OperationFailure as e:
+                failed.append(f"{collection}.{name}")
+                logger.error("Could not create index %s.%s: %s", collection, name, e)
+                if e.code == 11000:
+                    conflicts = await duplicate_keys(db[collection], list(model.document["key"]))
+                    logger.error("Duplicate keys blocking %s.%s: %s", collection, name, conflicts)
+    return failed
+
+
+async def missing_indexes(db) -> List[str]:
+    """Registry indexes not (yet) present, e.g. while another worker is still creating them."""
+    missing = []
+    for collection, models in INDEXES.items():
+        existing = await db[collection].index_information()
+        missing.extend(
+            f"{collection}.{model.document['name']}" for model in models if model.document["name"] not in existing
+        )
+    return missing
+
+
+def _plan_stages(plan: dict):
+    yield plan.get("stage")
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+
+async def verify_query_plans(db) -> List[str]:
+    collscans = []
+    for collection, query, sort in QUERY_SHAPES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.explain()
+        winning_plan = explain["queryPlanner"]["winningPlan"]
+        if "COLLSCAN" in _plan_stages(winning_plan):
+            collscans.append(f"{collection} {sorted(query)}")
+    return collscans
+
+
+async def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Create indexes and verify query plans")
+    parser.add_argument("--check", action="store_true", help="fail if any handler query plans a COLLSCAN")
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        failed = await ensure_indexes(db)
+        collscans = await verify_query_plans(db) if args.check else []
+    finally:
+        client.close()
+
+    for name in failed:
+        print(f"index failed: {name}")
+    for shape in collscans:
+        print(f"COLLSCAN: {shape}")
+    return 1 if failed or collscans else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    raise SystemExit(asyncio.run(main()))
@@ -0,0 +1,348 @@
+import hashlib
+import io
+import math
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import orjson
+
+COLUMNS = ("open", "high", "low", "close", "volume")
+
+# exp(-230) ~ 1e-100: the largest rescaling _ewm lets a block reach before overflow risk.
+_EWM_MAX_LOG_SCALE = 230.0
+
+
+class IndicatorError(ValueError):
+    pass
+
+
+def _nan(n: int) -> np.ndarray:
+    return np.full(n, np.nan)
+
+
+def _ewm(values: np.ndarray, alpha: float, initial: float) -> np.ndarray:
+    """y[t] = (1 - alpha) * y[t-1] + alpha * x[t], starting from ``initial``.
+
+    Vectorized per block with the closed form
+    y[k] = b^(k+1) * y0 + alpha * b^k * cumsum(x[j] * b^-j). Blocks are sized
+    so b^-k stays finite, giving O(n) numpy work and one Python step per block.
+    """
+    out = np.empty(len(values))
+    beta = 1.0 - alpha
+    if beta == 0.0:
+        out[:] = values
+        return out
+    block = max(1, int(_EWM_MAX_LOG_SCALE / -math.log(beta)))
+    powers = beta ** np.arange(block + 1)
+    inverse = 1.0 / powers[:-1]
+    previous = initial
+    for start in range(0, len(values), block):
+        chunk = values[start:start + block]
+        k = len(chunk)
+        scaled = np.cumsum(chunk * inverse[:k])
+        out[start:start + k] = powers[1:k + 1] * previous + alpha * powers[:k] * scaled
+        previous = out[start + k - 1]
+    return out
+
+
+def _seeded_ewm(values: np.ndarray, period: int, alpha: float) -> np.ndarray:
+    # TA-Lib convention: seeded with the SMA of the first ``period`` values.
+    out = _nan(len(values))
+    if len(values) < period:
+        return out
+    seed = values[:period].mean()
+    out[period - 1] = seed
+    out[period:] = _ewm(values[period:], alpha, seed)
+    return out
+
+
+def _rolling_moments(values: np.ndarray, period: int, block: int = 8192) -> Tuple[np.ndarray, np.ndarray]:
+    """Rolling mean and population variance over ``period`` values (NaN until the window fills).
+
+    Window sums come from prefix sums, re-centred per block so they never
+    grow beyond one block of values and differencing them stays exact.
+    """
+    n = len(values)
+    mean, variance = _nan(n), _nan(n)
+    for start in range(period - 1, n, block):
+        end = min(start + block, n)
+        segment = values[start - period + 1:end]
+        centred = segment - segment[0]
+        sums = np.cumsum(np.concatenate(([0.0], centred)))
+        squares = np.cumsum(np.concatenate(([0.0], centred * centred)))
+        window_mean = (sums[period:] - sums[:-period]) / period
+        mean[start:end] = window_mean + segment[0]
+        variance[start:end] = np.clip((squares[period:] - squares[:-period]) / period - window_mean * window_mean, 0, None)
+    return mean, variance
+
+
+def sma(close: np.ndarray, period: int = 20) -> Dict[str, np.ndarray]:
+    return {"sma": _rolling_moments(close, period)[0]}
+
+
+def ema(close: np.ndarray, period: int = 20) -> Dict[str, np.ndarray]:
+    return {"ema": _seeded_ewm(close, period, 2.0 / (period + 1))}
+
+
+def rsi(close: np.ndarray, period: int = 14) -> Dict[str, np.ndarray]:
+    out = _nan(len(close))
+    if len(close) <= period:
+        return {"rsi": out}
+    delta = np.diff(close)
+    gains = _seeded_ewm(np.clip(delta, 0, None), period, 1.0 / period)[period - 1:]
+    losses = _seeded_ewm(np.clip(-delta, 0, None), period, 1.0 / period)[period - 1:]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out[period:] = np.where(losses == 0, 100.0, 100.0 - 100.0 / (1.0 + gains / losses))
+    return {"rsi": out}
+
+
+def macd(close: np.ndarray, fast: int = 12, slow: int = 26, signal: int = 9) -> Dict[str, np.ndarray]:
+    if fast >= slow:
+        raise IndicatorError("macd fast period must be shorter than slow period")
+    line = ema(close, fast)["ema"] - ema(close, slow)["ema"]
+    signal_line = _nan(len(close))
+    signal_line[slow - 1:] = _seeded_ewm(line[slow - 1:], signal, 2.0 / (signal + 1))
+    return {"macd": line, "signal": signal_line, "histogram": line - signal_line}
+
+
+def bollinger(close: np.ndarray, period: int = 20, stddev: float = 2.0) -> Dict[str, np.ndarray]:
+    middle, variance = _rolling_moments(close, period)
+    deviation = np.sqrt(variance)
+    return {"middle": middle, "upper": middle + stddev * deviation, "lower": middle - stddev * deviation}
+
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = 14) -> Dict[str, np.ndarray]:
+    true_range = high - low
+    previous_close = close[:-1]
+    true_range[1:] = np.maximum.reduce([true_range[1:], np.abs(high[1:] - previous_close), np.abs(low[1:] - previous_close)])
+    return {"atr": _seeded_ewm(true_range, period, 1.0 / period)}
+
+
+class Indicator(NamedTuple):
+    fn: Callable[..., Dict[str, np.ndarray]]
+    inputs: Tuple[str, ...]
+    defaults: Dict[str, float]
+
+
+INDICATORS: Dict[str, Indicator] = {
+    "sma": Indicator(sma, ("close",), {"period": 20}),
+    "ema": Indicator(ema, ("close",), {"period": 20}),
+    "rsi": Indicator(rsi, ("close",), {"period": 14}),
+    "macd": Indicator(macd, ("close",), {"fast": 12, "slow": 26, "signal": 9}),
+    "bollinger": Indicator(bollinger, ("close",), {"period": 20, "stddev": 2.0}),
+    "atr": Indicator(atr, ("high", "low", "close"), {"period": 14}),
+}
+
+
+def resolve_params(name: str, params: Optional[Dict[str, float]]) -> Tuple[Tuple[str, float], ...]:
+    if name not in INDICATORS:
+        raise IndicatorError(f"Unknown indicator {name!r}; expected one of {', '.join(INDICATORS)}")
+    defaults = INDICATORS[name].defaults
+    params = params or {}
+    unknown = set(params) - set(defaults)
+    if unknown:
+        raise IndicatorError(f"Unknown parameters for {name}: {', '.join(sorted(unknown))}")
+    resolved = []
+    for key, default in defaults.items():
+        value = params.get(key, default)
+        if not isinstance(value, (int, float)) or not math.isfinite(value) or value <= 0:
+            raise IndicatorError(f"{name} {key} must be a positive number")
+        if isinstance(default, int):
+            if value != int(value) or not 1 <= value <= 10_000:
+                raise IndicatorError(f"{name} {key} must be an integer between 1 and 10000")
+            value = int(value)
+        resolved.append((key, value))
+    return tuple(resolved)
+
+
+def column_label(name: str, params: Tuple[Tuple[str, float], ...], output: str) -> str:
+    label = "_".join([name, *(f"{value:g}" for _, value in params)])
+    return label if output == name else f"{label}.{output}"
+
+
+class Series:
+    """Validated OHLCV columns plus a digest used as the memoization key."""
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) != 1:
+            raise IndicatorError("All series columns must have the same length")
+        self.columns = columns
+        self.rows = lengths.pop()
+        digest = hashlib.blake2b(digest_size=16)
+        for name in sorted(columns):
+            digest.update(name.encode())
+            digest.update(columns[name].tobytes())
+        self.digest = digest.hexdigest()
+
+    @classmethod
+    def from_mapping(cls, data: Dict[str, list], max_rows: int) -> "Series":
+        columns = {}
+        for name in COLUMNS:
+            if data.get(name) is None:
+                continue
+            if not isinstance(data[name], (list, np.ndarray)):
+                raise IndicatorError(f"Column {name!r} must be a list of numbers")
+            if len(data[name]) > max_rows:
+                raise IndicatorError(f"Series longer than {max_rows} rows")
+            try:
+                columns[name] = np.asarray(data[name], dtype=np.float64)
+            except (TypeError, ValueError):
+                raise IndicatorError(f"Column {name!r} must be a list of numbers")
+            if columns[name].ndim != 1:
+                raise IndicatorError(f"Column {name!r} must be a flat list of numbers")
+            # Rolling sums and EWMs carry a gap forward into every later row, so reject it up front.
+            gaps = np.flatnonzero(~np.isfinite(columns[name]))
+            if len(gaps):
+                raise IndicatorError(f"Column {name!r} has a missing or non-finite value at row {gaps[0]}")
+        if "close" not in columns:
+            raise IndicatorError("Series needs at least a 'close' column")
+        return cls(columns)
+
+    @classmethod
+    def from_upload(cls, content: bytes, filename: str, max_rows: int) -> "Series":
+        import pandas as pd
+
+        if filename.lower().endswith(".parquet"):
+            try:
+                frame = pd.read_parquet(io.BytesIO(content))
+            except ImportError:
+                raise IndicatorError("Parquet uploads need pyarrow installed on the server")
+            except (ValueError, OSError):
+                raise IndicatorError("Upload is not a readable Parquet file")
+        else:
+            try:
+                frame = pd.read_csv(io.BytesIO(content))
+            except ValueError:  # ParserError, EmptyDataError and UnicodeDecodeError are all ValueErrors
+                raise IndicatorError("Upload is not a readable CSV file")
+        frame.columns = [str(column).strip().lower() for column in frame.columns]
+        if len(frame) > max_rows:
+            raise IndicatorError(f"Series longer than {max_rows} rows")
+        try:
+            columns = {name: frame[name].to_numpy(dtype=np.float64) for name in COLUMNS if name in frame}
+        except ValueError:
+            raise IndicatorError("Series columns must be numeric")
+        return cls.from_mapping(columns, max_rows)
+
+
+class IndicatorCache:
+    """LRU of computed outputs keyed by (series digest, indicator, params), bounded in bytes."""
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[tuple, Dict[str, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[Dict[str, np.ndarray]]:
+        with self._lock:
+            outputs = self._entries.get(key)
+            if outputs is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return outputs
+
+    def store(self, key: tuple, outputs: Dict[str, np.ndarray]):
+        size = sum(values.nbytes for values in outputs.values())
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = outputs
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= sum(values.nbytes for values in evicted.values())
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "bytes": self.bytes, "hits": self.hits, "misses": self.misses}
+
+
+def compute(series: Series, requests: List[Tuple[str, Optional[dict]]], cache: IndicatorCache) -> Dict[str, np.ndarray]:
+    """Run each requested indicator (memoized) and return flat ``label -> values`` columns."""
+    columns: Dict[str, np.ndarray] = {}
+    for name, raw_params in requests:
+        params = resolve_params(name, raw_params)
+        indicator = INDICATORS[name]
+        missing = [column for column in indicator.inputs if column not in series.columns]
+        if missing:
+            raise IndicatorError(f"{name} needs series columns: {', '.join(missing)}")
+        key = (series.digest, name, params)
+        outputs = cache.get(key)
+        if outputs is None:
+            outputs = indicator.fn(*(series.columns[column] for column in indicator.inputs), **dict(params))
+            cache.store(key, outputs)
+        for output, values in outputs.items():
+            columns[column_label(name, params, output)] = values
+    return columns
+
+
+def _dump_values(values: np.ndarray) -> bytes:
+    # orjson writes NaN (the warm-up rows) as null.
+    return orjson.dumps(values, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def render(rows: int, columns: Dict[str, np.ndarray]) -> bytes:
+    return orjson.dumps({"rows": rows, "columns": columns}, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def stream(rows: int, columns: Dict[str, np.ndarray], chunk_rows: int = 65_536) -> Iterator[bytes]:
+    """The same document as ``render``, produced ``chunk_rows`` values at a time."""
+    yield b'{"rows":' + str(rows).encode() + b',"columns":{'
+    for position, (label, values) in enumerate(columns.items()):
+        yield (b"," if position else b"") + orjson.dumps(label) + b":["
+        for start in range(0, rows, chunk_rows):
+            chunk = _dump_values(values[start:start + chunk_rows])[1:-1]
+            yield (b"," if start else b"") + chunk
+        yield b"]"
+    yield b"}}"
+
+
+def _reference(name: str, high: List[float], low: List[float], close: List[float]) -> List[float]:
+    """Straightforward pure-Python versions, for the benchmark and as a correctness check."""
+    n = len(close)
+
+    def ema_list(values, period, alpha, offset=0):
+        out = [math.nan] * n
+        seed = sum(values[offset:offset + period]) / period
+        out[offset + period - 1] = seed
+        for i in range(offset + period, n):
+            seed = alpha * values[i] + (1 - alpha) * seed
+            out[i] = seed
+        return out
+
+    if name == "sma":
+        return [math.nan] * 19 + [sum(close[i - 19:i + 1]) / 20 for i in range(19, n)]
+    if name == "ema":
+        return ema_list(close, 20, 2 / 21)
+    if name == "rsi":
+        gains = [0.0] + [max(close[i] - close[i - 1], 0.0) for i in range(1, n)]
+        losses = [0.0] + [max(close[i - 1] - close[i], 0.0) for i in range(1, n)]
+        avg_gain = ema_list(gains, 14, 1 / 14, offset=1)
+        avg_loss = ema_list(losses, 14, 1 / 14, offset=1)
+        return [math.nan if math.isnan(g) else 100.0 if l == 0 else 100 - 100 / (1 + g / l)
+                for g, l in zip(avg_gain, avg_loss)]
+    if name == "macd":
+        fast, slow = ema_list(close, 12, 2 / 13), ema_list(close, 26, 2 / 27)
+        line = [f - s for f, s in zip(fast, slow)]
+        return ema_list(line, 9, 2 / 10, offset=25)
+    if name == "bollinger":
+        out = [math.nan] * n
+        for i in range(19, n):
+            window = close[i - 19:i + 1]
+            mean = sum(window) / 20
+            out[i] = mean + 2 * math.sqrt(sum((x - mean) ** 2 for x in window) / 20)
+        return out
+    if name == "atr":
+        true_range = [high[0] - low[0]] + [
+            max(high[i] - low[i], abs(high[i] - close[i - 1]), abs(low[i] - close[i - 1])) for i in range(1, n)
+        ]
+        return ema_list(true_range, 14, 1 / 14)
+    raise KeyError(name)
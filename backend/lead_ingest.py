@@ -0,0 +1,266 @@
+import argparse
+import asyncio
+import csv
+import hashlib
+import itertools
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pydantic import EmailStr, TypeAdapter, ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+email_adapter = TypeAdapter(EmailStr)
+
+
+class LeadQueueFull(Exception):
+    pass
+
+
+def lead_id_for(email: str) -> str:
+    return f"lead_{hashlib.sha1(email.encode()).hexdigest()[:12]}"
+
+
+def lead_upsert(lead: dict) -> UpdateOne:
+    return UpdateOne({"email": lead["email"]}, {"$setOnInsert": lead}, upsert=True)
+
+
+def new_lead(email: str, name: Optional[str] = None, welcome: bool = False) -> dict:
+    lead = {
+        "lead_id": lead_id_for(email),
+        "email": email,
+        "name": name,
+        "created_at": datetime.now(timezone.utc),
+    }
+    if welcome:
+        # Cleared by the email dispatcher's welcome job once sent; upserts only set it on insert.
+        lead["welcome_pending"] = True
+    return lead
+
+
+async def write_leads(collection, leads: Iterable[dict]) -> int:
+    requests = [lead_upsert(lead) for lead in leads]
+    if not requests:
+        return 0
+    try:
+        result = await collection.bulk_write(requests, ordered=False)
+    except BulkWriteError as e:
+        if e.details.get("writeConcernErrors"):
+            raise
+        # Concurrent upserts of the same email from another worker lose the
+        # race on the unique index; the lead is stored either way. Any other
+        # per-document error is permanent for that document, so it is dropped;
+        # everything else (network, failover) propagates and is retried.
+        failed = [error for error in e.details.get("writeErrors", []) if error.get("code") != 11000]
+        if failed:
+            logger.error("Lead bulk write failed for %d documents: %s", len(failed), failed[0].get("errmsg"))
+        return e.details.get("nUpserted", 0)
+    return result.upserted_count
+
+
+async def dedupe_leads(collection) -> int:
+    """Collapse leads sharing an email onto the earliest one, so the unique email index can be built.
+
+    The survivor keeps ``welcome_pending`` only if no duplicate was already
+    welcomed. Returns the number of documents removed.
+    """
+    pipeline = [
+        {"$sort": {"_id": 1}},
+        {"$group": {"_id": "$email", "ids": {"$push": "$_id"}, "pending": {"$push": {"$ifNull": ["$welcome_pending", False]}}}},
+        {"$match": {"ids.1": {"$exists": True}}},
+    ]
+    removed = 0
+    async for group in collection.aggregate(pipeline, allowDiskUse=True):
+        keep, duplicates = group["ids"][0], group["ids"][1:]
+        if not all(group["pending"]):
+            await collection.update_one({"_id": keep}, {"$unset": {"welcome_pending": ""}})
+        result = await collection.delete_many({"_id": {"$in": duplicates}})
+        removed += result.deleted_count
+    if removed:
+        logger.warning("Removed %d duplicate leads", removed)
+    return removed
+
+
+class LeadIngestor:
+    """Write-behind queue that coalesces lead submissions into bulk upserts keyed on email.
+
+    Leads still queued when the process dies are lost: at most ``max_queue``
+    submissions, and in steady state about one flush interval of traffic.
+    A batch whose write fails is held and retried with backoff (new
+    submissions keep queueing behind it until the queue is full); only a
+    document Mongo rejects outright is dropped. Resubmitting an email that
+    is still queued returns the queued lead instead of queueing another.
+    """
+
+    def __init__(self, collection, batch_size: int = 500, flush_interval: float = 0.5, max_queue: int = 10000,
+                 max_retry_delay: float = 30.0):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retry_delay = max_retry_delay
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.flushes = 0
+        self.last_batch_size = 0
+        self.last_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+        self.upserted = 0
+        self.errors = 0
+        self._retry: list = []
+        self._queued: Dict[str, dict] = {}
+        self._stopping = asyncio.Event()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        return self.queue.qsize() + len(self._retry)
+
+    def queued(self, email: str) -> Optional[dict]:
+        return self._queued.get(email)
+
+    def submit(self, email: str, name: Optional[str] = None) -> dict:
+        if email in self._queued:
+            return self._queued[email]
+        lead = new_lead(email, name, welcome=True)
+        try:
+            self.queue.put_nowait(lead)
+        except asyncio.QueueFull:
+            raise LeadQueueFull()
+        self._queued[email] = lead
+        if self.queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+        return lead
+
+    def start(self):
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything still queued, then stop the background writer."""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+    async def _wait(self, event: asyncio.Event, timeout: float):
+        # asyncio.wait, unlike wait_for, never swallows a cancellation that
+        # races with the event firing.
+        waiter = asyncio.ensure_future(event.wait())
+        try:
+            await asyncio.wait({waiter}, timeout=timeout)
+        finally:
+            waiter.cancel()
+
+    async def _run(self):
+        retry_delay = self.flush_interval
+        while not self._stopping.is_set() or self.pending:
+            if not self._retry and self.queue.qsize() < self.batch_size and not self._stopping.is_set():
+                await self._wait(self._wakeup, self.flush_interval)
+                self._wakeup.clear()
+            batch, self._retry = self._retry, []
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            if not batch:
+                continue
+            try:
+                await self._flush(batch)
+            except Exception:
+                self.errors += 1
+                if self._stopping.is_set():
+                    logger.exception("Failed to flush %d leads during shutdown; they are lost",
+                                     len(batch) + self.queue.qsize())
+                    return
+                logger.exception("Failed to flush %d leads; retrying in %.1fs", len(batch), retry_delay)
+                self._retry = batch
+                await self._wait(self._stopping, retry_delay)
+                retry_delay = min(retry_delay * 2, self.max_retry_delay)
+            else:
+                retry_delay = self.flush_interval
+
+    async def _flush(self, batch: list):
+        coalesced = {}
+        for lead in batch:
+            coalesced.setdefault(lead["email"], lead)
+        started = time.perf_counter()
+        self.upserted += await write_leads(self.collection, coalesced.values())
+        for email in coalesced:
+            self._queued.pop(email, None)
+        self.last_flush_seconds = time.perf_counter() - started
+        self.total_flush_seconds += self.last_flush_seconds
+        self.last_batch_size = len(coalesced)
+        self.flushes += 1
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue.qsize(),
+            "retrying": len(self._retry),
+            "flushes": self.flushes,
+            "last_batch_size": self.last_batch_size,
+            "last_flush_seconds": self.last_flush_seconds,
+            "avg_flush_seconds": self.total_flush_seconds / self.flushes if self.flushes else 0.0,
+            "upserted": self.upserted,
+            "errors": self.errors,
+        }
+
+
+def _read_leads(rows: Iterator[dict], count: int) -> Tuple[List[dict], int, int]:
+    """Up to ``count`` rows as ``(leads, skipped, rows read)``; file reads and validation run in a thread."""
+    leads: Dict[str, dict] = {}
+    skipped = read = 0
+    for row in itertools.islice(rows, count):
+        read += 1
+        try:
+            email = email_adapter.validate_python((row.get("email") or "").strip())
+        except ValidationError:
+            skipped += 1
+            continue
+        leads.setdefault(email, new_lead(email, (row.get("name") or "").strip() or None))
+    return list(leads.values()), skipped, read
+
+
+async def import_leads_csv(collection, lines: Iterable[str], batch_size: int = 1000) -> dict:
+    """Stream a CSV with an ``email`` column (and optional ``name``) into email_leads.
+
+    Rows are read and validated ``batch_size`` at a time off the event loop,
+    so a large upload never stalls other requests between writes.
+    """
+    imported = skipped = 0
+    rows = csv.DictReader(lines)
+    while True:
+        leads, rejected, read = await asyncio.to_thread(_read_leads, rows, batch_size)
+        skipped += rejected
+        imported += await write_leads(collection, leads)
+        if read < batch_size:
+            return {"imported": imported, "skipped": skipped}
+
+
+async def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Bulk import email leads from a CSV file")
+    parser.add_argument("csv_path", type=Path)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+    try:
+        with args.csv_path.open(newline="", encoding="utf-8") as f:
+            result = await import_leads_csv(client[os.environ['DB_NAME']].email_leads, f, args.batch_size)
+    finally:
+        client.close()
+    print(f"imported {result['imported']}, skipped {result['skipped']}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,279 @@
+import asyncio
+import csv
+import logging
+import random
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+Feed = AsyncIterator[List[dict]]
+
+
+def now_ms() -> int:
+    return time.time_ns() // 1_000_000
+
+
+async def synthetic_feed(symbols: List[str], ticks_per_second: float = 1000.0, batch_interval: float = 0.05,
+                         seed: Optional[int] = None) -> Feed:
+    """Random-walk quotes for ``symbols``, yielded every ``batch_interval`` seconds."""
+    rng = random.Random(seed)
+    prices = {symbol: 100.0 for symbol in symbols}
+    per_batch = max(1, round(ticks_per_second * batch_interval))
+    while True:
+        stamp = now_ms()
+        batch = []
+        for _ in range(per_batch):
+            symbol = rng.choice(symbols)
+            prices[symbol] *= 1 + rng.gauss(0, 0.0005)
+            batch.append({"s": symbol, "p": round(prices[symbol], 4), "v": rng.randint(1, 500), "t": stamp})
+        yield batch
+        await asyncio.sleep(batch_interval)
+
+
+async def replay_feed(path: Path, speed: float = 1.0, loop: bool = True, batch_interval: float = 0.05) -> Feed:
+    """Replay a ``timestamp,symbol,price,size`` CSV (timestamp in epoch ms) at ``speed`` x real time.
+
+    Ticks are re-stamped with the current time and grouped into one batch
+    per ``batch_interval`` of replayed time.
+    """
+    while True:
+        with open(path, newline="") as handle:
+            rows = csv.DictReader(handle)
+            started = time.monotonic()
+            first = None
+            batch: List[dict] = []
+            batch_until = 0.0
+            for row in rows:
+                offset = float(row["timestamp"]) / 1000
+                first = offset if first is None else first
+                due = (offset - first) / speed
+                if batch and due >= batch_until:
+                    yield batch
+                    batch = []
+                if not batch:
+                    batch_until = due + batch_interval
+                    delay = due - (time.monotonic() - started)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                batch.append({"s": row["symbol"], "p": float(row["price"]), "v": float(row.get("size") or 0), "t": now_ms()})
+            if batch:
+                yield batch
+        if not loop:
+            return
+
+
+def make_feed(spec: str) -> Optional[Feed]:
+    """``synthetic:AAPL,MSFT[@ticks_per_second]``, ``replay:<path>[@speed]`` or empty for no feed."""
+    kind, _, argument = spec.partition(":")
+    argument, _, rate = argument.partition("@")
+    if kind == "synthetic":
+        symbols = [symbol.strip().upper() for symbol in argument.split(",") if symbol.strip()] or ["SPY"]
+        return synthetic_feed(symbols, float(rate or 1000))
+    if kind == "replay":
+        return replay_feed(Path(argument), float(rate or 1))
+    if spec:
+        raise ValueError(f"Unknown market feed {spec!r}")
+    return None
+
+
+class Subscriber:
+    """One connection's outbox: the latest undelivered tick per symbol.
+
+    ``offer`` never blocks. A tick for a symbol that is still waiting to be
+    sent replaces the stale one, so a slow client costs at most one tick per
+    subscribed symbol and simply receives fewer, fresher updates.
+    """
+
+    __slots__ = ("send", "symbols", "pending", "notices", "wakeup", "conflated", "frames", "sending_since", "writer")
+
+    def __init__(self, send: Callable[[str], Awaitable[None]]):
+        self.send = send
+        self.symbols: Set[str] = set()
+        self.pending: Dict[str, bytes] = {}
+        self.notices: List[bytes] = []
+        self.wakeup = asyncio.Event()
+        self.conflated = 0
+        self.frames = 0
+        self.sending_since = 0.0
+        self.writer: Optional[asyncio.Task] = None
+
+    def offer(self, symbol: str, payload: bytes):
+        pending = self.pending
+        if symbol in pending:
+            # Already woken: the writer clears wakeup and takes pending in one step.
+            self.conflated += 1
+            pending[symbol] = payload
+            return
+        pending[symbol] = payload
+        self.wakeup.set()
+
+    def notify(self, message: dict):
+        self.notices.append(orjson.dumps(message))
+        self.wakeup.set()
+
+    async def run(self, frame_interval: float):
+        """Send everything pending as one frame per wakeup."""
+        while True:
+            await self.wakeup.wait()
+            if frame_interval:
+                await asyncio.sleep(frame_interval)
+            self.wakeup.clear()
+            notices, self.notices = self.notices, []
+            pending, self.pending = self.pending, {}
+            for notice in notices:
+                await self._send(notice)
+            if pending:
+                await self._send(b'{"type":"ticks","data":[' + b",".join(pending.values()) + b"]}")
+                self.frames += 1
+
+    async def _send(self, frame: bytes):
+        # Timed by MarketHub's watchdog rather than wait_for, which would add a task per frame.
+        self.sending_since = time.monotonic()
+        await self.send(frame.decode())
+        self.sending_since = 0.0
+
+
+class MarketHub:
+    """Fans ticks from one feed out to WebSocket subscribers by symbol.
+
+    Each tick is serialized once and handed to every subscriber's
+    conflating outbox; per-connection writer tasks do the sending, so the
+    broadcaster never waits on a client. New subscriptions get the last
+    tick of each symbol straight away.
+    """
+
+    def __init__(self, max_connections: int = 20_000, max_symbols: int = 50, frame_interval: float = 0.0,
+                 send_timeout: float = 10.0):
+        self.max_connections = max_connections
+        self.max_symbols = max_symbols
+        self.frame_interval = frame_interval
+        self.send_timeout = send_timeout
+        self.subscribers: Dict[str, Set[Subscriber]] = defaultdict(set)
+        self.last: Dict[str, bytes] = {}
+        self.connections = 0
+        self.published = 0
+        self.slow_disconnects = 0
+        self._conflated_closed = 0
+        self._clients: Set[Subscriber] = set()
+        self._feed_task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[asyncio.Task] = None
+
+    @property
+    def conflated(self) -> int:
+        return self._conflated_closed + sum(client.conflated for client in self._clients)
+
+    @property
+    def full(self) -> bool:
+        return self.connections >= self.max_connections
+
+    def publish(self, ticks: Iterable[dict]):
+        for tick in ticks:
+            symbol = tick["s"]
+            payload = self.last[symbol] = orjson.dumps(tick)
+            for subscriber in self.subscribers.get(symbol, ()):
+                subscriber.offer(symbol, payload)
+            self.published += 1
+
+    def subscribe(self, subscriber: Subscriber, symbols: Iterable[str]):
+        for symbol in symbols:
+            if symbol in subscriber.symbols:
+                continue
+            if len(subscriber.symbols) >= self.max_symbols:
+                subscriber.notify({"type": "error", "detail": f"At most {self.max_symbols} symbols per connection"})
+                break
+            subscriber.symbols.add(symbol)
+            self.subscribers[symbol].add(subscriber)
+            if symbol in self.last:
+                subscriber.offer(symbol, self.last[symbol])
+
+    def unsubscribe(self, subscriber: Subscriber, symbols: Optional[Iterable[str]] = None):
+        for symbol in list(subscriber.symbols if symbols is None else symbols):
+            subscriber.symbols.discard(symbol)
+            subscribers = self.subscribers.get(symbol)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self.subscribers[symbol]
+
+    def handle(self, subscriber: Subscriber, message: str):
+        """``{"action": "subscribe" | "unsubscribe", "symbols": [...]}``"""
+        try:
+            data = orjson.loads(message)
+            action, symbols = data["action"], [str(symbol).upper() for symbol in data["symbols"]]
+        except (orjson.JSONDecodeError, KeyError, TypeError):
+            subscriber.notify({"type": "error", "detail": 'Expected {"action": "subscribe", "symbols": [...]}'})
+            return
+        if action == "subscribe":
+            self.subscribe(subscriber, symbols)
+        elif action == "unsubscribe":
+            self.unsubscribe(subscriber, symbols)
+        else:
+            subscriber.notify({"type": "error", "detail": f"Unknown action {action!r}"})
+            return
+        subscriber.notify({"type": "subscribed", "symbols": sorted(subscriber.symbols)})
+
+    async def serve(self, receive: Callable[[], Awaitable[str]], send: Callable[[str], Awaitable[None]]):
+        """Run one accepted connection until the client leaves or stops keeping up."""
+        if self._watchdog is None:
+            self._watchdog = asyncio.create_task(self._disconnect_stalled())
+        subscriber = Subscriber(send)
+        self.connections += 1
+        self._clients.add(subscriber)
+        writer = subscriber.writer = asyncio.create_task(subscriber.run(self.frame_interval))
+
+        async def read():
+            while True:
+                self.handle(subscriber, await receive())
+
+        reader = asyncio.create_task(read())
+        try:
+            done, _ = await asyncio.wait({reader, writer}, return_when=asyncio.FIRST_COMPLETED)
+            if writer in done and writer.cancelled():
+                self.slow_disconnects += 1
+        finally:
+            reader.cancel()
+            writer.cancel()
+            await asyncio.gather(reader, writer, return_exceptions=True)
+            self.unsubscribe(subscriber)
+            self._clients.discard(subscriber)
+            self._conflated_closed += subscriber.conflated
+            self.connections -= 1
+
+    async def _disconnect_stalled(self):
+        """Drop clients whose current send has been blocked for ``send_timeout`` (full socket buffer)."""
+        while True:
+            await asyncio.sleep(self.send_timeout / 2)
+            cutoff = time.monotonic() - self.send_timeout
+            for subscriber in list(self._clients):
+                if 0 < subscriber.sending_since < cutoff:
+                    subscriber.writer.cancel()
+
+    async def _pump(self, feed: Feed):
+        async for batch in feed:
+            self.publish(batch)
+        logger.info("Market feed finished")
+
+    def start(self, feed: Optional[Feed]):
+        if feed is not None and self._feed_task is None:
+            self._feed_task = asyncio.create_task(self._pump(feed))
+
+    async def stop(self):
+        for task in (self._feed_task, self._watchdog):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._feed_task = self._watchdog = None
+
+    def stats(self) -> dict:
+        return {
+            "connections": self.connections,
+            "symbols": len(self.subscribers),
+            "published": self.published,
+            "conflated": self.conflated,
+            "slow_disconnects": self.slow_disconnects,
+        }
@@ -0,0 +1,270 @@
+import bisect
+import heapq
+import itertools
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pymongo import monitoring
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_request_spans: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_spans", default=None)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Tuple[str, ...] = (), amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    def dec(self, labels: Tuple[str, ...] = (), amount: float = 1.0):
+        self.inc(labels, -amount)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, label_names: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            cumulative = itertools.accumulate(counts)
+            for bound, running in zip(self.buckets + (float("inf"),), cumulative):
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _format_labels(self.label_names, labels, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {running}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._callbacks: List[Tuple[str, str, Callable[[], float]]] = []
+
+    def counter(self, name: str, help: str, label_names: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help: str, label_names: Tuple[str, ...] = ()) -> Gauge:
+        metric = Gauge(name, help, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, label_names: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, label_names, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge_callback(self, name: str, help: str, fn: Callable[[], float]):
+        """Report ``fn()`` as a gauge at scrape time, for stats owned by other components."""
+        self._callbacks.append((name, help, fn))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for name, help, fn in self._callbacks:
+            lines.extend([f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {fn()}"])
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_seconds = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route")
+)
+http_requests_total = registry.counter(
+    "http_requests_total", "HTTP requests by route and status class", ("method", "route", "status")
+)
+http_requests_in_flight = registry.gauge("http_requests_in_flight", "HTTP requests currently being served")
+mongo_command_seconds = registry.histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency by collection", ("collection", "command")
+)
+mongo_command_errors_total = registry.counter(
+    "mongo_command_errors_total", "Failed MongoDB commands by collection", ("collection", "command")
+)
+password_hash_seconds = registry.histogram(
+    "password_hash_duration_seconds", "bcrypt hash/verify latency including pool wait", ("operation",)
+)
+upstream_request_seconds = registry.histogram(
+    "upstream_request_duration_seconds", "Outbound HTTP call latency", ("upstream",)
+)
+rate_limited_total = registry.counter("rate_limited_total", "Requests rejected with 429 by limit", ("limit",))
+
+
+def add_span(category: str, seconds: float):
+    spans = _request_spans.get()
+    if spans is not None:
+        spans[category] = spans.get(category, 0.0) + seconds
+
+
+@contextmanager
+def span(category: str, histogram: Optional[Histogram] = None, labels: Tuple[str, ...] = ()):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        add_span(category, elapsed)
+        if histogram is not None:
+            histogram.observe(labels, elapsed)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Times every Motor/PyMongo command and attributes it to the current request's ``db`` span.
+
+    Motor runs commands on its executor with a copy of the caller's context,
+    so the request's span dict is visible from the listener thread.
+    """
+
+    def __init__(self):
+        self._pending: Dict[Tuple[int, int], Tuple[str, Optional[Dict[str, float]]]] = {}
+
+    def started(self, event):
+        if event.command_name == "getMore":
+            collection = event.command.get("collection")
+        else:
+            collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = event.database_name
+        self._pending[(event.request_id, event.operation_id)] = (collection, _request_spans.get())
+
+    def _finish(self, event) -> Tuple[str, float]:
+        collection, spans = self._pending.pop((event.request_id, event.operation_id), ("unknown", None))
+        seconds = event.duration_micros / 1e6
+        mongo_command_seconds.observe((collection, event.command_name), seconds)
+        if spans is not None:
+            spans["db"] = spans.get("db", 0.0) + seconds
+        return collection, seconds
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        collection, _ = self._finish(event)
+        mongo_command_errors_total.inc((collection, event.command_name))
+
+
+class SlowRequestProfiler:
+    """Keeps the ``keep`` slowest sampled requests with their span breakdown."""
+
+    def __init__(self, enabled: bool = False, sample_rate: float = 1.0, keep: int = 50):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.keep = keep
+        self._heap: List[Tuple[float, int, dict]] = []
+        self._counter = itertools.count()
+
+    def record(self, method: str, path: str, route: str, status: int, seconds: float, spans: Dict[str, float]):
+        if not self.enabled or (self.sample_rate < 1.0 and random.random() >= self.sample_rate):
+            return
+        if len(self._heap) >= self.keep and seconds <= self._heap[0][0]:
+            return
+        breakdown = dict(spans)
+        breakdown["app"] = max(seconds - sum(spans.values()), 0.0)
+        entry = {
+            "method": method,
+            "path": path,
+            "route": route,
+            "status": status,
+            "duration_seconds": seconds,
+            "spans": breakdown,
+            "at": time.time(),
+        }
+        item = (seconds, next(self._counter), entry)
+        if len(self._heap) >= self.keep:
+            heapq.heapreplace(self._heap, item)
+        else:
+            heapq.heappush(self._heap, item)
+
+    def slowest(self) -> List[dict]:
+        return [entry for _, _, entry in sorted(self._heap, reverse=True)]
+
+    def reset(self):
+        self._heap.clear()
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-route latency, status and in-flight counts."""
+
+    def __init__(self, app, profiler: Optional[SlowRequestProfiler] = None):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        spans: Dict[str, float] = {}
+        token = _request_spans.set(spans)
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_requests_in_flight.dec()
+            _request_spans.reset(token)
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            http_request_seconds.observe((method, route_path), elapsed)
+            http_requests_total.inc((method, route_path, f"{status[0] // 100}xx"))
+            if self.profiler is not None:
+                self.profiler.record(method, scope["path"], route_path, status[0], elapsed, spans)
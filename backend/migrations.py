@@ -0,0 +1,94 @@
+import argparse
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+from pymongo import ASCENDING, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+DATE_FIELDS: Dict[str, List[str]] = {
+    "users": ["created_at"],
+    "user_sessions": ["expires_at", "created_at"],
+    "blog_posts": ["published_at"],
+    "email_leads": ["created_at"],
+}
+
+ISO_DATES_MIGRATION = "iso_dates_to_bson"
+
+
+def _parse_iso(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+async def _migrate_collection(db, collection: str, fields: List[str], batch_size: int) -> int:
+    checkpoint_id = f"{ISO_DATES_MIGRATION}:{collection}"
+    checkpoint = await db.migrations.find_one({"_id": checkpoint_id})
+    query = {"$or": [{field: {"$type": "string"}} for field in fields]}
+    if checkpoint and checkpoint.get("last_id") is not None:
+        query = {"$and": [query, {"_id": {"$gt": checkpoint["last_id"]}}]}
+
+    projection = {field: 1 for field in fields}
+    cursor = db[collection].find(query, projection).sort("_id", ASCENDING).batch_size(batch_size)
+    converted = 0
+    batch = []
+    async for doc in cursor:
+        updates = {field: _parse_iso(doc[field]) for field in fields if isinstance(doc.get(field), str)}
+        batch.append(UpdateOne({"_id": doc["_id"]}, {"$set": updates}))
+        if len(batch) >= batch_size:
+            converted += await _flush(db, collection, checkpoint_id, batch, doc["_id"])
+            batch = []
+    if batch:
+        converted += await _flush(db, collection, checkpoint_id, batch, doc["_id"])
+    return converted
+
+
+async def _flush(db, collection: str, checkpoint_id: str, batch: list, last_id) -> int:
+    await db[collection].bulk_write(batch, ordered=False)
+    await db.migrations.update_one({"_id": checkpoint_id}, {"$set": {"last_id": last_id}}, upsert=True)
+    return len(batch)
+
+
+async def migrate_iso_dates(db, batch_size: int = 1000) -> Dict[str, int]:
+    """Convert ISO-string timestamps to native BSON dates, resuming from the last checkpoint."""
+    if await db.migrations.find_one({"_id": ISO_DATES_MIGRATION, "completed_at": {"$exists": True}}):
+        return {}
+    results = {}
+    for collection, fields in DATE_FIELDS.items():
+        results[collection] = await _migrate_collection(db, collection, fields, batch_size)
+        logger.info("Converted %d %s documents to BSON dates", results[collection], collection)
+    await db.migrations.update_one(
+        {"_id": ISO_DATES_MIGRATION},
+        {"$set": {"completed_at": datetime.now(timezone.utc), "converted": results}},
+        upsert=True,
+    )
+    return results
+
+
+async def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Convert ISO-string timestamps to BSON dates")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+    try:
+        results = await migrate_iso_dates(client[os.environ['DB_NAME']], args.batch_size)
+    finally:
+        client.close()
+    for collection, count in results.items():
+        print(f"{collection}: {count} converted")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
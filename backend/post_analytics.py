@@ -0,0 +1,185 @@
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+VIEW, READ = "views", "reads"
+
+
+_day: Tuple[int, str] = (-1, "")
+
+
+def today() -> str:
+    global _day
+    epoch_day = int(time.time() // 86400)
+    if epoch_day != _day[0]:
+        _day = (epoch_day, datetime.fromtimestamp(epoch_day * 86400, timezone.utc).strftime("%Y-%m-%d"))
+    return _day[1]
+
+
+class HyperLogLog:
+    """Approximate distinct count in ``2 ** precision`` one-byte registers (std. error ~1.04 / sqrt(m)).
+
+    Registers only ever grow, so sketches from several workers merge by
+    taking the per-register maximum, which Mongo does with ``$max``.
+    """
+
+    def __init__(self, precision: int = 10):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, item: str) -> Optional[Tuple[int, int]]:
+        """Returns ``(index, rank)`` when a register increased, else None."""
+        digest = int.from_bytes(hashlib.blake2b(item.encode(), digest_size=8).digest(), "big")
+        index = digest >> (64 - self.precision)
+        remaining = 64 - self.precision
+        rank = remaining - (digest & ((1 << remaining) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return index, rank
+        return None
+
+    def merge(self, registers: Dict[str, int]):
+        for index, rank in registers.items():
+            index = int(index)
+            if rank > self.registers[index]:
+                self.registers[index] = rank
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -rank for rank in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+
+class ViewRecorder:
+    """Per-post view/read counters and unique-visitor sketches, flushed as bulk ``$inc``/``$max`` upserts.
+
+    ``record`` only touches memory; every ``flush_interval`` the counts for
+    each (slug, day) become one upsert into ``post_stats_daily``, however
+    many views they cover. A crash loses at most the views recorded since
+    the last flush (one interval of traffic); a graceful shutdown flushes
+    them. If a flush fails its counts are put back and retried, so a write
+    that failed after partly applying can count those views twice.
+    """
+
+    def __init__(self, collection, flush_interval: float = 5.0, precision: int = 10, retention_days: int = 90):
+        self.collection = collection
+        self.flush_interval = flush_interval
+        self.precision = precision
+        self.retention = timedelta(days=retention_days)
+        self.recorded = 0
+        self.flushes = 0
+        self.writes = 0
+        self.errors = 0
+        self._counts: Dict[Tuple[str, str], Dict[str, int]] = defaultdict(lambda: {VIEW: 0, READ: 0})
+        self._sketches: Dict[Tuple[str, str], HyperLogLog] = {}
+        self._raised: Dict[Tuple[str, str], Dict[str, int]] = defaultdict(dict)
+        self._stopping = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, slug: str, visitor: str, kind: str = VIEW):
+        key = (slug, today())
+        self._counts[key][kind] += 1
+        self.recorded += 1
+        sketch = self._sketches.get(key)
+        if sketch is None:
+            sketch = self._sketches[key] = HyperLogLog(self.precision)
+        raised = sketch.add(visitor)
+        if raised is not None:
+            self._raised[key][str(raised[0])] = raised[1]
+
+    def _operations(self, counts, raised) -> List[UpdateOne]:
+        operations = []
+        for key in counts.keys() | raised.keys():
+            slug, day = key
+            update = {"$setOnInsert": {"expires_at": datetime.fromisoformat(day).replace(tzinfo=timezone.utc) + self.retention}}
+            increments = {field: value for field, value in counts.get(key, {}).items() if value}
+            if increments:
+                update["$inc"] = increments
+            if raised.get(key):
+                update["$max"] = {f"visitors.{index}": rank for index, rank in raised[key].items()}
+            operations.append(UpdateOne({"slug": slug, "day": day}, update, upsert=True))
+        return operations
+
+    async def flush(self):
+        counts, self._counts = self._counts, defaultdict(lambda: {VIEW: 0, READ: 0})
+        raised, self._raised = self._raised, defaultdict(dict)
+        # Sketches of past days can no longer change locally.
+        current = today()
+        for key in [key for key in self._sketches if key[1] != current]:
+            del self._sketches[key]
+        operations = self._operations(counts, raised)
+        if not operations:
+            return
+        try:
+            await self.collection.bulk_write(operations, ordered=False)
+        except Exception:
+            self.errors += 1
+            logger.exception("Failed to flush post stats for %d posts; retrying next interval", len(operations))
+            for key, values in counts.items():
+                for field, value in values.items():
+                    self._counts[key][field] += value
+            for key, registers in raised.items():
+                merged = self._raised[key]
+                for index, rank in registers.items():
+                    merged[index] = max(rank, merged.get(index, 0))
+            return
+        self.flushes += 1
+        self.writes += len(operations)
+
+    def start(self):
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._stopping.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            waiter = asyncio.ensure_future(self._stopping.wait())
+            try:
+                await asyncio.wait({waiter}, timeout=self.flush_interval)
+            finally:
+                waiter.cancel()
+            await self.flush()
+
+    @property
+    def pending(self) -> int:
+        return len(self._counts)
+
+    def stats(self) -> dict:
+        return {"recorded": self.recorded, "flushes": self.flushes, "writes": self.writes, "errors": self.errors,
+                "pending": self.pending}
+
+
+async def popular_posts(collection, days: int, limit: int, precision: int = 10) -> List[dict]:
+    """Top ``limit`` slugs by views over the last ``days`` days, with reads and approximate unique visitors."""
+    since = (datetime.now(timezone.utc) - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    totals: Dict[str, dict] = {}
+    sketches: Dict[str, HyperLogLog] = {}
+    async for doc in collection.find({"day": {"$gte": since}}, {"_id": 0, "slug": 1, VIEW: 1, READ: 1, "visitors": 1}):
+        total = totals.setdefault(doc["slug"], {"slug": doc["slug"], VIEW: 0, READ: 0})
+        total[VIEW] += doc.get(VIEW, 0)
+        total[READ] += doc.get(READ, 0)
+        sketches.setdefault(doc["slug"], HyperLogLog(precision)).merge(doc.get("visitors", {}))
+    ranked = sorted(totals.values(), key=lambda total: total[VIEW], reverse=True)[:limit]
+    for total in ranked:
+        total["unique_visitors"] = sketches[total["slug"]].count()
+    return ranked
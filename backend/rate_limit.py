@@ -0,0 +1,193 @@
+import ipaddress
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+
+def parse_rate(spec: str) -> Tuple[int, float]:
+    """``"10/60"`` -> 10 requests per 60 seconds."""
+    limit, _, period = spec.partition("/")
+    return int(limit), float(period or 1)
+
+
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+def parse_networks(spec: str) -> List[Network]:
+    """``"10.0.0.0/8, 127.0.0.1"`` -> networks; a bare address is a single-host network."""
+    return [ipaddress.ip_network(part.strip(), strict=False) for part in spec.split(",") if part.strip()]
+
+
+def client_address(peer: str, forwarded_for: Optional[str], trusted_proxies: Sequence[Network]) -> str:
+    """The address the request came from, looking through trusted proxies only.
+
+    ``X-Forwarded-For`` is read right to left, starting from the connected
+    peer, and the first hop that is not one of ``trusted_proxies`` wins.
+    Anything further left was written by the client and is ignored, so a
+    forged header cannot pick the key; with no trusted proxies the peer is
+    used as is.
+    """
+    hops = [peer] + [hop.strip() for hop in reversed((forwarded_for or "").split(",")) if hop.strip()]
+    for hop in hops:
+        try:
+            address = ipaddress.ip_address(hop)
+        except ValueError:
+            return hop
+        if not any(address in network for network in trusted_proxies):
+            return hop
+    return hops[-1]
+
+
+class RateLimiter:
+    """Per-key token buckets: ``limit`` requests per ``period`` with bursts up to ``limit``.
+
+    Keys are spread over ``shards`` independently locked LRU maps of at most
+    ``max_keys / shards`` buckets; a full shard drops its least recently used
+    bucket, so new keys are never refused for lack of room. Dropping a bucket
+    that had refilled loses nothing. One that was still draining is counted
+    in ``early_evictions``: its key starts over with a full bucket, which is
+    what a flood of fresh keys can buy, so size ``max_keys`` well above the
+    keys active within one period and alert on that counter.
+    """
+
+    def __init__(self, name: str, limit: int, period: float, shards: int = 16, max_keys: int = 100_000):
+        self.name = name
+        self.limit = limit
+        self.period = period
+        self.rate = limit / period
+        self.rejected = 0
+        self.evictions = 0
+        self.early_evictions = 0
+        self._max_keys_per_shard = max(1, max_keys // shards)
+        self._shards: List[Tuple[threading.Lock, "OrderedDict[str, list]"]] = [
+            (threading.Lock(), OrderedDict()) for _ in range(shards)
+        ]
+
+    def __len__(self) -> int:
+        return sum(len(buckets) for _, buckets in self._shards)
+
+    def hit(self, key: str) -> float:
+        """Take one token for ``key``; returns 0 when allowed, else seconds until a token is free."""
+        lock, buckets = self._shards[hash(key) % len(self._shards)]
+        now = time.monotonic()
+        with lock:
+            bucket = buckets.get(key)
+            if bucket is None:
+                if len(buckets) >= self._max_keys_per_shard:
+                    _, (evicted_tokens, evicted_at) = buckets.popitem(last=False)
+                    self.evictions += 1
+                    if evicted_tokens + (now - evicted_at) * self.rate < self.limit:
+                        self.early_evictions += 1
+                tokens = float(self.limit)
+                bucket = buckets[key] = [tokens, now]
+            else:
+                tokens = min(float(self.limit), bucket[0] + (now - bucket[1]) * self.rate)
+                buckets.move_to_end(key)
+            bucket[1] = now
+            if tokens >= 1:
+                bucket[0] = tokens - 1
+                return 0.0
+            bucket[0] = tokens
+            self.rejected += 1
+            return (1 - tokens) / self.rate
+
+    def stats(self) -> Dict[str, float]:
+        return {"keys": len(self), "rejected": self.rejected, "evictions": self.evictions,
+                "early_evictions": self.early_evictions}
+
+
+# GCRA on Redis server time: the key holds the theoretical arrival time (ms)
+# of the next request and expires once the bucket would be full again.
+_GCRA_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local interval = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local tat = math.max(tonumber(redis.call('GET', KEYS[1]) or now), now)
+local allow_at = tat + interval - period
+if now < allow_at then
+    return allow_at - now
+end
+tat = tat + interval
+redis.call('SET', KEYS[1], tat, 'PX', tat - now)
+return 0
+"""
+
+
+class RedisRateLimiter:
+    """The same limit enforced across workers through any Redis-protocol server.
+
+    If Redis is unreachable or slower than ``timeout`` the request is let
+    through (the per-worker limit still applies) and the error is counted
+    and logged at most once per ``log_interval`` seconds.
+    """
+
+    def __init__(self, name: str, limit: int, period: float, url: str, prefix: str = "ta:ratelimit:",
+                 timeout: float = 0.25, log_interval: float = 60.0):
+        import redis.asyncio as redis
+        from redis.exceptions import RedisError
+
+        self.name = name
+        self.limit = limit
+        self.period = period
+        self.redis = redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        self.prefix = f"{prefix}{name}:"
+        self.errors = 0
+        self.log_interval = log_interval
+        self._logged_at = -math.inf
+        self._redis_errors = (RedisError, OSError)
+        self._gcra = self.redis.register_script(_GCRA_SCRIPT)
+
+    async def hit(self, key: str) -> float:
+        period_ms = math.ceil(self.period * 1000)
+        try:
+            wait_ms = await self._gcra(keys=[self.prefix + key], args=[period_ms // self.limit, period_ms])
+        except self._redis_errors as e:
+            self.errors += 1
+            if time.monotonic() - self._logged_at >= self.log_interval:
+                self._logged_at = time.monotonic()
+                logger.warning("Shared rate limit %s unavailable, using the per-worker limit only (%d errors): %s",
+                               self.name, self.errors, e)
+            return 0.0
+        return int(wait_ms) / 1000
+
+    async def close(self):
+        await self.redis.aclose()
+
+
+class RateLimits:
+    """Named limits checked in order; the optional shared tier only sees requests the local tier let through."""
+
+    def __init__(self, rates: Dict[str, str], enabled: bool = True, redis_url: Optional[str] = None,
+                 max_keys: int = 100_000):
+        self.enabled = enabled
+        self.local = {name: RateLimiter(name, *parse_rate(spec), max_keys=max_keys) for name, spec in rates.items()}
+        self.shared = {}
+        if redis_url:
+            self.shared = {name: RedisRateLimiter(name, *parse_rate(spec), redis_url) for name, spec in rates.items()}
+
+    async def check(self, name: str, key: str) -> float:
+        if not self.enabled:
+            return 0.0
+        retry_after = self.local[name].hit(key)
+        if not retry_after and name in self.shared:
+            retry_after = await self.shared[name].hit(key)
+        return retry_after
+
+    def rejected(self) -> int:
+        return sum(limiter.rejected for limiter in self.local.values())
+
+    def early_evictions(self) -> int:
+        return sum(limiter.early_evictions for limiter in self.local.values())
+
+    def shared_errors(self) -> int:
+        return sum(limiter.errors for limiter in self.shared.values())
+
+    async def close(self):
+        for limiter in self.shared.values():
+            await limiter.close()
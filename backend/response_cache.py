@@ -0,0 +1,155 @@
+import gzip
+import hashlib
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Dict, Hashable, Optional
+
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# Bodies smaller than this go out uncompressed; the framing overhead eats the gain.
+COMPRESS_MIN_BYTES = 512
+
+# In server preference order. Compressed bodies are memoized per entry.
+# Request-time misses run on the event loop and their cache keys are client
+# controlled, so they use cheap levels; the slow top levels are only paid
+# by precompress(), for the entries warmed after each content change.
+ENCODERS = {}
+PRECOMPRESS_ENCODERS = {}
+if brotli is not None:
+    ENCODERS["br"] = lambda body: brotli.compress(body, quality=5)
+    PRECOMPRESS_ENCODERS["br"] = lambda body: brotli.compress(body, quality=11)
+ENCODERS["gzip"] = lambda body: gzip.compress(body, compresslevel=6, mtime=0)
+PRECOMPRESS_ENCODERS["gzip"] = lambda body: gzip.compress(body, compresslevel=9, mtime=0)
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick the preferred content-coding the client accepts, or None for identity."""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip().lower()] = weight
+    for coding in ENCODERS:
+        if weights.get(coding, weights.get("*", 0.0)) > 0:
+            return coding
+    return None
+
+
+def _base_etag(tag: str) -> str:
+    # Encoded variants carry '"<hash>-<coding>"'; the hash itself is hex.
+    return '"' + tag.removeprefix("W/").strip('"').partition("-")[0] + '"'
+
+
+class CachedResponse:
+    __slots__ = ("body", "etag", "headers", "expires", "_encoded")
+
+    def __init__(self, body: bytes, last_modified: Optional[datetime], headers: Dict[str, str], max_age: int):
+        self.body = body
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.headers = {
+            "ETag": self.etag,
+            "Cache-Control": f"public, max-age={max_age}",
+            "Vary": "Accept-Encoding",
+            **headers,
+        }
+        if last_modified is not None:
+            if last_modified.tzinfo is None:
+                last_modified = last_modified.replace(tzinfo=timezone.utc)
+            self.headers["Last-Modified"] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+        self.expires = time.monotonic() + max_age
+        self._encoded: Dict[str, bytes] = {}
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or any(_base_etag(tag) == self.etag for tag in tags)
+
+    def encoded_body(self, encoding: str) -> bytes:
+        body = self._encoded.get(encoding)
+        if body is None:
+            body = self._encoded[encoding] = ENCODERS[encoding](self.body)
+        return body
+
+    def precompress(self):
+        if len(self.body) >= COMPRESS_MIN_BYTES:
+            for encoding, encode in PRECOMPRESS_ENCODERS.items():
+                self._encoded[encoding] = encode(self.body)
+
+    def to_response(self, if_none_match: Optional[str] = None, accept_encoding: Optional[str] = None) -> Response:
+        encoding = negotiate_encoding(accept_encoding) if len(self.body) >= COMPRESS_MIN_BYTES else None
+        headers = self.headers
+        if encoding is not None:
+            headers = {**headers, "ETag": self.etag[:-1] + "-" + encoding + '"'}
+        if self.matches(if_none_match):
+            return Response(status_code=304, headers=headers)
+        if encoding is None:
+            return Response(content=self.body, media_type="application/json", headers=headers)
+        headers["Content-Encoding"] = encoding
+        return Response(content=self.encoded_body(encoding), media_type="application/json", headers=headers)
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """Static files whose names change with their content, so clients may cache them forever."""
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+
+class ResponseCache:
+    """Pre-serialized JSON bodies keyed per route arguments, dropped on every version bump.
+
+    The content version is per process; max_age bounds how long another
+    worker can keep serving a body after posts change.
+    """
+
+    def __init__(self, maxsize: int = 1024, max_age: int = 60):
+        self.maxsize = maxsize
+        self.max_age = max_age
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None or entry.expires < time.monotonic():
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def store(self, key: Hashable, body: bytes, last_modified: Optional[datetime] = None,
+              headers: Optional[Dict[str, str]] = None) -> CachedResponse:
+        entry = CachedResponse(body, last_modified, headers or {}, self.max_age)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return entry
+
+    def bump_version(self):
+        self.version += 1
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"version": self.version, "size": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,32 @@
+from typing import Any
+
+import orjson
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+
+
+def _default(value: Any):
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize already-validated content straight to UTF-8 JSON bytes.
+
+    Models are dumped without re-validation; UTC datetimes are written with
+    a ``Z`` suffix, matching what Pydantic emits through ``jsonable_encoder``.
+    """
+    return orjson.dumps(content, default=_default, option=orjson.OPT_UTC_Z)
+
+
+class FastJSONResponse(JSONResponse):
+    """Opt-in response class for routes that return validated models.
+
+    Return an instance directly from the route so FastAPI skips the
+    ``response_model`` re-validation and ``jsonable_encoder`` pass; keep
+    ``response_model`` on the decorator for the OpenAPI schema.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -1,36 +1,256 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, Response, Request
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, File, Form, Header, Query, Response, Request, UploadFile, WebSocket
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+import orjson
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from pydantic import AwareDatetime, BaseModel, Field, ConfigDict, EmailStr, TypeAdapter, ValidationError
+from typing import Annotated, Dict, List, Optional
+import asyncio
+import base64
+import hmac
+import io
+import json
+import math
+import shutil
+import tempfile
+import time
 import uuid
 from datetime import datetime, timezone, timedelta
-from passlib.context import CryptContext
-from jose import JWTError, jwt
-import httpx
+
+from backtest_jobs import BacktestLimitExceeded, BacktestRunner
+from course_progress import ProgressCache, ProgressIngestor, ProgressQueueFull, resume_point
+from hashing import HashPoolSaturated, PasswordHasher
+from indexes import BLOG_LISTING_SORT, ensure_indexes, index_fingerprint, missing_indexes, verify_query_plans
+from lead_ingest import LeadIngestor, LeadQueueFull, dedupe_leads, import_leads_csv
+from market_data import MarketHub, make_feed
+from metrics import (
+    MetricsMiddleware,
+    MongoCommandListener,
+    SlowRequestProfiler,
+    password_hash_seconds,
+    rate_limited_total,
+    registry,
+    span,
+    upstream_request_seconds,
+)
+from migrations import migrate_iso_dates
+from post_analytics import READ, VIEW, ViewRecorder, popular_posts
+from rate_limit import RateLimits, client_address, parse_networks
+from response_cache import CachedResponse, ImmutableStaticFiles, ResponseCache
+from search import SearchIndex, post_fields
+from serialization import FastJSONResponse, dumps
+from session_cache import SessionCache
+from session_store import create_session_store
+from startup_tasks import StartupStep, pending_required_steps, run_startup_steps
+from token_revocations import RevocationList
+from upstream import CircuitBreaker, SessionExchangeClient, UpstreamRejected, UpstreamUnavailable
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# connect=False: no topology threads or socket until the first operation.
+client = AsyncIOMotorClient(mongo_url, tz_aware=True, connect=False, event_listeners=[MongoCommandListener()])
 db = client[os.environ['DB_NAME']]
 
 app = FastAPI()
 api_router = APIRouter(prefix="/api")
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+password_hasher = PasswordHasher(
+    rounds=int(os.environ.get('BCRYPT_ROUNDS', '12')),
+    max_workers=int(os.environ.get('HASH_POOL_WORKERS', '4')),
+    max_queue=int(os.environ.get('HASH_POOL_MAX_QUEUE', '64')),
+    mode=os.environ.get('HASH_POOL_MODE', 'thread'),
+)
 SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'your-secret-key-change-in-production')
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_DAYS = 7
+AUTH_MODE = os.environ.get('AUTH_MODE', 'session')
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get('ACCESS_TOKEN_EXPIRE_MINUTES', '15'))
+REFRESH_TOKEN_EXPIRE_DAYS = 7
+SESSION_EXPIRE_DAYS = 7
 
 security = HTTPBearer(auto_error=False)
 
+session_store = create_session_store(
+    os.environ.get('SESSION_STORE', 'mongo'), db, os.environ.get('REDIS_URL')
+)
+
+blog_cache = ResponseCache(
+    maxsize=int(os.environ.get('RESPONSE_CACHE_SIZE', '1024')),
+    max_age=int(os.environ.get('RESPONSE_CACHE_MAX_AGE_SECONDS', '60')),
+)
+
+search_index = SearchIndex()
+# The index is per process: other workers catch up with imports by polling blog_posts.
+SEARCH_REFRESH_SECONDS = float(os.environ.get('SEARCH_REFRESH_SECONDS', '60'))
+# Newest updated_at the index has caught up with, and how many posts carried it.
+search_index_state: Dict[str, object] = {"updated_at": None, "at_latest": 0}
+
+lead_ingestor = LeadIngestor(
+    db.email_leads,
+    batch_size=int(os.environ.get('LEAD_BATCH_SIZE', '500')),
+    flush_interval=float(os.environ.get('LEAD_FLUSH_INTERVAL_SECONDS', '0.5')),
+    max_queue=int(os.environ.get('LEAD_QUEUE_SIZE', '10000')),
+)
+
+ADMIN_API_KEY = os.environ.get('ADMIN_API_KEY')
+# Scrapers send it as a bearer token; /metrics is closed while it is unset.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+progress_cache = ProgressCache(
+    maxsize=int(os.environ.get('PROGRESS_CACHE_SIZE', '100000')),
+    ttl=float(os.environ.get('PROGRESS_CACHE_TTL_SECONDS', '30')),
+)
+# Clients resend their absolute position with every heartbeat, so a longer
+# interval only means fewer writes and a resume point up to one interval old after a crash.
+progress_ingestor = ProgressIngestor(
+    db.course_progress,
+    progress_cache,
+    flush_interval=float(os.environ.get('PROGRESS_FLUSH_SECONDS', '30')),
+    max_pending=int(os.environ.get('PROGRESS_MAX_PENDING', '200000')),
+)
+COURSE_CATALOG_TTL_SECONDS = 300
+course_catalog: Dict[str, object] = {"courses": {}, "loaded_at": None}
+
+post_stats = ViewRecorder(
+    db.post_stats_daily,
+    flush_interval=float(os.environ.get('POST_STATS_FLUSH_SECONDS', '5')),
+    retention_days=int(os.environ.get('POST_STATS_RETENTION_DAYS', '90')),
+)
+# Image variants are written under BLOG_MEDIA_DIR and linked as BLOG_MEDIA_URL/<name>;
+# a URL that is not a path (e.g. a CDN origin in front of the directory) is not served from here.
+BLOG_MEDIA_DIR = Path(os.environ.get('BLOG_MEDIA_DIR', ROOT_DIR / 'media' / 'blog'))
+BLOG_MEDIA_URL = os.environ.get('BLOG_MEDIA_URL', '/api/media/blog').rstrip('/')
+BLOG_IMPORT_MAX_BYTES = int(os.environ.get('BLOG_IMPORT_MAX_MB', '200')) * 1024 * 1024
+blog_importer = None
+
+def get_blog_importer():
+    """blog_content (Markdown, Pillow, the process pool) is loaded by the first import, not at startup."""
+    global blog_importer
+    if blog_importer is None:
+        from blog_content import BlogImporter
+
+        blog_importer = BlogImporter(
+            db.blog_posts,
+            BLOG_MEDIA_DIR,
+            BLOG_MEDIA_URL,
+            max_workers=int(os.environ['BLOG_IMPORT_WORKERS']) if os.environ.get('BLOG_IMPORT_WORKERS') else None,
+        )
+    return blog_importer
+
+POPULAR_WINDOW_DAYS = int(os.environ.get('POPULAR_WINDOW_DAYS', '7'))
+POPULAR_REFRESH_SECONDS = float(os.environ.get('POPULAR_REFRESH_SECONDS', '60'))
+POPULAR_MAX = 50
+popular_ranking: Dict[str, object] = {"generation": 0, "posts": []}
+
+WS_AUTH_TIMEOUT_SECONDS = float(os.environ.get('WS_AUTH_TIMEOUT_SECONDS', '5'))
+# MARKET_FEED: "synthetic:SPY,QQQ[@ticks_per_second]" or "replay:/path/ticks.csv[@speed]"; unset = no feed.
+market_hub = MarketHub(
+    max_connections=int(os.environ.get('MARKET_MAX_CONNECTIONS', '20000')),
+    max_symbols=int(os.environ.get('MARKET_MAX_SYMBOLS', '50')),
+    frame_interval=float(os.environ.get('MARKET_FRAME_INTERVAL_MS', '0')) / 1000,
+    send_timeout=float(os.environ.get('MARKET_SEND_TIMEOUT_SECONDS', '10')),
+)
+
+backtests = BacktestRunner(
+    db.backtest_jobs,
+    Path(os.environ.get('BACKTEST_DATA_DIR', ROOT_DIR / 'data' / 'ohlcv')),
+    max_workers=int(os.environ['BACKTEST_WORKERS']) if os.environ.get('BACKTEST_WORKERS') else None,
+)
+
+# SMTP_HOST unset: jobs can be queued but nothing is sent from this process.
+SMTP_HOST = os.environ.get('SMTP_HOST')
+EMAIL_FROM = os.environ.get('EMAIL_FROM', 'hello@tradingacademy.com')
+email_dispatcher = None
+
+def make_email_dispatcher():
+    # Only built (and email_dispatch imported) when SMTP_HOST is set.
+    from email_dispatch import EmailDispatcher, Mailer, SmtpConnection, SmtpPool
+
+    return EmailDispatcher(
+        db.email_jobs,
+        db.email_leads,
+        db.email_failures,
+        db.email_deferred,
+        Mailer(
+            SmtpPool(
+                lambda: SmtpConnection(
+                    SMTP_HOST,
+                    int(os.environ.get('SMTP_PORT', '587')),
+                    tls=os.environ.get('SMTP_TLS', 'starttls'),
+                    username=os.environ.get('SMTP_USERNAME'),
+                    password=os.environ.get('SMTP_PASSWORD'),
+                    timeout=float(os.environ.get('SMTP_TIMEOUT_SECONDS', '30')),
+                ),
+                size=int(os.environ.get('SMTP_POOL_SIZE', '4')),
+                max_messages=int(os.environ.get('SMTP_MESSAGES_PER_CONNECTION', '1000')),
+            ),
+            EMAIL_FROM,
+            domain_concurrency=int(os.environ.get('SMTP_DOMAIN_CONCURRENCY', '2')),
+            max_attempts=int(os.environ.get('SMTP_MAX_ATTEMPTS', '4')),
+        ),
+        from_header=os.environ.get('EMAIL_FROM_HEADER', f"Trading Academy <{EMAIL_FROM}>"),
+        page_size=int(os.environ.get('EMAIL_PAGE_SIZE', '500')),
+        welcome_interval=float(os.environ.get('EMAIL_WELCOME_INTERVAL_SECONDS', '60')),
+    )
+
+# "<requests>/<seconds>" per key; RATE_LIMIT_STORE=redis also enforces them across workers.
+rate_limits = RateLimits(
+    {
+        "login_ip": os.environ.get('RATE_LIMIT_LOGIN_PER_IP', '30/60'),
+        "login_email": os.environ.get('RATE_LIMIT_LOGIN_PER_EMAIL', '10/300'),
+        "signup_ip": os.environ.get('RATE_LIMIT_SIGNUP_PER_IP', '20/3600'),
+        "leads_ip": os.environ.get('RATE_LIMIT_LEADS_PER_IP', '20/3600'),
+        "leads_email": os.environ.get('RATE_LIMIT_LEADS_PER_EMAIL', '5/3600'),
+        "indicators_ip": os.environ.get('RATE_LIMIT_INDICATORS_PER_IP', '60/60'),
+        "progress_user": os.environ.get('RATE_LIMIT_PROGRESS_PER_USER', '120/60'),
+    },
+    enabled=os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes'),
+    redis_url=os.environ.get('REDIS_URL') if os.environ.get('RATE_LIMIT_STORE') == 'redis' else None,
+    # Per limit; should comfortably exceed the keys active within one period (see rate_limit_early_evictions).
+    max_keys=int(os.environ.get('RATE_LIMIT_MAX_KEYS', '100000')),
+)
+
+# Load balancers / reverse proxies whose X-Forwarded-For is believed; empty means clients connect directly.
+TRUSTED_PROXIES = parse_networks(os.environ.get('TRUSTED_PROXIES', ''))
+
+session_exchange = SessionExchangeClient(
+    os.environ.get('OAUTH_SESSION_URL', 'https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data'),
+    connect_timeout=float(os.environ.get('OAUTH_CONNECT_TIMEOUT_SECONDS', '2')),
+    read_timeout=float(os.environ.get('OAUTH_READ_TIMEOUT_SECONDS', '5')),
+    cache_ttl=float(os.environ.get('OAUTH_SESSION_CACHE_SECONDS', '60')),
+    breaker=CircuitBreaker(
+        threshold=float(os.environ.get('OAUTH_BREAKER_FAILURE_RATE', '0.5')),
+        reset_timeout=float(os.environ.get('OAUTH_BREAKER_RESET_SECONDS', '15')),
+    ),
+)
+
+slow_request_profiler = SlowRequestProfiler(
+    enabled=os.environ.get('PROFILE_SLOW_REQUESTS', '').lower() in ('1', 'true', 'yes'),
+    sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', '1.0')),
+)
+
+revocations = RevocationList(
+    db.token_revocations,
+    retention=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+    sync_interval=float(os.environ.get('REVOCATION_SYNC_SECONDS', '5')),
+)
+
+# Logouts on other workers reach this cache through the revocation list; see SessionCache.
+session_cache = SessionCache(
+    maxsize=int(os.environ.get('SESSION_CACHE_SIZE', '10000')),
+    ttl=float(os.environ.get('SESSION_CACHE_TTL_SECONDS', '60')),
+    is_revoked=revocations.is_revoked,
+)
+
 class User(BaseModel):
     model_config = ConfigDict(extra="ignore")
     user_id: str
@@ -52,18 +272,115 @@ class UserLogin(BaseModel):
 class SessionData(BaseModel):
     session_id: str
 
+class RefreshRequest(BaseModel):
+    refresh_token: Optional[str] = None
+
+class ProfilerSettings(BaseModel):
+    enabled: bool
+    sample_rate: float = Field(1.0, gt=0, le=1)
+    reset: bool = False
+
+class TocEntry(BaseModel):
+    level: int
+    id: str
+    title: str
+
+class ResponsiveImage(BaseModel):
+    src: str
+    width: int
+    height: int
+    webp_srcset: str
+
 class BlogPost(BaseModel):
     model_config = ConfigDict(extra="ignore")
     post_id: str
     title: str
     slug: str
     excerpt: str
+    # Markdown source; content_html, toc and reading time are rendered from it at import.
     content: str
+    content_html: str = ""
+    toc: List[TocEntry] = []
+    word_count: int = 0
+    reading_time_minutes: Optional[int] = None
     author: str
     image_url: str
+    image: Optional[ResponsiveImage] = None
     published_at: datetime
+    updated_at: Optional[datetime] = None
     tags: List[str]
 
+class BlogPostSummary(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    post_id: str
+    title: str
+    slug: str
+    excerpt: str
+    author: str
+    image_url: str
+    image: Optional[ResponsiveImage] = None
+    reading_time_minutes: Optional[int] = None
+    published_at: datetime
+    tags: List[str]
+
+class Lesson(BaseModel):
+    lesson_id: str = Field(pattern=r"^[A-Za-z0-9_-]{1,64}$")
+    title: str
+    duration_minutes: int
+    topics: List[str] = []
+
+class Course(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    course_id: str
+    title: str
+    description: str
+    is_premium: bool = False
+    lessons: List[Lesson]
+
+class ProgressEvent(BaseModel):
+    event_id: str = Field(min_length=1, max_length=64)
+    course_id: str
+    lesson_id: str
+    position_seconds: float = Field(ge=0)
+    completed: bool = False
+    # Must carry an offset (e.g. Date.toISOString()); naive times are ambiguous and get a 422.
+    client_ts: Optional[AwareDatetime] = None
+
+class ProgressBatch(BaseModel):
+    events: List[ProgressEvent] = Field(min_length=1, max_length=100)
+
+class LessonProgress(BaseModel):
+    position_seconds: float
+    completed: bool = False
+    completed_at: Optional[datetime] = None
+    updated_at: datetime
+
+class CourseProgress(BaseModel):
+    course_id: str
+    lessons: Dict[str, LessonProgress] = {}
+    last_lesson_id: Optional[str] = None
+    last_position_seconds: float = 0
+    updated_at: Optional[datetime] = None
+
+class ResumePoint(BaseModel):
+    course_id: str
+    course_title: str
+    lesson_id: str
+    lesson_title: str
+    position_seconds: float
+    updated_at: datetime
+
+class PopularPost(BlogPostSummary):
+    views: int
+    reads: int
+    unique_visitors: int
+
+BLOG_POST_FIELDS = set(BlogPost.model_fields)
+BLOG_SUMMARY_PROJECTION = {"_id": 0, **{field: 1 for field in BlogPostSummary.model_fields}}
+
+class BlogSearchResult(BlogPostSummary):
+    score: float
+
 class EmailLead(BaseModel):
     model_config = ConfigDict(extra="ignore")
     lead_id: str
@@ -75,39 +392,193 @@ class EmailLeadCreate(BaseModel):
     email: EmailStr
     name: Optional[str] = None
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+class EmailJobCreate(BaseModel):
+    subject: str = Field(..., min_length=1, max_length=200)
+    # "{name}" is replaced with each lead's name, or "there".
+    body: str = Field(..., min_length=1, max_length=100_000)
+
+class EmailJob(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    job_id: str
+    kind: str
+    subject: str
+    status: str
+    sent: int
+    failed: int
+    # Waiting in email_deferred for a later retry after a temporary (4xx) refusal.
+    deferred: int = 0
+    created_at: datetime
+    updated_at: datetime
+    finished_at: Optional[datetime] = None
+
+class IndicatorSpec(BaseModel):
+    name: str
+    params: Dict[str, float] = {}
+
+IndicatorSpecs = TypeAdapter(List[IndicatorSpec])
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+INDICATOR_MAX_ROWS = int(os.environ.get('INDICATOR_MAX_ROWS', '5000000'))
+INDICATOR_MAX_REQUESTED = 20
+INDICATOR_STREAM_ROWS = int(os.environ.get('INDICATOR_STREAM_ROWS', '100000'))
+indicator_cache = None
 
-def create_access_token(data: dict):
+class BacktestRequest(BaseModel):
+    symbol: str
+    # Each parameter is a list of values to sweep; omitted parameters use their defaults.
+    params: Dict[str, Annotated[List[float], Field(max_length=200)]] = Field({}, max_length=10)
+    initial_equity: float = Field(10_000.0, gt=0, le=1e12)
+    commission_bps: float = Field(5.0, ge=0, le=1000)
+    slippage_bps: float = Field(2.0, ge=0, le=1000)
+
+BACKTEST_LIMITS = {
+    # is_premium -> (concurrent jobs, combinations per job)
+    False: (int(os.environ.get('BACKTEST_MAX_ACTIVE_FREE', '1')), int(os.environ.get('BACKTEST_MAX_COMBOS_FREE', '50'))),
+    True: (int(os.environ.get('BACKTEST_MAX_ACTIVE_PREMIUM', '4')), int(os.environ.get('BACKTEST_MAX_COMBOS_PREMIUM', '2000'))),
+}
+
+async def hash_password(password: str) -> str:
+    try:
+        with span("hashing", password_hash_seconds, ("hash",)):
+            return await password_hasher.hash(password)
+    except HashPoolSaturated:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+
+async def verify_password(plain_password: str, hashed_password: str):
+    try:
+        with span("hashing", password_hash_seconds, ("verify",)):
+            return await password_hasher.verify_and_update(plain_password, hashed_password)
+    except HashPoolSaturated:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+
+def encode_cursor(published_at: datetime, post_id: str) -> str:
+    raw = json.dumps({"p": published_at.isoformat(), "i": post_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        return datetime.fromisoformat(data["p"]), str(data["i"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def create_access_token(data: dict, expires_delta: timedelta = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)):
+    from jose import jwt
     to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + timedelta(days=ACCESS_TOKEN_EXPIRE_DAYS)
-    to_encode.update({"exp": expire})
+    now = datetime.now(timezone.utc)
+    to_encode.update({"iat": now.timestamp(), "exp": now + expires_delta})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def user_claims(user: User) -> dict:
+    return {
+        "sub": user.user_id,
+        "typ": "access",
+        "email": user.email,
+        "name": user.name,
+        "picture": user.picture,
+        "is_premium": user.is_premium,
+        "created_at": user.created_at.timestamp(),
+    }
+
+def user_from_claims(claims: dict) -> User:
+    return User(
+        user_id=claims["sub"],
+        email=claims["email"],
+        name=claims["name"],
+        picture=claims.get("picture"),
+        is_premium=claims.get("is_premium", False),
+        created_at=datetime.fromtimestamp(claims["created_at"], timezone.utc),
+    )
+
+def decode_token(token: str, token_type: str) -> dict:
+    from jose import JWTError, jwt
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if claims.get("typ") != token_type:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if revocations.is_revoked(claims["sub"], claims["iat"]):
+        raise HTTPException(status_code=401, detail="Token revoked")
+    return claims
+
+def set_auth_cookie(response: Response, key: str, value: str, max_age: int, path: str = "/"):
+    response.set_cookie(
+        key=key,
+        value=value,
+        httponly=True,
+        secure=True,
+        samesite="none",
+        path=path,
+        max_age=max_age
+    )
+
+async def start_session(response: Response, user: User, session_token: Optional[str] = None) -> dict:
+    if AUTH_MODE == "jwt":
+        access_token = create_access_token(user_claims(user))
+        refresh_token = create_access_token(
+            {"sub": user.user_id, "typ": "refresh"}, timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+        )
+        set_auth_cookie(response, "session_token", access_token, ACCESS_TOKEN_EXPIRE_MINUTES*60)
+        set_auth_cookie(response, "refresh_token", refresh_token, REFRESH_TOKEN_EXPIRE_DAYS*24*60*60, path="/api/auth")
+        return {"session_token": access_token, "refresh_token": refresh_token}
+    
+    # Provider-issued tokens can be replayed from the exchange cache, so they replace.
+    replace = session_token is not None
+    session_token = session_token or f"session_{uuid.uuid4().hex}"
+    expires_at = datetime.now(timezone.utc) + timedelta(days=SESSION_EXPIRE_DAYS)
+    await session_store.create(session_token, user.user_id, expires_at, replace=replace)
+    set_auth_cookie(response, "session_token", session_token, SESSION_EXPIRE_DAYS*24*60*60)
+    return {"session_token": session_token}
+
+async def enforce_rate_limit(name: str, key: str):
+    retry_after = await rate_limits.check(name, key)
+    if retry_after:
+        rate_limited_total.inc((name,))
+        raise HTTPException(
+            status_code=429, detail="Too many requests", headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+
+def client_ip(request: Request) -> str:
+    peer = request.client.host if request.client else "unknown"
+    return client_address(peer, request.headers.get("x-forwarded-for"), TRUSTED_PROXIES)
+
+def limit_by_ip(name: str):
+    # A dependency so the check runs before the request body is parsed.
+    async def dependency(request: Request):
+        await enforce_rate_limit(name, client_ip(request))
+    return Depends(dependency)
+
+async def require_admin(x_admin_key: Optional[str] = Header(None)):
+    if not ADMIN_API_KEY or x_admin_key != ADMIN_API_KEY:
+        raise HTTPException(status_code=403, detail="Admin access required")
+
 async def get_current_user(request: Request, credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)):
     session_token = request.cookies.get("session_token")
     
     if not session_token and credentials:
         session_token = credentials.credentials
     
+    return await user_for_token(session_token)
+
+async def user_for_token(session_token: Optional[str]) -> User:
     if not session_token:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
-    session_doc = await db.user_sessions.find_one({"session_token": session_token}, {"_id": 0})
+    if AUTH_MODE == "jwt" and session_token.count(".") == 2:
+        return user_from_claims(decode_token(session_token, "access"))
+    
+    cached_user = session_cache.get(session_token)
+    if cached_user is not None:
+        return cached_user
+    
+    session_doc = await session_store.get(session_token)
     
     if not session_doc:
         raise HTTPException(status_code=401, detail="Invalid session")
     
     expires_at = session_doc["expires_at"]
-    if isinstance(expires_at, str):
-        expires_at = datetime.fromisoformat(expires_at)
-    if expires_at.tzinfo is None:
-        expires_at = expires_at.replace(tzinfo=timezone.utc)
-    
     if expires_at < datetime.now(timezone.utc):
         raise HTTPException(status_code=401, detail="Session expired")
     
@@ -116,19 +587,18 @@ async def get_current_user(request: Request, credentials: Optional[HTTPAuthoriza
     if not user_doc:
         raise HTTPException(status_code=404, detail="User not found")
     
-    if isinstance(user_doc.get('created_at'), str):
-        user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at'])
-    
-    return User(**user_doc)
+    user = User(**user_doc)
+    session_cache.set(session_token, user, user.user_id, expires_at)
+    return user
 
-@api_router.post("/auth/signup")
+@api_router.post("/auth/signup", dependencies=[limit_by_ip("signup_ip")])
 async def signup(user_data: UserSignup, response: Response):
     existing_user = await db.users.find_one({"email": user_data.email}, {"_id": 0})
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
     user_id = f"user_{uuid.uuid4().hex[:12]}"
-    hashed_pw = hash_password(user_data.password)
+    hashed_pw = await hash_password(user_data.password)
     
     user_doc = {
         "user_id": user_id,
@@ -137,78 +607,46 @@ async def signup(user_data: UserSignup, response: Response):
         "password_hash": hashed_pw,
         "picture": None,
         "is_premium": False,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     }
     
-    await db.users.insert_one(user_doc)
-    
-    session_token = f"session_{uuid.uuid4().hex}"
-    session_doc = {
-        "user_id": user_id,
-        "session_token": session_token,
-        "expires_at": (datetime.now(timezone.utc) + timedelta(days=7)).isoformat(),
-        "created_at": datetime.now(timezone.utc).isoformat()
-    }
-    
-    await db.user_sessions.insert_one(session_doc)
-    
-    response.set_cookie(
-        key="session_token",
-        value=session_token,
-        httponly=True,
-        secure=True,
-        samesite="none",
-        path="/",
-        max_age=7*24*60*60
-    )
+    try:
+        await db.users.insert_one(user_doc)
+    except DuplicateKeyError:
+        # Lost a race with a concurrent signup for the same email (unique index).
+        raise HTTPException(status_code=400, detail="Email already registered")
     
-    user_doc.pop('password_hash', None)
-    user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at'])
-    return {"user": User(**user_doc), "session_token": session_token}
+    user = User(**user_doc)
+    tokens = await start_session(response, user)
+    return {"user": user, **tokens}
 
-@api_router.post("/auth/login")
+@api_router.post("/auth/login", dependencies=[limit_by_ip("login_ip")])
 async def login(user_data: UserLogin, response: Response):
+    await enforce_rate_limit("login_email", user_data.email.strip().lower())
     user_doc = await db.users.find_one({"email": user_data.email}, {"_id": 0})
     
-    if not user_doc or not verify_password(user_data.password, user_doc.get("password_hash", "")):
+    if not user_doc:
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
-    session_token = f"session_{uuid.uuid4().hex}"
-    session_doc = {
-        "user_id": user_doc["user_id"],
-        "session_token": session_token,
-        "expires_at": (datetime.now(timezone.utc) + timedelta(days=7)).isoformat(),
-        "created_at": datetime.now(timezone.utc).isoformat()
-    }
-    
-    await db.user_sessions.insert_one(session_doc)
-    
-    response.set_cookie(
-        key="session_token",
-        value=session_token,
-        httponly=True,
-        secure=True,
-        samesite="none",
-        path="/",
-        max_age=7*24*60*60
-    )
+    valid, new_hash = await verify_password(user_data.password, user_doc.get("password_hash", ""))
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    if new_hash:
+        await db.users.update_one({"user_id": user_doc["user_id"]}, {"$set": {"password_hash": new_hash}})
     
-    user_doc.pop('password_hash', None)
-    user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at']) if isinstance(user_doc.get('created_at'), str) else user_doc['created_at']
-    return {"user": User(**user_doc), "session_token": session_token}
+    user = User(**user_doc)
+    tokens = await start_session(response, user)
+    return {"user": user, **tokens}
 
 @api_router.post("/auth/google/session")
 async def google_auth_session(session_data: SessionData, response: Response):
-    async with httpx.AsyncClient() as client:
-        auth_response = await client.get(
-            "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data",
-            headers={"X-Session-ID": session_data.session_id}
-        )
-    
-    if auth_response.status_code != 200:
+    try:
+        with span("upstream", upstream_request_seconds, ("google_session",)):
+            user_data = await session_exchange.exchange(session_data.session_id)
+    except UpstreamRejected:
         raise HTTPException(status_code=400, detail="Invalid session ID")
-    
-    user_data = auth_response.json()
+    except UpstreamUnavailable:
+        raise HTTPException(status_code=503, detail="Authentication provider unavailable", headers={"Retry-After": "5"})
     
     existing_user = await db.users.find_one({"email": user_data["email"]}, {"_id": 0})
     
@@ -221,6 +659,7 @@ async def google_auth_session(session_data: SessionData, response: Response):
                 "picture": user_data["picture"]
             }}
         )
+        session_cache.invalidate_user(user_id)
     else:
         user_id = f"user_{uuid.uuid4().hex[:12]}"
         user_doc = {
@@ -229,89 +668,579 @@ async def google_auth_session(session_data: SessionData, response: Response):
             "name": user_data["name"],
             "picture": user_data["picture"],
             "is_premium": False,
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         }
-        await db.users.insert_one(user_doc)
-    
-    session_token = user_data["session_token"]
-    session_doc = {
-        "user_id": user_id,
-        "session_token": session_token,
-        "expires_at": (datetime.now(timezone.utc) + timedelta(days=7)).isoformat(),
-        "created_at": datetime.now(timezone.utc).isoformat()
-    }
-    
-    await db.user_sessions.insert_one(session_doc)
-    
-    response.set_cookie(
-        key="session_token",
-        value=session_token,
-        httponly=True,
-        secure=True,
-        samesite="none",
-        path="/",
-        max_age=7*24*60*60
-    )
+        try:
+            await db.users.insert_one(user_doc)
+        except DuplicateKeyError:
+            # A concurrent sign-in created this user first; log in as that one.
+            user_id = (await db.users.find_one({"email": user_data["email"]}, {"_id": 0}))["user_id"]
     
     user_doc = await db.users.find_one({"user_id": user_id}, {"_id": 0})
-    user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at']) if isinstance(user_doc.get('created_at'), str) else user_doc['created_at']
-    return {"user": User(**user_doc), "session_token": session_token}
+    user = User(**user_doc)
+    tokens = await start_session(response, user, user_data["session_token"])
+    return {"user": user, **tokens}
 
-@api_router.get("/auth/me")
+@api_router.get("/auth/me", response_model=User, response_class=FastJSONResponse)
 async def get_me(current_user: User = Depends(get_current_user)):
-    return current_user
+    return FastJSONResponse(current_user)
 
 @api_router.post("/auth/logout")
 async def logout(response: Response, current_user: User = Depends(get_current_user)):
-    await db.user_sessions.delete_many({"user_id": current_user.user_id})
+    await session_store.delete_user(current_user.user_id)
+    session_cache.invalidate_user(current_user.user_id)
+    # Revoked in session mode too, so other workers drop their cached sessions.
+    await revocations.revoke(current_user.user_id)
+    if AUTH_MODE == "jwt":
+        response.delete_cookie(key="refresh_token", path="/api/auth")
     response.delete_cookie(key="session_token", path="/")
     return {"message": "Logged out successfully"}
 
-@api_router.get("/blog/posts", response_model=List[BlogPost])
-async def get_blog_posts():
-    posts = await db.blog_posts.find({}, {"_id": 0}).to_list(100)
-    for post in posts:
-        if isinstance(post.get('published_at'), str):
-            post['published_at'] = datetime.fromisoformat(post['published_at'])
-    return posts
+@api_router.post("/auth/refresh")
+async def refresh_session(request: Request, response: Response, body: Optional[RefreshRequest] = None):
+    if AUTH_MODE != "jwt":
+        raise HTTPException(status_code=404, detail="Not found")
+    
+    refresh_token = request.cookies.get("refresh_token") or (body.refresh_token if body else None)
+    if not refresh_token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    claims = decode_token(refresh_token, "refresh")
+    user_doc = await db.users.find_one({"user_id": claims["sub"]}, {"_id": 0})
+    if not user_doc:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    
+    user = User(**user_doc)
+    access_token = create_access_token(user_claims(user))
+    set_auth_cookie(response, "session_token", access_token, ACCESS_TOKEN_EXPIRE_MINUTES*60)
+    return {"user": user, "session_token": access_token}
 
-@api_router.get("/blog/posts/{slug}", response_model=BlogPost)
-async def get_blog_post(slug: str):
+def serialize_json(content) -> bytes:
+    with span("serialization"):
+        return dumps(content)
+
+async def render_blog_posts(limit: int, cursor: Optional[str], tag: Optional[str], fields: Optional[str]) -> CachedResponse:
+    query = {}
+    if tag:
+        query["tags"] = tag
+    if cursor:
+        published_at, post_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"published_at": {"$lt": published_at}},
+            {"published_at": published_at, "post_id": {"$lt": post_id}},
+        ]
+    
+    if fields:
+        requested = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = set(requested) - BLOG_POST_FIELDS
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+        projection = {"_id": 0, "published_at": 1, "post_id": 1, **{field: 1 for field in requested}}
+    else:
+        projection = BLOG_SUMMARY_PROJECTION
+    
+    posts = await db.blog_posts.find(query, projection).sort(BLOG_LISTING_SORT).limit(limit).to_list(limit)
+    
+    headers = {}
+    if len(posts) == limit:
+        last = posts[-1]
+        headers["X-Next-Cursor"] = encode_cursor(last["published_at"], last["post_id"])
+    
+    if fields:
+        content = [{field: post[field] for field in requested if field in post} for post in posts]
+    else:
+        content = [BlogPostSummary(**post) for post in posts]
+    last_modified = max((post["published_at"] for post in posts), default=None)
+    return blog_cache.store(("posts", limit, cursor, tag, fields), serialize_json(content), last_modified, headers)
+
+async def render_blog_post(slug: str) -> CachedResponse:
     post = await db.blog_posts.find_one({"slug": slug}, {"_id": 0})
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
-    if isinstance(post.get('published_at'), str):
-        post['published_at'] = datetime.fromisoformat(post['published_at'])
-    return BlogPost(**post)
+    post = BlogPost(**post)
+    return blog_cache.store(("post", slug), serialize_json(post), post.updated_at or post.published_at)
+
+@api_router.get("/blog/posts")
+async def get_blog_posts(
+    request: Request,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    tag: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    cached = blog_cache.get(("posts", limit, cursor, tag, fields))
+    if cached is None:
+        cached = await render_blog_posts(limit, cursor, tag, fields)
+    return cached.to_response(request.headers.get("if-none-match"), request.headers.get("accept-encoding"))
+
+@api_router.get("/blog/posts/{slug}", response_model=BlogPost)
+async def get_blog_post(slug: str, request: Request):
+    cached = blog_cache.get(("post", slug))
+    if cached is None:
+        cached = await render_blog_post(slug)
+    post_stats.record(slug, visitor_key(request), VIEW)
+    return cached.to_response(request.headers.get("if-none-match"), request.headers.get("accept-encoding"))
+
+def visitor_key(request: Request) -> str:
+    # Only hashed into the unique-visitor sketch, never stored.
+    visitor = request.cookies.get("visitor_id")
+    if visitor:
+        return visitor
+    return f"{client_ip(request)}|{request.headers.get('user-agent', '')}"
+
+@api_router.post("/blog/posts/{slug}/read", status_code=204)
+async def record_blog_read(slug: str, request: Request):
+    """Beacon sent by the client once a post has actually been read."""
+    if blog_cache.get(("post", slug)) is None:
+        await render_blog_post(slug)
+    post_stats.record(slug, visitor_key(request), READ)
+    return Response(status_code=204)
+
+async def refresh_popular_posts():
+    ranked = await popular_posts(db.post_stats_daily, POPULAR_WINDOW_DAYS, POPULAR_MAX)
+    slugs = [stats["slug"] for stats in ranked]
+    summaries = {post["slug"]: post async for post in db.blog_posts.find({"slug": {"$in": slugs}}, BLOG_SUMMARY_PROJECTION)}
+    popular_ranking["posts"] = [
+        PopularPost(**{**summaries[stats["slug"]], **stats}) for stats in ranked if stats["slug"] in summaries
+    ]
+    popular_ranking["generation"] += 1
+
+async def refresh_popular_posts_forever():
+    while True:
+        try:
+            await refresh_popular_posts()
+        except Exception:
+            logger.exception("Failed to refresh popular posts")
+        await asyncio.sleep(POPULAR_REFRESH_SECONDS)
+
+@api_router.get("/blog/popular", response_model=List[PopularPost])
+async def get_popular_posts(request: Request, limit: int = Query(10, ge=1, le=POPULAR_MAX)):
+    """Most viewed posts over the last POPULAR_WINDOW_DAYS days, from the ranking refreshed in the background."""
+    key = ("popular", popular_ranking["generation"], limit)
+    cached = blog_cache.get(key)
+    if cached is None:
+        cached = blog_cache.store(key, serialize_json(popular_ranking["posts"][:limit]))
+    return cached.to_response(request.headers.get("if-none-match"), request.headers.get("accept-encoding"))
 
-@api_router.post("/leads", response_model=EmailLead)
+def index_blog_post(post: dict):
+    summary = {field: post[field] for field in BlogPostSummary.model_fields if field in post}
+    search_index.upsert(post["post_id"], post_fields(post), summary)
+
+async def rebuild_search_index():
+    await refresh_search_index()
+    logger.info("Search index built with %d posts", len(search_index))
+
+async def refresh_search_index() -> bool:
+    """Bring the search index up to date with blog_posts; True if anything changed.
+
+    Reads only posts updated since the last refresh (the importer stamps
+    updated_at). Deleted posts, or ones written without updated_at, show up
+    as a count mismatch and are reconciled by post_id.
+    """
+    since = search_index_state["updated_at"]
+    changed = {"updated_at": {"$gte": since}} if since else {"updated_at": {"$ne": None}}
+    # Read the watermark first: anything written during the scan is picked up next time.
+    newest = await db.blog_posts.find_one({}, {"_id": 0, "updated_at": 1}, sort=[("updated_at", -1)])
+    latest = (newest or {}).get("updated_at")
+    at_latest = await db.blog_posts.count_documents({"updated_at": latest}) if latest else 0
+    at_since = await db.blog_posts.count_documents(changed)
+    total = await db.blog_posts.estimated_document_count()
+    if (latest, at_since) == (since, search_index_state["at_latest"]) and total == len(search_index):
+        return False
+    async for post in db.blog_posts.find(changed, {"_id": 0}):
+        index_blog_post(post)
+    if total != len(search_index):
+        post_ids = {post["post_id"] async for post in db.blog_posts.find({}, {"_id": 0, "post_id": 1})}
+        for post_id in set(search_index.docs) - post_ids:
+            search_index.remove(post_id)
+        missing = list(post_ids - set(search_index.docs))
+        async for post in db.blog_posts.find({"post_id": {"$in": missing}}, {"_id": 0}):
+            index_blog_post(post)
+    search_index.warm()
+    search_index_state.update(updated_at=latest, at_latest=at_latest)
+    return True
+
+async def refresh_search_index_forever():
+    await ready.wait()
+    while True:
+        await asyncio.sleep(SEARCH_REFRESH_SECONDS)
+        try:
+            if await refresh_search_index():
+                # Posts changed through another worker: drop this worker's cached bodies now, not at max-age.
+                await warm_blog_cache()
+        except Exception:
+            logger.exception("Failed to refresh the search index")
+
+@api_router.get("/blog/search", response_model=List[BlogSearchResult], response_class=FastJSONResponse)
+async def search_blog_posts(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(10, ge=1, le=50),
+    prefix: bool = False,
+):
+    results = [BlogSearchResult(score=score, **summary) for score, summary in search_index.search(q, limit, prefix)]
+    return FastJSONResponse(results)
+
+async def warm_blog_cache():
+    blog_cache.bump_version()
+    listing = await render_blog_posts(20, None, None, None)
+    listing.precompress()
+    for post in json.loads(listing.body):
+        (await render_blog_post(post["slug"])).precompress()
+
+@api_router.post("/blog/import", dependencies=[Depends(require_admin)])
+async def import_blog_posts(files: List[UploadFile] = File(...), force: bool = False):
+    """Import Markdown posts and the local images they reference, uploaded with their relative paths.
+
+    Unchanged posts (same file, images and renderer version) are skipped.
+    """
+    with tempfile.TemporaryDirectory(prefix="blog-import-") as directory:
+        total = 0
+        for upload in files:
+            parts = [part for part in (upload.filename or "").replace("\\", "/").split("/") if part not in ("", ".", "..")]
+            if not parts:
+                continue
+            path = Path(directory).joinpath(*parts)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with path.open("wb") as out:
+                await run_in_threadpool(shutil.copyfileobj, upload.file, out)
+            total += path.stat().st_size
+            if total > BLOG_IMPORT_MAX_BYTES:
+                raise HTTPException(status_code=413, detail=f"Upload larger than {BLOG_IMPORT_MAX_BYTES // 2**20} MB")
+        report = await get_blog_importer().import_directory(Path(directory), force)
+    changed = report["created"] + report["updated"]
+    if changed:
+        await refresh_search_index()
+        await warm_blog_cache()
+    return report
+
+@api_router.post("/leads", response_model=EmailLead, dependencies=[limit_by_ip("leads_ip")])
 async def create_lead(lead_data: EmailLeadCreate):
-    existing_lead = await db.email_leads.find_one({"email": lead_data.email}, {"_id": 0})
+    await enforce_rate_limit("leads_email", lead_data.email.strip().lower())
+    # An existing lead is returned as stored (one indexed read); only new emails are queued.
+    existing_lead = lead_ingestor.queued(lead_data.email) or await db.email_leads.find_one(
+        {"email": lead_data.email}, {"_id": 0}
+    )
     if existing_lead:
         return EmailLead(**existing_lead)
-    
-    lead_id = f"lead_{uuid.uuid4().hex[:12]}"
-    lead_doc = {
-        "lead_id": lead_id,
-        "email": lead_data.email,
-        "name": lead_data.name,
-        "created_at": datetime.now(timezone.utc).isoformat()
-    }
-    
-    await db.email_leads.insert_one(lead_doc)
-    lead_doc['created_at'] = datetime.fromisoformat(lead_doc['created_at'])
+    try:
+        lead_doc = lead_ingestor.submit(lead_data.email, lead_data.name)
+    except LeadQueueFull:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
     return EmailLead(**lead_doc)
 
+def load_indicators():
+    """numpy and pandas are imported by the first indicator request, not at startup."""
+    global indicator_cache
+    import indicators
+    if indicator_cache is None:
+        indicator_cache = indicators.IndicatorCache(
+            max_bytes=int(os.environ.get('INDICATOR_CACHE_MB', '256')) * 1024 * 1024
+        )
+    return indicators
+
+def indicator_specs(raw) -> list:
+    try:
+        specs = IndicatorSpecs.validate_python(raw)
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid indicators: {e.errors()[0]['msg']}")
+    if not 1 <= len(specs) <= INDICATOR_MAX_REQUESTED:
+        raise HTTPException(status_code=400, detail=f"Request between 1 and {INDICATOR_MAX_REQUESTED} indicators")
+    return [(spec.name, spec.params) for spec in specs]
+
+def compute_indicators(parse) -> Response:
+    # Runs on the threadpool: parsing and the numpy kernels would otherwise block the loop.
+    indicators = load_indicators()
+    try:
+        series, specs = parse(indicators)
+        columns = indicators.compute(series, specs, indicator_cache)
+    except indicators.IndicatorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if series.rows > INDICATOR_STREAM_ROWS:
+        return StreamingResponse(indicators.stream(series.rows, columns), media_type="application/json")
+    return Response(content=indicators.render(series.rows, columns), media_type="application/json")
+
+@api_router.post("/indicators", dependencies=[limit_by_ip("indicators_ip")])
+async def calculate_indicators(request: Request):
+    """Body: {"series": {"close": [...], "high": [...], ...}, "indicators": [{"name": "rsi", "params": {"period": 14}}]}.
+
+    Responds with {"rows": n, "columns": {"rsi_14": [...], "macd_12_26_9.signal": [...]}}; warm-up rows are null.
+    """
+    body = await request.body()
+
+    def parse(indicators):
+        try:
+            data = orjson.loads(body)
+        except orjson.JSONDecodeError:
+            raise HTTPException(status_code=400, detail="Body must be JSON")
+        if not isinstance(data, dict) or not isinstance(data.get("series"), dict):
+            raise HTTPException(status_code=400, detail="Body needs a 'series' object of columns")
+        specs = indicator_specs(data.get("indicators"))
+        return indicators.Series.from_mapping(data["series"], INDICATOR_MAX_ROWS), specs
+
+    return await run_in_threadpool(compute_indicators, parse)
+
+@api_router.post("/indicators/upload", dependencies=[limit_by_ip("indicators_ip")])
+async def calculate_indicators_from_file(file: UploadFile = File(...), indicators: str = Form(...)):
+    """Same as /indicators for a CSV or .parquet file with open/high/low/close/volume columns."""
+    try:
+        specs = indicator_specs(orjson.loads(indicators))
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="indicators must be a JSON list")
+    content = await file.read()
+
+    def parse(module):
+        return module.Series.from_upload(content, file.filename or "", INDICATOR_MAX_ROWS), specs
+
+    return await run_in_threadpool(compute_indicators, parse)
+
+@api_router.get("/backtests/symbols")
+async def list_backtest_symbols():
+    return {"symbols": await run_in_threadpool(backtests.store.symbols)}
+
+@api_router.post("/backtests", status_code=202)
+async def create_backtest(request: BacktestRequest, current_user: User = Depends(get_current_user)):
+    """Queue a parameter sweep; poll GET /api/backtests/{job_id} for progress and results."""
+    import backtest
+    max_active, max_combos = BACKTEST_LIMITS[current_user.is_premium]
+    if not backtests.store.has(request.symbol):
+        raise HTTPException(status_code=404, detail=f"Unknown symbol {request.symbol!r}")
+    try:
+        combos = backtest.grid(request.params, max_combos)
+    except backtest.BacktestError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    settings = request.model_dump(include={"initial_equity", "commission_bps", "slippage_bps"})
+    try:
+        job = await backtests.submit(current_user.user_id, request.symbol, combos, settings, max_active)
+    except BacktestLimitExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"job_id": job["job_id"], "status": job["status"], "total": job["total"]}
+
+@api_router.get("/backtests/{job_id}")
+async def get_backtest(job_id: str, current_user: User = Depends(get_current_user)):
+    job = await backtests.get(job_id, current_user.user_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Backtest not found")
+    return FastJSONResponse(job)
+
+async def get_course_catalog() -> Dict[str, Course]:
+    loaded_at = course_catalog["loaded_at"]
+    if loaded_at is None or time.monotonic() - loaded_at > COURSE_CATALOG_TTL_SECONDS:
+        courses = {doc["course_id"]: Course(**doc) async for doc in db.courses.find({}, {"_id": 0})}
+        course_catalog.update(courses=courses, loaded_at=time.monotonic())
+    return course_catalog["courses"]
+
+async def get_course_or_404(course_id: str) -> Course:
+    course = (await get_course_catalog()).get(course_id)
+    if course is None:
+        raise HTTPException(status_code=404, detail="Course not found")
+    return course
+
+@api_router.get("/courses", response_model=List[Course])
+async def list_courses():
+    return list((await get_course_catalog()).values())
+
+@api_router.get("/courses/{course_id}", response_model=Course)
+async def get_course(course_id: str):
+    return await get_course_or_404(course_id)
+
+@api_router.post("/progress/events", status_code=202)
+async def record_progress(batch: ProgressBatch, current_user: User = Depends(get_current_user)):
+    """Heartbeats carry the absolute position, so a lost or repeated batch is harmless; retries reuse event_id."""
+    await enforce_rate_limit("progress_user", current_user.user_id)
+    catalog = await get_course_catalog()
+    now = datetime.now(timezone.utc)
+    events = []
+    rejected = 0
+    for event in batch.events:
+        course = catalog.get(event.course_id)
+        lesson = next((lesson for lesson in course.lessons if lesson.lesson_id == event.lesson_id), None) if course else None
+        if lesson is None or (course.is_premium and not current_user.is_premium):
+            rejected += 1
+            continue
+        at = event.client_ts if event.client_ts and now - timedelta(days=1) <= event.client_ts <= now else now
+        events.append({
+            "event_id": event.event_id,
+            "course_id": event.course_id,
+            "lesson_id": event.lesson_id,
+            "position_seconds": min(event.position_seconds, lesson.duration_minutes * 60),
+            "completed": event.completed,
+            "at": at,
+        })
+    try:
+        counts = progress_ingestor.submit(current_user.user_id, events)
+    except ProgressQueueFull:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+    return {**counts, "rejected": rejected}
+
+@api_router.get("/progress/resume", response_model=Optional[ResumePoint])
+async def get_resume_point(current_user: User = Depends(get_current_user)):
+    """Where the Dashboard's "Continue Course" should take the user; null before any progress."""
+    point = resume_point(await progress_ingestor.load(current_user.user_id))
+    if point is None:
+        return None
+    course = (await get_course_catalog()).get(point["course_id"])
+    if course is None:
+        return None
+    lesson = next((lesson for lesson in course.lessons if lesson.lesson_id == point["lesson_id"]), None)
+    return ResumePoint(**point, course_title=course.title, lesson_title=lesson.title if lesson else point["lesson_id"])
+
+@api_router.get("/progress/{course_id}", response_model=CourseProgress)
+async def get_course_progress(course_id: str, current_user: User = Depends(get_current_user)):
+    await get_course_or_404(course_id)
+    progress = (await progress_ingestor.load(current_user.user_id)).get(course_id)
+    return CourseProgress(**(progress or {"course_id": course_id}))
+
+@api_router.websocket("/ws/market")
+async def market_stream(websocket: WebSocket):
+    """Send {"action": "subscribe", "symbols": ["SPY"]}; receive {"type": "ticks", "data": [{"s", "p", "v", "t"}, ...]}.
+
+    Authenticated once, with the session_token cookie at connect or, for
+    clients that cannot send it, a first message {"action": "auth", "token": ...}
+    within WS_AUTH_TIMEOUT_SECONDS. Tokens are never taken from the URL,
+    which ends up in proxy and access logs.
+    """
+    cookie = websocket.cookies.get("session_token")
+    if cookie:
+        try:
+            await user_for_token(cookie)
+        except HTTPException as e:
+            await websocket.close(code=4401, reason=e.detail)
+            return
+    if market_hub.full:
+        await websocket.close(code=1013, reason="Too many connections")
+        return
+    await websocket.accept()
+    if not cookie:
+        try:
+            message = orjson.loads(await asyncio.wait_for(websocket.receive_text(), WS_AUTH_TIMEOUT_SECONDS))
+            if not isinstance(message, dict) or message.get("action") != "auth":
+                raise HTTPException(status_code=401, detail="Not authenticated")
+            await user_for_token(message.get("token") if isinstance(message.get("token"), str) else None)
+        except (asyncio.TimeoutError, orjson.JSONDecodeError, HTTPException) as e:
+            await websocket.close(code=4401, reason=getattr(e, "detail", "Not authenticated"))
+            return
+    await market_hub.serve(websocket.receive_text, websocket.send_text)
+
+@api_router.post("/leads/import", dependencies=[Depends(require_admin)])
+async def import_leads(file: UploadFile = File(...)):
+    lines = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+    return await import_leads_csv(db.email_leads, lines)
+
+@api_router.post("/email-jobs", response_model=EmailJob, status_code=202, dependencies=[Depends(require_admin)])
+async def create_email_job(request: EmailJobCreate):
+    """Queue a newsletter to every lead; poll GET /api/email-jobs/{job_id} for progress."""
+    from email_dispatch import new_job
+
+    job = new_job("newsletter", request.subject, request.body)
+    await db.email_jobs.insert_one(dict(job))
+    return EmailJob(**job)
+
+@api_router.get("/email-jobs/{job_id}", response_model=EmailJob, dependencies=[Depends(require_admin)])
+async def get_email_job(job_id: str):
+    job = await db.email_jobs.find_one({"job_id": job_id}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Email job not found")
+    return EmailJob(**job)
+
+@api_router.post("/email-jobs/{job_id}/cancel", response_model=EmailJob, dependencies=[Depends(require_admin)])
+async def cancel_email_job(job_id: str):
+    from email_dispatch import cancel_job
+
+    if not await cancel_job(db.email_jobs, job_id):
+        raise HTTPException(status_code=409, detail="Only queued or running newsletters can be cancelled")
+    return await get_email_job(job_id)
+
+@api_router.get("/internal/slow-requests", dependencies=[Depends(require_admin)])
+async def get_slow_requests():
+    return {
+        "enabled": slow_request_profiler.enabled,
+        "sample_rate": slow_request_profiler.sample_rate,
+        "requests": slow_request_profiler.slowest(),
+    }
+
+@api_router.post("/internal/profiler", dependencies=[Depends(require_admin)])
+async def configure_profiler(settings: ProfilerSettings):
+    slow_request_profiler.enabled = settings.enabled
+    slow_request_profiler.sample_rate = settings.sample_rate
+    if settings.reset:
+        slow_request_profiler.reset()
+    return {"enabled": slow_request_profiler.enabled, "sample_rate": slow_request_profiler.sample_rate}
+
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    return {"status": "ok"}
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    if not all(readiness_checks.values()):
+        return FastJSONResponse({"status": "starting", "checks": readiness_checks}, status_code=503)
+    if not await ping_mongo():
+        return FastJSONResponse({"status": "unavailable", "checks": {**readiness_checks, "mongo": False}}, status_code=503)
+    return {"status": "ready", "checks": readiness_checks}
+
+async def require_metrics_token(credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)):
+    if not METRICS_TOKEN or credentials is None or not hmac.compare_digest(credentials.credentials, METRICS_TOKEN):
+        raise HTTPException(status_code=403, detail="Metrics access required")
+
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(require_metrics_token)])
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+registry.gauge_callback("session_cache_hits", "Session cache hits since start", lambda: session_cache.hits)
+registry.gauge_callback("session_cache_misses", "Session cache misses since start", lambda: session_cache.misses)
+registry.gauge_callback("session_cache_size", "Cached sessions", lambda: len(session_cache))
+registry.gauge_callback("blog_cache_hits", "Blog response cache hits since start", lambda: blog_cache.hits)
+registry.gauge_callback("blog_cache_misses", "Blog response cache misses since start", lambda: blog_cache.misses)
+registry.gauge_callback("password_hash_in_flight", "bcrypt jobs running or queued", lambda: password_hasher.in_flight)
+registry.gauge_callback("password_hash_queue_depth", "bcrypt jobs waiting for a worker", lambda: password_hasher.queue_depth)
+registry.gauge_callback("password_hash_rejected", "bcrypt jobs rejected with 503", lambda: password_hasher.rejected)
+registry.gauge_callback("oauth_breaker_open", "1 while the OAuth exchange circuit is open", lambda: int(session_exchange.breaker.state != "closed"))
+registry.gauge_callback("lead_queue_depth", "Leads waiting to be flushed", lambda: lead_ingestor.pending)
+registry.gauge_callback("lead_last_batch_size", "Leads written by the last flush", lambda: lead_ingestor.last_batch_size)
+registry.gauge_callback("lead_last_flush_seconds", "Duration of the last lead flush", lambda: lead_ingestor.last_flush_seconds)
+registry.gauge_callback("progress_pending", "Learner/course progress documents waiting to be flushed", lambda: progress_ingestor.pending)
+registry.gauge_callback("progress_writes", "Progress upserts written since start", lambda: progress_ingestor.writes)
+registry.gauge_callback("progress_cache_size", "Users with cached course progress", lambda: len(progress_cache))
+registry.gauge_callback("post_stats_pending", "Post/day counters waiting to be flushed", lambda: post_stats.pending)
+registry.gauge_callback("post_stats_writes", "Post stats upserts written since start", lambda: post_stats.writes)
+registry.gauge_callback("market_connections", "Open market-data WebSockets", lambda: market_hub.connections)
+registry.gauge_callback("market_ticks_conflated", "Ticks replaced by a newer one before delivery", lambda: market_hub.conflated)
+registry.gauge_callback("market_slow_disconnects", "Market-data clients dropped for not reading", lambda: market_hub.slow_disconnects)
+def mailer_stat(name: str):
+    return lambda: getattr(email_dispatcher.mailer, name) if email_dispatcher is not None else 0
+
+registry.gauge_callback("email_sent", "Emails accepted by the SMTP relay since start", mailer_stat("sent"))
+registry.gauge_callback("email_refused", "Emails refused permanently", mailer_stat("refused"))
+registry.gauge_callback("email_deferred", "Emails refused temporarily and left for a later retry", mailer_stat("deferred"))
+registry.gauge_callback("email_smtp_connection_errors", "SMTP connections that failed", mailer_stat("connection_errors"))
+registry.gauge_callback("backtest_jobs_running", "Backtest jobs running in this worker", lambda: backtests.running)
+registry.gauge_callback(
+    "rate_limit_keys", "Keys tracked by the in-memory rate limiters", lambda: sum(map(len, rate_limits.local.values()))
+)
+registry.gauge_callback(
+    "rate_limit_early_evictions", "Rate limit buckets dropped for room before they had refilled",
+    rate_limits.early_evictions,
+)
+registry.gauge_callback(
+    "rate_limit_shared_errors", "Shared (Redis) rate limit checks that failed open", rate_limits.shared_errors
+)
+
 app.include_router(api_router)
 
+if BLOG_MEDIA_URL.startswith("/"):
+    app.mount(BLOG_MEDIA_URL, ImmutableStaticFiles(directory=BLOG_MEDIA_DIR, check_dir=False), name="blog_media")
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+app.add_middleware(MetricsMiddleware, profiler=slow_request_profiler)
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -320,10 +1249,26 @@ logger = logging.getLogger(__name__)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in background_startup_tasks:
+        task.cancel()
+    await asyncio.gather(*background_startup_tasks, return_exceptions=True)
+    await lead_ingestor.stop()
+    await progress_ingestor.stop()
+    await post_stats.stop()
+    if email_dispatcher is not None:
+        await email_dispatcher.stop()
+    await revocations.stop()
+    await backtests.stop()
+    if blog_importer is not None:
+        await blog_importer.close()
+    await market_hub.stop()
+    await session_exchange.aclose()
+    await session_store.close()
+    await rate_limits.close()
     client.close()
+    password_hasher.shutdown()
 
-@app.on_event("startup")
-async def startup_db():
+async def seed_sample_posts(db):
     sample_posts = [
         {
             "post_id": "post_001",
@@ -333,7 +1278,7 @@ async def startup_db():
             "content": "Risk management is the cornerstone of successful trading. In this comprehensive guide, we'll explore five essential strategies that every trader should implement...",
             "author": "Trading Academy Team",
             "image_url": "https://images.unsplash.com/photo-1611974789855-9c2a0a7236a3?w=800",
-            "published_at": datetime.now(timezone.utc).isoformat(),
+            "published_at": datetime.now(timezone.utc),
             "tags": ["Risk Management", "Trading Strategy", "Beginner"]
         },
         {
@@ -344,7 +1289,7 @@ async def startup_db():
             "content": "Market psychology plays a crucial role in price movements. Understanding the emotional drivers behind market participants can give you a significant edge...",
             "author": "Trading Academy Team",
             "image_url": "https://images.unsplash.com/photo-1590283603385-17ffb3a7f29f?w=800",
-            "published_at": datetime.now(timezone.utc).isoformat(),
+            "published_at": datetime.now(timezone.utc),
             "tags": ["Psychology", "Trading Mindset", "Advanced"]
         },
         {
@@ -355,12 +1300,151 @@ async def startup_db():
             "content": "Technical analysis is an essential skill for any trader. This beginner-friendly guide will walk you through chart patterns, indicators, and more...",
             "author": "Trading Academy Team",
             "image_url": "https://images.unsplash.com/photo-1642790106117-e829e14a795f?w=800",
-            "published_at": datetime.now(timezone.utc).isoformat(),
+            "published_at": datetime.now(timezone.utc),
             "tags": ["Technical Analysis", "Charts", "Beginner"]
         }
     ]
     
-    existing_count = await db.blog_posts.count_documents({})
-    if existing_count == 0:
-        await db.blog_posts.insert_many(sample_posts)
-        logger.info("Sample blog posts created")
\ No newline at end of file
+    if await db.blog_posts.count_documents({}, limit=1):
+        return {"inserted": 0}
+    result = await db.blog_posts.bulk_write([
+        UpdateOne({"post_id": post["post_id"]}, {"$setOnInsert": post}, upsert=True) for post in sample_posts
+    ], ordered=False)
+    logger.info("Sample blog posts created")
+    return {"inserted": result.upserted_count}
+
+FREE_COURSE = {
+    "course_id": "free-course",
+    "title": "Free Beginner Trading Course",
+    "description": "Start your trading journey with our comprehensive 5-lesson course designed for complete beginners.",
+    "is_premium": False,
+    "lessons": [
+        {"lesson_id": "lesson-1", "title": "Introduction to Trading Markets", "duration_minutes": 15,
+         "topics": ["Market basics", "Different asset classes", "Trading vs Investing"]},
+        {"lesson_id": "lesson-2", "title": "Understanding Charts and Timeframes", "duration_minutes": 20,
+         "topics": ["Candlestick patterns", "Support and resistance", "Trend identification"]},
+        {"lesson_id": "lesson-3", "title": "Risk Management Fundamentals", "duration_minutes": 18,
+         "topics": ["Position sizing", "Stop losses", "Risk/reward ratios"]},
+        {"lesson_id": "lesson-4", "title": "Trading Psychology Basics", "duration_minutes": 12,
+         "topics": ["Emotional control", "Discipline", "Common beginner mistakes"]},
+        {"lesson_id": "lesson-5", "title": "Creating Your First Trading Plan", "duration_minutes": 25,
+         "topics": ["Setting goals", "Strategy development", "Journaling"]},
+    ],
+}
+
+async def seed_free_course(db):
+    # Same lessons as frontend/src/pages/FreeCourse.jsx.
+    result = await db.courses.update_one({"course_id": FREE_COURSE["course_id"]}, {"$setOnInsert": FREE_COURSE}, upsert=True)
+    return {"inserted": int(result.upserted_id is not None)}
+
+async def render_stored_posts(db):
+    from blog_content import render_stored_posts
+
+    return await render_stored_posts(db)
+
+async def seed_welcome_email_job(db):
+    from email_dispatch import WELCOME_BODY, WELCOME_JOB_ID, WELCOME_SUBJECT, new_job
+
+    job = new_job("welcome", WELCOME_SUBJECT, WELCOME_BODY, WELCOME_JOB_ID)
+    result = await db.email_jobs.update_one({"job_id": WELCOME_JOB_ID}, {"$setOnInsert": job}, upsert=True)
+    return {"inserted": int(result.upserted_id is not None)}
+
+async def apply_indexes(db):
+    # Racing submissions stored duplicate leads before email_leads.email was
+    # unique; duplicate users are only reported, since merging loses accounts.
+    removed = await dedupe_leads(db.email_leads)
+    failed = await ensure_indexes(db)
+    if failed:
+        raise RuntimeError(f"Could not create indexes: {', '.join(failed)}")
+    return {"duplicate_leads_removed": removed}
+
+# Applied once per database by whichever worker holds the startup lease;
+# add new steps with the next version instead of editing applied ones.
+STARTUP_STEPS = [
+    StartupStep(1, "iso_dates_to_bson", migrate_iso_dates),
+    StartupStep(2, f"indexes_{index_fingerprint()}", apply_indexes),
+    StartupStep(3, "seed_sample_posts", seed_sample_posts),
+    StartupStep(4, "seed_free_course", seed_free_course),
+    StartupStep(5, "seed_welcome_email_job", seed_welcome_email_job),
+    StartupStep(6, "render_stored_posts", render_stored_posts),
+]
+startup_report = {}
+
+VERIFY_QUERY_PLANS = os.environ.get('VERIFY_QUERY_PLANS', '').lower() in ('1', 'true', 'yes')
+READINESS_RETRY_SECONDS = float(os.environ.get('READINESS_RETRY_SECONDS', '2'))
+readiness_checks = {"mongo": False, "startup": False, "indexes": False, "warm": False}
+ready = asyncio.Event()
+background_startup_tasks = []
+
+async def ping_mongo(timeout: float = 2.0) -> bool:
+    try:
+        await asyncio.wait_for(client.admin.command("ping"), timeout)
+    except Exception:
+        return False
+    return True
+
+async def prepare_for_traffic():
+    """Runs after startup returns, so the port (and /healthz) is up before this finishes.
+
+    /readyz stays 503 until Mongo answers, every required startup step has
+    been applied (this worker runs them if it wins the startup lease;
+    followers wait here for the lease holder, and take its lease over if it
+    dies), every registry index exists (and, with VERIFY_QUERY_PLANS, no
+    request query plans a COLLSCAN), the JWT revocation list is loaded and
+    the in-memory search index and blog cache are built from the seeded data.
+    """
+    while True:
+        try:
+            readiness_checks["mongo"] = await ping_mongo()
+            if readiness_checks["mongo"] and not readiness_checks["startup"]:
+                if not startup_report or await pending_required_steps(db, STARTUP_STEPS):
+                    report = await run_startup_steps(db, STARTUP_STEPS)
+                    if report["role"] == "leader" or not startup_report:
+                        startup_report.update(report)
+                pending = await pending_required_steps(db, STARTUP_STEPS)
+                readiness_checks["startup"] = not pending
+                if pending:
+                    logger.info("Not ready, waiting for startup steps: %s", ", ".join(pending))
+            if readiness_checks["startup"]:
+                missing = await missing_indexes(db)
+                if missing:
+                    logger.info("Not ready, missing indexes: %s", ", ".join(missing))
+                elif VERIFY_QUERY_PLANS:
+                    # A COLLSCAN means the index registry is wrong; stay unready rather than serve it.
+                    missing = await verify_query_plans(db)
+                    if missing:
+                        logger.error("Not ready, queries plan a COLLSCAN: %s", ", ".join(missing))
+                readiness_checks["indexes"] = not missing
+            if readiness_checks["indexes"] and not readiness_checks["warm"]:
+                await revocations.sync()
+                await rebuild_search_index()
+                await warm_blog_cache()
+                await get_course_catalog()
+                readiness_checks["warm"] = True
+        except Exception:
+            logger.exception("Readiness check failed")
+        if all(readiness_checks.values()):
+            break
+        await asyncio.sleep(READINESS_RETRY_SECONDS)
+    ready.set()
+    logger.info("Ready to serve")
+
+@app.on_event("startup")
+async def startup_db():
+    global email_dispatcher
+    # Nothing here may wait on Mongo: the port and /healthz come up first,
+    # and prepare_for_traffic runs the startup steps in the background.
+    lead_ingestor.start()
+    post_stats.start()
+    progress_ingestor.start()
+    if SMTP_HOST:
+        email_dispatcher = email_dispatcher or make_email_dispatcher()
+        email_dispatcher.start()
+    market_hub.start(make_feed(os.environ.get('MARKET_FEED', '')))
+    revocations.start()
+    background_startup_tasks.extend([
+        asyncio.create_task(password_hasher.warm()),
+        asyncio.create_task(prepare_for_traffic()),
+        asyncio.create_task(refresh_popular_posts_forever()),
+        asyncio.create_task(refresh_search_index_forever()),
+    ])
\ No newline at end of file
@@ -0,0 +1,85 @@
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, Set
+
+
+class SessionCache:
+    """Bounded LRU cache of session_token -> (user, expiry) for get_current_user.
+
+    ``invalidate_user`` only reaches this worker's cache. For other workers,
+    ``is_revoked(user_id, cached_at)`` is checked on every hit, so an entry
+    cached before a revocation they have synced is dropped. A logout therefore
+    takes effect everywhere within the revocation sync interval, and anything
+    else (a profile change) within ``ttl``.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 60.0,
+                 is_revoked: Optional[Callable[[str, float], bool]] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.is_revoked = is_revoked
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._tokens_by_user: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, session_token: str) -> Optional[Any]:
+        entry = self._entries.get(session_token)
+        if entry is None:
+            self.misses += 1
+            return None
+        user, user_id, session_expires_at, cached_until, cached_at = entry
+        if (cached_until < time.monotonic() or session_expires_at < datetime.now(timezone.utc)
+                or (self.is_revoked is not None and self.is_revoked(user_id, cached_at))):
+            self._remove(session_token)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(session_token)
+        self.hits += 1
+        return user
+
+    def set(self, session_token: str, user: Any, user_id: str, session_expires_at: datetime):
+        if session_token in self._entries:
+            self._remove(session_token)
+        self._entries[session_token] = (user, user_id, session_expires_at, time.monotonic() + self.ttl, time.time())
+        self._tokens_by_user.setdefault(user_id, set()).add(session_token)
+        while len(self._entries) > self.maxsize:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate(self, session_token: str):
+        if session_token in self._entries:
+            self._remove(session_token)
+
+    def invalidate_user(self, user_id: str):
+        for session_token in list(self._tokens_by_user.get(user_id, ())):
+            self._remove(session_token)
+
+    def clear(self):
+        self._entries.clear()
+        self._tokens_by_user.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _remove(self, session_token: str):
+        user, user_id, *_ = self._entries.pop(session_token)
+        tokens = self._tokens_by_user.get(user_id)
+        if tokens is not None:
+            tokens.discard(session_token)
+            if not tokens:
+                del self._tokens_by_user[user_id]
@@ -0,0 +1,111 @@
+import json
+import math
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Optional
+
+
+class SessionStore(ABC):
+    """Where opaque session tokens live; ``get`` returns ``{"user_id", "expires_at"}`` or None."""
+
+    @abstractmethod
+    async def create(self, session_token: str, user_id: str, expires_at: datetime, replace: bool = False):
+        ...
+
+    @abstractmethod
+    async def get(self, session_token: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def delete_user(self, user_id: str):
+        ...
+
+    async def close(self):
+        pass
+
+
+class MongoSessionStore(SessionStore):
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def create(self, session_token: str, user_id: str, expires_at: datetime, replace: bool = False):
+        session_doc = {
+            "user_id": user_id,
+            "session_token": session_token,
+            "expires_at": expires_at,
+            "created_at": datetime.now(timezone.utc),
+        }
+        if replace:
+            await self.collection.update_one({"session_token": session_token}, {"$set": session_doc}, upsert=True)
+        else:
+            await self.collection.insert_one(session_doc)
+
+    async def get(self, session_token: str) -> Optional[dict]:
+        return await self.collection.find_one(
+            {"session_token": session_token}, {"_id": 0, "user_id": 1, "expires_at": 1}
+        )
+
+    async def delete_user(self, user_id: str):
+        await self.collection.delete_many({"user_id": user_id})
+
+
+# Deletes every session in a user's set plus the set itself in one round trip.
+_DELETE_USER_SCRIPT = """
+local tokens = redis.call('SMEMBERS', KEYS[1])
+for _, token in ipairs(tokens) do
+    redis.call('DEL', ARGV[1] .. token)
+end
+redis.call('DEL', KEYS[1])
+return #tokens
+"""
+
+
+class RedisSessionStore(SessionStore):
+    """Sessions in any Redis-protocol server: one key per token with a native TTL.
+
+    Each user also has a set of their tokens so logout can drop them all in
+    a single scripted call; the set's TTL is pushed out to the newest session.
+    """
+
+    def __init__(self, url: str, prefix: str = "ta:"):
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self._delete_user = self.redis.register_script(_DELETE_USER_SCRIPT)
+
+    def _session_key(self, session_token: str) -> str:
+        return f"{self.prefix}session:{session_token}"
+
+    def _user_key(self, user_id: str) -> str:
+        return f"{self.prefix}user_sessions:{user_id}"
+
+    async def create(self, session_token: str, user_id: str, expires_at: datetime, replace: bool = False):
+        ttl = max(math.ceil((expires_at - datetime.now(timezone.utc)).total_seconds()), 1)
+        value = json.dumps({"user_id": user_id, "expires_at": expires_at.timestamp()})
+        user_key = self._user_key(user_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.set(self._session_key(session_token), value, ex=ttl)
+            pipe.sadd(user_key, session_token)
+            pipe.expire(user_key, ttl, gt=True)
+            pipe.expire(user_key, ttl, nx=True)
+            await pipe.execute()
+
+    async def get(self, session_token: str) -> Optional[dict]:
+        value = await self.redis.get(self._session_key(session_token))
+        if value is None:
+            return None
+        data = json.loads(value)
+        return {"user_id": data["user_id"], "expires_at": datetime.fromtimestamp(data["expires_at"], timezone.utc)}
+
+    async def delete_user(self, user_id: str):
+        await self._delete_user(keys=[self._user_key(user_id)], args=[f"{self.prefix}session:"])
+
+    async def close(self):
+        await self.redis.aclose()
+
+
+def create_session_store(backend: str, db, redis_url: Optional[str] = None) -> SessionStore:
+    if backend == "redis":
+        return RedisSessionStore(redis_url or "redis://localhost:6379/0")
+    return MongoSessionStore(db.user_sessions)
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+LOCK_ID = "startup_lock"
+
+
+class StartupStep(NamedTuple):
+    """A one-time startup task, applied in ``version`` order and recorded once it succeeds.
+
+    Steps that are not ``required`` log their error and are retried on the
+    next boot instead of failing startup.
+    """
+
+    version: int
+    name: str
+    run: Callable[[Any], Awaitable[Any]]
+    required: bool = True
+
+    @property
+    def id(self) -> str:
+        return f"startup:{self.version:04d}:{self.name}"
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class StartupLease:
+    """Lease on the ``startup_lock`` document in the migrations collection.
+
+    Expired leases can be taken over, so a worker that dies mid-startup
+    only blocks the others for ``lease_seconds``.
+    """
+
+    def __init__(self, collection, owner: str, lease_seconds: float = 60.0):
+        self.collection = collection
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    async def acquire(self) -> bool:
+        now = datetime.now(timezone.utc)
+        try:
+            # Matches only a free, expired or already-owned lock; otherwise the
+            # upsert collides with the live lock's _id.
+            await self.collection.update_one(
+                {"_id": LOCK_ID, "$or": [{"expires_at": {"$lt": now}}, {"owner": self.owner}]},
+                {"$set": {"owner": self.owner, "expires_at": now + timedelta(seconds=self.lease_seconds)}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return False
+        self._heartbeat = asyncio.create_task(self._renew_forever())
+        return True
+
+    async def renew(self) -> bool:
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds)
+        result = await self.collection.update_one(
+            {"_id": LOCK_ID, "owner": self.owner}, {"$set": {"expires_at": expires_at}}
+        )
+        return result.matched_count == 1
+
+    async def _renew_forever(self):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if not await self.renew():
+                logger.warning("Startup lease lost by %s", self.owner)
+                return
+
+    async def release(self):
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            await asyncio.gather(self._heartbeat, return_exceptions=True)
+            self._heartbeat = None
+        await self.collection.delete_one({"_id": LOCK_ID, "owner": self.owner})
+
+
+async def _pending(db, steps: List[StartupStep]) -> List[StartupStep]:
+    applied = {doc["_id"] async for doc in db.migrations.find({"_id": {"$in": [step.id for step in steps]}}, {"_id": 1})}
+    return [step for step in sorted(steps, key=lambda step: step.version) if step.id not in applied]
+
+
+async def pending_required_steps(db, steps: List[StartupStep]) -> List[str]:
+    """Ids of required steps not applied yet, e.g. while the lease holder is still running them."""
+    return [step.id for step in await _pending(db, steps) if step.required]
+
+
+async def run_startup_steps(db, steps: List[StartupStep], owner: Optional[str] = None,
+                            lease_seconds: float = 60.0) -> Dict[str, Any]:
+    """Apply pending steps exactly once across all workers.
+
+    Costs a single query when everything is applied. Otherwise one worker
+    takes the lease and applies the pending steps while the rest return as
+    followers; they should not report ready until
+    ``pending_required_steps`` is empty, and can call this again to take
+    over the lease if its holder dies.
+    """
+    pending = await _pending(db, steps)
+    if not pending:
+        return {"role": "up_to_date", "applied": []}
+
+    lease = StartupLease(db.migrations, owner or worker_id(), lease_seconds)
+    if not await lease.acquire():
+        logger.info("Startup steps are being applied by another worker")
+        return {"role": "follower", "applied": []}
+
+    applied = []
+    try:
+        # Re-check under the lease: the previous holder may have just finished.
+        for step in await _pending(db, steps):
+            started = time.perf_counter()
+            try:
+                result = await step.run(db)
+            except Exception:
+                if step.required:
+                    raise
+                logger.exception("Startup step %s failed; will retry on next boot", step.id)
+                continue
+            await db.migrations.update_one(
+                {"_id": step.id},
+                {"$set": {
+                    "applied_at": datetime.now(timezone.utc),
+                    "applied_by": lease.owner,
+                    "duration_seconds": time.perf_counter() - started,
+                    "result": result,
+                }},
+                upsert=True,
+            )
+            applied.append(step.id)
+            logger.info("Applied startup step %s", step.id)
+    finally:
+        await lease.release()
+    return {"role": "leader", "applied": applied}
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RevocationList:
+    """In-memory map of user_id -> revoked_at used to reject JWTs and cached sessions from before a logout.
+
+    Revocations are persisted to ``collection`` and pulled by every worker
+    every ``sync_interval`` seconds, so another worker honours a logout after
+    at most one interval. Entries expire once every token they could cover
+    has expired on its own.
+    """
+
+    def __init__(self, collection, retention: timedelta, sync_interval: float = 5.0):
+        self.collection = collection
+        self.retention = retention
+        self.sync_interval = sync_interval
+        self._revoked_at: Dict[str, float] = {}
+        self._synced_until: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._revoked_at)
+
+    def is_revoked(self, user_id: str, issued_at: float) -> bool:
+        revoked_at = self._revoked_at.get(user_id)
+        return revoked_at is not None and issued_at <= revoked_at
+
+    async def revoke(self, user_id: str):
+        now = datetime.now(timezone.utc)
+        self._revoked_at[user_id] = now.timestamp()
+        await self.collection.update_one(
+            {"user_id": user_id},
+            {"$set": {"revoked_at": now, "expires_at": now + self.retention}},
+            upsert=True,
+        )
+
+    async def sync(self):
+        query = {"expires_at": {"$gt": datetime.now(timezone.utc)}}
+        if self._synced_until is not None:
+            query["revoked_at"] = {"$gte": self._synced_until}
+        self._synced_until = datetime.now(timezone.utc) - timedelta(seconds=self.sync_interval)
+        async for doc in self.collection.find(query, {"_id": 0, "user_id": 1, "revoked_at": 1}):
+            revoked_at = doc["revoked_at"].timestamp()
+            if revoked_at > self._revoked_at.get(doc["user_id"], 0.0):
+                self._revoked_at[doc["user_id"]] = revoked_at
+        cutoff = time.time() - self.retention.total_seconds()
+        for user_id in [user_id for user_id, revoked_at in self._revoked_at.items() if revoked_at < cutoff]:
+            del self._revoked_at[user_id]
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.sync()
+            except Exception:
+                logger.exception("Failed to sync token revocations")
+
+    def start(self):
+        """Start the periodic sync; the first ``sync()`` is the caller's (readiness waits on it)."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
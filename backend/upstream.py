@@ -0,0 +1,176 @@
+import importlib.util
+import time
+from collections import OrderedDict, deque
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import httpx
+
+
+class UpstreamUnavailable(Exception):
+    pass
+
+
+class UpstreamRejected(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"upstream returned {status_code}")
+        self.status_code = status_code
+
+
+class CircuitBreaker:
+    """Opens once the failure rate over the last ``window`` seconds crosses ``threshold``.
+
+    While open every call fails fast; after ``reset_timeout`` a single trial
+    call is let through and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, threshold: float = 0.5, min_calls: int = 10, window: float = 30.0, reset_timeout: float = 15.0):
+        self.threshold = threshold
+        self.min_calls = min_calls
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.opened_at = 0.0
+        self._outcomes: deque = deque()
+        self._trial_in_flight = False
+
+    def _trim(self, now: float):
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            self._outcomes.popleft()
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def release(self):
+        """End a call without a verdict (e.g. cancelled), freeing the half-open trial slot."""
+        self._trial_in_flight = False
+
+    def record(self, success: bool):
+        now = time.monotonic()
+        if self.state == "half_open":
+            self._trial_in_flight = False
+            if success:
+                self.state = "closed"
+                self._outcomes.clear()
+            else:
+                self.state = "open"
+                self.opened_at = now
+            return
+        self._outcomes.append((now, success))
+        self._trim(now)
+        failures = sum(1 for _, ok in self._outcomes if not ok)
+        if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.threshold:
+            self.state = "open"
+            self.opened_at = now
+
+
+class SessionExchangeClient:
+    """App-lifetime pooled client for the OAuth session-data exchange.
+
+    Successful exchanges are cached for ``cache_ttl`` seconds so a callback
+    page that posts the same session id twice only costs one upstream call.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        connect_timeout: float = 2.0,
+        read_timeout: float = 5.0,
+        max_connections: int = 100,
+        cache_ttl: float = 60.0,
+        cache_size: int = 1024,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.url = url
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_connections = max_connections
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.breaker = breaker or CircuitBreaker()
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._client: Optional["httpx.AsyncClient"] = None
+
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        # httpx (and certifi) are imported on the first exchange, not at server import.
+        import httpx
+
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout, pool=self.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections, max_keepalive_connections=self.max_connections // 2
+                ),
+                http2=importlib.util.find_spec("h2") is not None,
+            )
+        return self._client
+
+    def _cached(self, session_id: str) -> Optional[dict]:
+        entry = self._cache.get(session_id)
+        if entry is None:
+            return None
+        expires, data = entry
+        if expires < time.monotonic():
+            del self._cache[session_id]
+            return None
+        return data
+
+    async def _get(self, session_id: str) -> "httpx.Response":
+        import httpx
+
+        try:
+            return await self.client.get(self.url, headers={"X-Session-ID": session_id})
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+            # Nothing reached the upstream, so one retry is safe.
+            return await self.client.get(self.url, headers={"X-Session-ID": session_id})
+
+    async def exchange(self, session_id: str) -> dict:
+        import httpx
+
+        cached = self._cached(session_id)
+        if cached is not None:
+            return cached
+        if not self.breaker.allow():
+            raise UpstreamUnavailable("circuit open")
+        try:
+            response = await self._get(session_id)
+        except httpx.HTTPError as e:
+            self.breaker.record(False)
+            raise UpstreamUnavailable(str(e)) from e
+        except BaseException:
+            # Cancelled, or failed for a reason that says nothing about the
+            # upstream: without this a half-open breaker would never trial again.
+            self.breaker.release()
+            raise
+
+        if response.status_code >= 500:
+            self.breaker.record(False)
+            raise UpstreamUnavailable(f"upstream returned {response.status_code}")
+        if response.status_code != 200:
+            self.breaker.record(True)
+            raise UpstreamRejected(response.status_code)
+        try:
+            data = response.json()
+        except ValueError:
+            data = None
+        # A 200 without a JSON object (an error page from a proxy in front of it) is an outage, not a 500 here.
+        self.breaker.record(isinstance(data, dict))
+        if not isinstance(data, dict):
+            raise UpstreamUnavailable("upstream returned a malformed body")
+        self._cache[session_id] = (time.monotonic() + self.cache_ttl, data)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return data
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
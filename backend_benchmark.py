@@ -0,0 +1,452 @@
+"""Load-test every API route in-process against a local MongoDB.
+
+Seeds a dedicated ``bench_*`` database, drives each route with a fixed
+number of concurrent clients and writes RPS and latency percentiles as
+JSON. With ``--baseline`` the run fails when any route's p99 or RPS
+regresses by more than ``--tolerance``.
+
+In-process runs also measure the cached routes with their cache off
+(``*_uncached``) and the blog listing's serialization before and after
+native dates and orjson; a running server (``--base-url``) cannot be
+reconfigured from here, so those are skipped. ``--workers N`` starts N
+uvicorn worker processes on the seeded database and drives them like
+``--base-url``; with ``--session-store redis`` that measures ``/auth/me``
+the way it is deployed, each worker with its own session cache in front
+of one shared store.
+
+    python backend_benchmark.py --scale 0.01 --output bench.json
+    python backend_benchmark.py --baseline test_reports/benchmark_baseline.json
+    python backend_benchmark.py --base-url http://127.0.0.1:8001 --routes me
+    python backend_benchmark.py --workers 4 --session-store redis --routes me
+"""
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List
+
+ROOT_DIR = Path(__file__).parent
+sys.path.insert(0, str(ROOT_DIR / "backend"))
+
+DEFAULT_VOLUMES = {"users": 100_000, "sessions": 1_000_000, "posts": 10_000, "leads": 500_000}
+BENCH_PASSWORD = "BenchPass123!"
+TAGS = ["Risk Management", "Psychology", "Technical Analysis", "Beginner", "Advanced", "Options", "Forex", "Crypto"]
+WORDS = (
+    "trend support resistance breakout volume momentum candle stop loss position size risk reward "
+    "moving average divergence pullback entry exit journal discipline volatility liquidity spread"
+).split()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the Trading Academy API routes")
+    parser.add_argument("--db-name", default="bench_trading_academy", help="database to seed; must start with 'bench'")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier applied to the default seed volumes")
+    parser.add_argument("--skip-seed", action="store_true", help="reuse an already seeded database")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per route")
+    parser.add_argument("--routes", default="", help="comma-separated subset of routes to run")
+    parser.add_argument("--base-url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--workers", type=int, default=0, help="start this many uvicorn workers and benchmark them")
+    parser.add_argument("--port", type=int, default=8765, help="port for --workers")
+    parser.add_argument("--session-store", choices=["mongo", "redis"], help="override SESSION_STORE (REDIS_URL for redis)")
+    parser.add_argument("--output", type=Path, help="write results JSON here")
+    parser.add_argument("--baseline", type=Path, help="compare against this results JSON")
+    parser.add_argument("--save-baseline", action="store_true", help="write results to --baseline instead of comparing")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative regression")
+    return parser.parse_args()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+SEEDED = ("users", "user_sessions", "blog_posts", "email_leads")
+
+
+async def seed(server, volumes, batch_size=5000):
+    db = server.db
+    rng = random.Random(42)
+    # Delete documents rather than drop the database: a server already
+    # running against it (--base-url) keeps its indexes and startup records.
+    for name in SEEDED:
+        await db[name].delete_many({})
+    now = datetime.now(timezone.utc)
+    password_hash = await server.password_hasher.hash(BENCH_PASSWORD)
+
+    async def insert(collection, docs):
+        batch = []
+        for doc in docs:
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                await collection.insert_many(batch, ordered=False)
+                batch = []
+        if batch:
+            await collection.insert_many(batch, ordered=False)
+
+    await insert(db.users, (
+        {
+            "user_id": f"bench_user_{i}",
+            "email": f"bench{i}@example.com",
+            "name": f"Bench User {i}",
+            "password_hash": password_hash,
+            "picture": None,
+            "is_premium": i % 10 == 0,
+            "created_at": now,
+        }
+        for i in range(volumes["users"])
+    ))
+
+    expires_at = now + timedelta(days=7)
+    if os.environ.get('SESSION_STORE', 'mongo') == "mongo":
+        await insert(db.user_sessions, (
+            {
+                "user_id": f"bench_user_{rng.randrange(volumes['users'])}",
+                "session_token": f"session_bench{i}",
+                "expires_at": expires_at,
+                "created_at": now,
+            }
+            for i in range(volumes["sessions"])
+        ))
+    else:
+        for start in range(0, volumes["sessions"], batch_size):
+            await asyncio.gather(*(
+                server.session_store.create(f"session_bench{i}", f"bench_user_{rng.randrange(volumes['users'])}", expires_at)
+                for i in range(start, min(start + batch_size, volumes["sessions"]))
+            ))
+
+    await insert(db.blog_posts, (
+        {
+            "post_id": f"bench_post_{i:06d}",
+            "title": " ".join(rng.choices(WORDS, k=8)).title(),
+            "slug": f"bench-post-{i}",
+            "excerpt": " ".join(rng.choices(WORDS, k=25)),
+            "content": " ".join(rng.choices(WORDS, k=400)),
+            "author": "Trading Academy Team",
+            "image_url": "https://images.unsplash.com/photo-1611974789855-9c2a0a7236a3?w=800",
+            "published_at": now - timedelta(minutes=i),
+            "tags": rng.sample(TAGS, 3),
+        }
+        for i in range(volumes["posts"])
+    ))
+
+    await insert(db.email_leads, (
+        {"lead_id": f"bench_lead_{i}", "email": f"lead{i}@example.com", "name": None, "created_at": now}
+        for i in range(volumes["leads"])
+    ))
+
+
+def auth_tokens(server, volumes, rng, count=10_000):
+    if server.AUTH_MODE == "jwt":
+        now = datetime.now(timezone.utc)
+        tokens = []
+        for _ in range(count):
+            i = rng.randrange(volumes["users"])
+            user = server.User(user_id=f"bench_user_{i}", email=f"bench{i}@example.com", name=f"Bench User {i}", created_at=now)
+            tokens.append(server.create_access_token(server.user_claims(user), timedelta(hours=1)))
+        return tokens
+    return [f"session_bench{rng.randrange(volumes['sessions'])}" for _ in range(count)]
+
+
+def build_routes(server, volumes, rng):
+    tokens = auth_tokens(server, volumes, rng)
+    lead_counter = itertools.count()
+    run_id = int(time.time())
+
+    def login(client):
+        i = rng.randrange(volumes["users"])
+        return client.post("/api/auth/login", json={"email": f"bench{i}@example.com", "password": BENCH_PASSWORD})
+
+    def me(client):
+        return client.get("/api/auth/me", headers={"Authorization": f"Bearer {rng.choice(tokens)}"})
+
+    def blog_posts(client):
+        return client.get("/api/blog/posts")
+
+    def blog_post(client):
+        return client.get(f"/api/blog/posts/bench-post-{rng.randrange(volumes['posts'])}")
+
+    def blog_search(client):
+        return client.get("/api/blog/search", params={"q": " ".join(rng.sample(WORDS, 2))})
+
+    def leads(client):
+        return client.post("/api/leads", json={"email": f"new{run_id}_{next(lead_counter)}@example.com"})
+
+    # name -> (request factory, background load as (factory, concurrency) or None, cache to disable or None)
+    return {
+        "login": (login, None, None),
+        "me": (me, None, None),
+        "me_uncached": (me, None, server.session_cache),
+        "blog_posts": (blog_posts, None, None),
+        "blog_posts_uncached": (blog_posts, None, server.blog_cache),
+        "blog_post": (blog_post, None, None),
+        "blog_post_uncached": (blog_post, None, server.blog_cache),
+        "blog_search": (blog_search, None, None),
+        "leads": (leads, None, None),
+        "blog_posts_during_logins": (blog_posts, (login, 200), None),
+    }
+
+
+@contextlib.contextmanager
+def disabled(cache):
+    """Run with ``cache`` (a SessionCache or ResponseCache) holding nothing."""
+    if cache is None:
+        yield
+        return
+    maxsize = cache.maxsize
+    if hasattr(cache, "clear"):
+        cache.clear()
+    else:
+        cache.bump_version()
+    cache.maxsize = 0
+    try:
+        yield
+    finally:
+        cache.maxsize = maxsize
+
+
+async def compare_serialization(server, limit=20, rounds=500):
+    """Per-page cost of the blog listing's serialization, as it was and as it is.
+
+    Before: ISO-string dates parsed with ``fromisoformat``, then FastAPI's
+    response_model re-validation, ``jsonable_encoder`` and ``json.dumps``.
+    After: native dates straight from Mongo, models dumped with orjson.
+    """
+    from fastapi.encoders import jsonable_encoder
+    from pydantic import TypeAdapter
+
+    posts = await server.db.blog_posts.find({}, server.BLOG_SUMMARY_PROJECTION).sort(
+        server.BLOG_LISTING_SORT).limit(limit).to_list(limit)
+    stored = [{**post, "published_at": post["published_at"].isoformat()} for post in posts]
+    adapter = TypeAdapter(List[server.BlogPostSummary])
+
+    def before():
+        page = []
+        for post in stored:
+            post = dict(post)
+            post["published_at"] = datetime.fromisoformat(post["published_at"])
+            page.append(server.BlogPostSummary(**post))
+        content = jsonable_encoder(adapter.validate_python(page))
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+    def after():
+        return server.dumps([server.BlogPostSummary(**post) for post in posts])
+
+    results = {}
+    for name, render in (("before", before), ("after", after)):
+        timings = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            render()
+            timings.append((time.perf_counter() - started) * 1_000_000)
+        timings.sort()
+        results[name] = {"p50_us": round(percentile(timings, 0.50), 1), "p99_us": round(percentile(timings, 0.99), 1)}
+    results["speedup_p50"] = round(results["before"]["p50_us"] / results["after"]["p50_us"], 2)
+    return results
+
+
+async def run_route(client, factory, concurrency, total, background=None):
+    latencies = []
+    errors = 0
+    remaining = itertools.count()
+    stop = asyncio.Event()
+
+    async def worker():
+        nonlocal errors
+        while next(remaining) < total:
+            started = time.perf_counter()
+            try:
+                response = await factory(client)
+                if response.status_code >= 400:
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    async def background_worker(background_factory):
+        while not stop.is_set():
+            try:
+                response = await background_factory(client)
+                failed = response.status_code >= 500
+            except Exception:
+                failed = True
+            if failed:
+                # Shed load (503s) comes back instantly; back off instead of spinning.
+                await asyncio.sleep(0.05)
+
+    background_tasks = []
+    if background is not None:
+        background_factory, background_concurrency = background
+        background_tasks = [asyncio.create_task(background_worker(background_factory)) for _ in range(background_concurrency)]
+        await asyncio.sleep(0.5)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await asyncio.gather(*background_tasks)
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p90_ms": round(percentile(latencies, 0.90), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "mean_ms": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+    }
+
+
+def start_workers(count, port):
+    """Serve the app from ``count`` uvicorn workers, configured by this process's environment."""
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(count), "--log-level", "warning"],
+        cwd=ROOT_DIR / "backend",
+    )
+
+
+async def wait_ready(client, workers, timeout=120.0):
+    # Requests spread over the workers, so a run of successes means every one has warmed.
+    deadline = time.monotonic() + timeout
+    streak = 0
+    while streak < 4 * workers:
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"workers not ready after {timeout:.0f}s")
+        try:
+            streak = streak + 1 if (await client.get("/readyz")).status_code == 200 else 0
+        except Exception:
+            streak = 0
+        if not streak:
+            await asyncio.sleep(0.5)
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if previous is None:
+            continue
+        if current["p99_ms"] > previous["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {previous['p99_ms']}ms -> {current['p99_ms']}ms")
+        if current["rps"] < previous["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: rps {previous['rps']} -> {current['rps']}")
+    return regressions
+
+
+async def main():
+    args = parse_args()
+    if not args.db_name.startswith("bench"):
+        print("refusing to seed a database whose name does not start with 'bench'")
+        return 2
+    os.environ['DB_NAME'] = args.db_name
+    # Every simulated client shares one IP; measure the handlers, not the limiter.
+    os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+    if args.session_store:
+        os.environ['SESSION_STORE'] = args.session_store
+    if args.workers and args.base_url:
+        print("--workers and --base-url are exclusive")
+        return 2
+
+    import httpx
+    import server
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    volumes = {name: max(int(count * args.scale), 1) for name, count in DEFAULT_VOLUMES.items()}
+    if not args.skip_seed:
+        started = time.perf_counter()
+        await seed(server, volumes)
+        print(f"seeded {volumes} in {time.perf_counter() - started:.1f}s")
+
+    worker_process = None
+    if args.workers:
+        # After seeding, so each worker warms its caches from the final data.
+        worker_process = start_workers(args.workers, args.port)
+        args.base_url = f"http://127.0.0.1:{args.port}"
+
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, limits=httpx.Limits(max_connections=args.concurrency + 200))
+    else:
+        for handler in server.app.router.on_startup:
+            await handler()
+        await server.ready.wait()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://bench")
+
+    rng = random.Random(7)
+    routes = build_routes(server, volumes, rng)
+    selected = [name.strip() for name in args.routes.split(",") if name.strip()] or list(routes)
+    if args.base_url:
+        selected = [name for name in selected if routes[name][2] is None]
+    results = {}
+    comparisons = {}
+    try:
+        if worker_process is not None:
+            await wait_ready(client, args.workers)
+        for name in selected:
+            factory, background, cache = routes[name]
+            with disabled(cache):
+                results[name] = await run_route(client, factory, args.concurrency, args.requests, background)
+            print(f"{name:>26}: {json.dumps(results[name])}")
+        for name in selected:
+            uncached = results.get(f"{name}_uncached")
+            if uncached is not None:
+                comparisons[f"{name}_cache"] = {
+                    "p50_ms": [uncached["p50_ms"], results[name]["p50_ms"]],
+                    "p99_ms": [uncached["p99_ms"], results[name]["p99_ms"]],
+                    "rps": [uncached["rps"], results[name]["rps"]],
+                }
+                print(f"{name + ' cache off -> on':>26}: {json.dumps(comparisons[f'{name}_cache'])}")
+        if not args.base_url:
+            comparisons["blog_posts_serialization"] = await compare_serialization(server)
+            print(f"{'serialization before/after':>26}: {json.dumps(comparisons['blog_posts_serialization'])}")
+    finally:
+        await client.aclose()
+        if worker_process is not None:
+            worker_process.terminate()
+            worker_process.wait(timeout=30)
+        elif not args.base_url:
+            for handler in server.app.router.on_shutdown:
+                await handler()
+
+    report = {
+        "meta": {
+            "volumes": volumes,
+            "concurrency": args.concurrency,
+            "requests_per_route": args.requests,
+            "auth_mode": server.AUTH_MODE,
+            "session_store": os.environ.get('SESSION_STORE', 'mongo'),
+            "target": args.base_url or "in-process",
+            "workers": args.workers or 1,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        },
+        "results": results,
+        "comparisons": comparisons,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+    if args.baseline and args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2))
+    elif args.baseline:
+        regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,112 @@
+"""Check the import-time budget of ``backend/server.py``.
+
+Runs ``python -X importtime -c "import server"`` a few times, reports the
+best total and the heaviest packages, and exits non-zero when the total
+exceeds ``--budget-ms``, the app's own share (server.py and the backend
+modules it imports, without third-party packages) exceeds
+``--own-budget-ms``, or a package that must stay lazy was imported.
+
+The total is dominated by FastAPI and Motor and moves with the machine;
+the own share is what a change to this repo can regress.
+
+    python backend_importtime.py
+    python backend_importtime.py --budget-ms 600 --runs 10
+"""
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+BACKEND_DIR = ROOT_DIR / "backend"
+
+# Loaded on first use only; importing any of these from server.py is a regression.
+# blog_content and email_dispatch are features that are off until used (an import, SMTP_HOST).
+LAZY_PACKAGES = [
+    "blog_content",
+    "boto3",
+    "email_dispatch",
+    "google.genai",
+    "google.generativeai",
+    "httpx",
+    "jose",
+    "litellm",
+    "numpy",
+    "openai",
+    "pandas",
+    "passlib",
+    "redis",
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Fail if importing server.py exceeds the import-time budget")
+    parser.add_argument("--budget-ms", type=float, default=750.0, help="maximum cumulative import time of server")
+    parser.add_argument("--own-budget-ms", type=float, default=150.0,
+                        help="maximum import time of server minus the third-party packages it imports")
+    parser.add_argument("--runs", type=int, default=5, help="best of this many runs is compared to the budget")
+    parser.add_argument("--top", type=int, default=15, help="number of heaviest packages to list")
+    return parser.parse_args()
+
+
+def import_times():
+    env = {"MONGO_URL": "mongodb://localhost:27017", "DB_NAME": "importtime", **os.environ}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    # "import time: <self us> | <cumulative us> | <indent><module>", children before parents
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), int(cumulative), len(name) - len(name.lstrip())))
+    return modules
+
+
+def first_party(package: str) -> bool:
+    return (BACKEND_DIR / f"{package}.py").exists()
+
+
+def server_imports(modules):
+    """Total for server plus the cumulative time of each package it imported directly."""
+    index = next(i for i, (name, _, _) in enumerate(modules) if name == "server")
+    _, total, depth = modules[index]
+    packages = {}
+    for name, cumulative, child_depth in reversed(modules[:index]):
+        if child_depth <= depth:
+            break
+        if child_depth == depth + 2:
+            package = name.split(".")[0]
+            packages[package] = packages.get(package, 0) + cumulative
+    names = {name for name, _, _ in modules[:index + 1]}
+    return total, packages, names
+
+
+def main():
+    args = parse_args()
+    runs = [server_imports(import_times()) for _ in range(args.runs)]
+    total, packages, names = min(runs, key=lambda run: run[0])
+    total_ms = total / 1000
+    own_ms = min(run[0] - sum(cumulative for package, cumulative in run[1].items() if not first_party(package))
+                 for run in runs) / 1000
+
+    for name, cumulative in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{cumulative / 1000:8.1f}ms  {name}")
+    print(f"server: {total_ms:.1f}ms (best of {args.runs}, budget {args.budget_ms:.0f}ms)")
+    print(f"  own: {own_ms:.1f}ms (budget {args.own_budget_ms:.0f}ms)")
+
+    eager = [name for name in LAZY_PACKAGES if name in names]
+    for name in eager:
+        print(f"EAGER IMPORT {name}: must be imported on first use")
+    if total_ms > args.budget_ms:
+        print(f"OVER BUDGET by {total_ms - args.budget_ms:.1f}ms")
+    if own_ms > args.own_budget_ms:
+        print(f"OWN IMPORTS OVER BUDGET by {own_ms - args.own_budget_ms:.1f}ms")
+    return 1 if eager or total_ms > args.budget_ms or own_ms > args.own_budget_ms else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
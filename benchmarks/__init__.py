@@ -0,0 +1,13 @@
+"""Micro-benchmarks for single backend modules, run from the repository root.
+
+    python -m benchmarks.rate_limit
+    python -m benchmarks.startup_tasks --workers 8 --reset
+
+``backend_benchmark.py`` load-tests the API routes end to end; these
+measure one component each, in-process and without a database unless
+noted.
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
@@ -0,0 +1,38 @@
+"""Parameter-grid backtest throughput and parallel efficiency by worker count."""
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from backtest import grid, run_chunk, synthetic_prices
+
+
+def main(rows: int = 500_000, max_workers: Optional[int] = None):
+    combos = grid({"fast": [5, 10, 20, 30], "slow": [50, 100, 200], "stop_loss": [0.01, 0.02, 0.05], "risk_fraction": [0.01, 0.02]})
+    settings = {"initial_equity": 10_000.0, "commission_bps": 5.0, "slippage_bps": 2.0}
+    cores = os.cpu_count() or 1
+    counts = sorted({1, 2, 4, 8, cores} & set(range(1, (max_workers or max(cores, 2)) + 1)))
+    with tempfile.TemporaryDirectory() as directory:
+        path = str(Path(directory) / "bench.npy")
+        np.save(path, synthetic_prices(rows))
+        print(f"{len(combos)} combinations x {rows:,} bars on {cores} core(s)")
+        baseline = None
+        for workers in counts:
+            chunks = [combos[i::workers * 4] for i in range(workers * 4)]
+            with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+                list(pool.map(run_chunk, [path] * workers, [chunks[0][:1]] * workers, [settings] * workers))
+                started = time.perf_counter()
+                list(pool.map(run_chunk, [path] * len(chunks), chunks, [settings] * len(chunks)))
+                elapsed = time.perf_counter() - started
+            baseline = baseline or elapsed
+            speedup = baseline / elapsed
+            print(f"  {workers} worker(s): {elapsed:6.2f}s  speedup {speedup:4.2f}x  efficiency {speedup / workers:4.0%}")
+
+
+if __name__ == "__main__":
+    main()
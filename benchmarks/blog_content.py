@@ -0,0 +1,78 @@
+"""Cold import, unchanged re-import, and the per-read rendering that storing the HTML saves."""
+import asyncio
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from PIL import Image
+
+from blog_content import BlogImporter, markdown, render, split_front_matter
+
+
+def main(n_posts: int = 200, n_images: int = 40, workers: Optional[int] = None):
+    class Collection:
+        def __init__(self):
+            self.docs: Dict[str, dict] = {}
+
+        def find(self, query, projection=None):
+            docs = [self.docs[slug] for slug in query["slug"]["$in"] if slug in self.docs]
+
+            async def iterate():
+                for doc in docs:
+                    yield doc
+            return iterate()
+
+        async def bulk_write(self, operations, ordered=True):
+            for operation in operations:
+                self.docs[operation._filter["slug"]] = operation._doc["$set"]
+
+    rng = random.Random(1)
+    words = "risk reward trend support resistance breakout volume momentum stop entry exit position".split()
+    source = Path(tempfile.mkdtemp())
+    media = Path(tempfile.mkdtemp())
+    try:
+        (source / "img").mkdir()
+        for i in range(n_images):
+            Image.effect_noise((2400, 1600), 64).convert("RGB").save(source / "img" / f"{i}.jpg", quality=90)
+        for i in range(n_posts):
+            sections = "".join(
+                f"## Section {s}\n\n" + " ".join(rng.choices(words, k=300)) + "\n\n"
+                + (f"![figure](img/{rng.randrange(n_images)}.jpg)\n\n" if s % 2 == 0 else "")
+                for s in range(6)
+            )
+            (source / f"post-{i}.md").write_text(
+                f"---\ntitle: Post {i}\ntags: [Trading]\nimage: img/{i % n_images}.jpg\n---\n{sections}"
+            )
+
+        async def run():
+            importer = BlogImporter(Collection(), media, "/media", workers)
+            try:
+                started = time.perf_counter()
+                cold = await importer.import_directory(source)
+                cold_seconds = time.perf_counter() - started
+                started = time.perf_counter()
+                warm = await importer.import_directory(source)
+                warm_seconds = time.perf_counter() - started
+            finally:
+                await importer.close()
+            print(f"{n_posts} posts (~1,800 words), {n_images} 2400x1600 JPEGs, {importer.max_workers} worker(s)")
+            print(f"  cold import:      {cold_seconds:.1f}s ({len(cold['created'])} posts, {cold['images']} images "
+                  f"-> {len(list(media.iterdir()))} variants)")
+            print(f"  unchanged import: {warm_seconds:.2f}s ({warm['unchanged']} skipped)")
+
+        asyncio.run(run())
+        body = split_front_matter((source / "post-0.md").read_text())[1]
+        started = time.perf_counter()
+        for _ in range(200):
+            render(markdown().parse(body), {})
+        print(f"  rendering a post per read would cost {(time.perf_counter() - started) / 200 * 1000:.2f}ms; reads now serve stored HTML")
+    finally:
+        shutil.rmtree(source)
+        shutil.rmtree(media)
+
+
+if __name__ == "__main__":
+    main()
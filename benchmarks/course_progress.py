@@ -0,0 +1,64 @@
+"""50k learners heartbeating every ``interval`` seconds, replayed on a simulated clock."""
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from course_progress import ProgressCache, ProgressIngestor
+
+
+def main(learners: int = 50_000, interval: float = 15.0, duration: float = 120.0, flush_intervals=(5.0, 30.0)):
+    class CountingCollection:
+        def __init__(self):
+            self.operations = 0
+            self.round_trips = 0
+            self.largest = 0
+
+        async def bulk_write(self, operations, ordered=True):
+            self.operations += len(operations)
+            self.round_trips += 1
+            self.largest = max(self.largest, len(operations))
+
+    async def run(flush_interval: float):
+        rng = random.Random(1)
+        collection = CountingCollection()
+        ingestor = ProgressIngestor(collection, ProgressCache(), flush_interval)
+        offsets = [rng.uniform(0, interval) for _ in range(learners)]
+        start = datetime.now(timezone.utc)
+        events = 0
+        cpu = 0.0
+        tick = 0.0
+        while tick < duration:
+            # Each learner whose heartbeat falls inside this flush window posts one event;
+            # 1% of batches are retried by the client and must be deduplicated.
+            batch = []
+            for learner, offset in enumerate(offsets):
+                beat = offset + interval * int((tick - offset) // interval + 1) if tick > offset else offset
+                while beat < tick + flush_interval:
+                    batch.append((learner, beat))
+                    beat += interval
+            started = time.perf_counter()
+            for learner, beat in batch:
+                event = {"course_id": "free-course", "lesson_id": f"lesson-{int(beat // 600) % 5 + 1}",
+                         "event_id": f"{learner}-{beat:.3f}", "position_seconds": beat % 600, "completed": False,
+                         "at": start + timedelta(seconds=beat)}
+                ingestor.submit(f"user_{learner}", [event])
+                if rng.random() < 0.01:
+                    ingestor.submit(f"user_{learner}", [event])
+            await ingestor.flush()
+            cpu += time.perf_counter() - started
+            events += len(batch)
+            tick += flush_interval
+
+        print(f"{learners:,} learners, one heartbeat per {interval:.0f}s, {duration:.0f}s simulated, flush every {flush_interval:.0f}s")
+        print(f"  events: {events / duration:,.0f}/s ({ingestor.duplicates:,} retried duplicates dropped)")
+        print(f"  Mongo:  {collection.operations / duration:,.0f} upserts/s in {collection.round_trips / duration:.2f} "
+              f"bulk writes/s (largest {collection.largest:,} ops) instead of {events / duration:,.0f} writes/s")
+        print(f"  ingest CPU: {cpu / events * 1e6:.1f}us per event, {cpu / duration:.1%} of one core")
+
+    for flush_interval in flush_intervals:
+        asyncio.run(run(flush_interval))
+
+
+if __name__ == "__main__":
+    main()
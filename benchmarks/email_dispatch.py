@@ -0,0 +1,87 @@
+"""A newsletter to ``n_leads`` generated leads through a sink in another process, per server capability set."""
+import argparse
+import asyncio
+import multiprocessing
+import random
+import socket
+import time
+
+from bson import ObjectId
+
+from email_dispatch import EmailDispatcher, Mailer, SmtpConnection, SmtpPool, new_job, run_sink
+
+
+def main(n_leads: int = 1_000_000, pool_size: int = 8, page_size: int = 1000,
+         modes=(("PIPELINING", "CHUNKING"), ("PIPELINING",), ())):
+    class Result:
+        matched_count = 1
+
+    class LeadList:
+        def __init__(self):
+            domains = ["gmail.com", "yahoo.com", "outlook.com", "hotmail.com", "icloud.com", "example.org"]
+            rng = random.Random(1)
+            self.docs = [{"_id": ObjectId(), "email": f"lead{i}@{rng.choice(domains)}", "name": f"Lead {i}"}
+                         for i in range(n_leads)]
+            self.index = {doc["_id"]: i for i, doc in enumerate(self.docs)}
+
+        def find(self, query, projection=None, sort=None, limit=0):
+            start = self.index[query["_id"]["$gt"]] + 1 if "_id" in query else 0
+            docs = self.docs[start:start + limit]
+
+            class Cursor:
+                async def to_list(self, length):
+                    return docs
+            return Cursor()
+
+    class Deferred:
+        # The sink accepts every recipient, so nothing is ever deferred.
+        def find(self, query, sort=None, limit=0):
+            class Cursor:
+                async def to_list(self, length):
+                    return []
+            return Cursor()
+
+        async def find_one(self, query, projection=None, sort=None):
+            return None
+
+    class Jobs:
+        updates = 0
+
+        async def update_one(self, query, update):
+            self.updates += 1
+            return Result()
+
+    async def run(port: int, leads: LeadList, extensions):
+        pool = SmtpPool(lambda: SmtpConnection("127.0.0.1", port, local_hostname="bench"), size=pool_size)
+        mailer = Mailer(pool, "news@example.com", domain_concurrency=max(2, pool_size // 2))
+        jobs = Jobs()
+        dispatcher = EmailDispatcher(jobs, leads, None, Deferred(), mailer, page_size=page_size)
+        job = new_job("newsletter", "This week in the markets", "Hi {name},\n\n" + "Market recap line.\n" * 40)
+        job["lease_owner"] = dispatcher.owner
+        started = time.perf_counter()
+        await dispatcher.run_job(job)
+        elapsed = time.perf_counter() - started
+        await pool.close()
+        print(f"{n_leads:,} leads, {pool_size} connections, pages of {page_size}, server: {', '.join(extensions) or 'no extensions'}")
+        print(f"  {mailer.sent:,} sent in {elapsed:.1f}s: {mailer.sent / elapsed:,.0f} msgs/s "
+              f"({pool.opened} connections opened, {jobs.updates:,} checkpoints)")
+
+    leads = LeadList()
+    for extensions in modes:
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+        ready = multiprocessing.Event()
+        sink = multiprocessing.Process(target=run_sink, args=(port, ready, extensions), daemon=True)
+        sink.start()
+        try:
+            ready.wait(10)
+            asyncio.run(run(port, leads, extensions))
+        finally:
+            sink.terminate()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Newsletter throughput against a local SMTP sink")
+    parser.add_argument("--leads", type=int, default=1_000_000)
+    main(parser.parse_args().leads)
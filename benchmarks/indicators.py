@@ -0,0 +1,46 @@
+"""Vectorized indicators against the pure-Python reference, then memoized and streamed at two million rows."""
+import time
+
+import numpy as np
+
+from indicators import IndicatorCache, Series, _reference, compute, stream
+
+
+def main(n_reference: int = 200_000, n_large: int = 2_000_000):
+    rng = np.random.default_rng(7)
+    outputs = {"sma": "sma_20", "ema": "ema_20", "rsi": "rsi_14", "macd": "macd_12_26_9.signal",
+               "bollinger": "bollinger_20_2.upper", "atr": "atr_14"}
+
+    def make_series(n: int) -> Series:
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+        spread = np.abs(rng.normal(0, 0.005, n)) * close
+        return Series({"high": close + spread, "low": close - spread, "close": close})
+
+    series = make_series(n_reference)
+    high, low, close = (series.columns[name].tolist() for name in ("high", "low", "close"))
+    print(f"{n_reference:,} rows        numpy     pure Python   speedup   max rel. error")
+    for name, label in outputs.items():
+        started = time.perf_counter()
+        fast = compute(series, [(name, None)], IndicatorCache())[label]
+        vectorized = time.perf_counter() - started
+        started = time.perf_counter()
+        slow = np.array(_reference(name, high, low, close))
+        naive = time.perf_counter() - started
+        valid = ~np.isnan(slow)
+        error = np.max(np.abs(fast[valid] - slow[valid]) / np.maximum(np.abs(slow[valid]), 1e-9))
+        print(f"  {name:<10} {vectorized * 1000:9.1f}ms {naive * 1000:12.1f}ms {naive / vectorized:8.0f}x   {error:.1e}")
+
+    series = make_series(n_large)
+    cache = IndicatorCache()
+    requests = [(name, None) for name in outputs]
+    for label in ("cold", "memoized"):
+        started = time.perf_counter()
+        columns = compute(series, requests, cache)
+        print(f"{n_large:,} rows, all indicators, {label}: {(time.perf_counter() - started) * 1000:.1f}ms")
+    started = time.perf_counter()
+    size = sum(len(chunk) for chunk in stream(series.rows, columns))
+    print(f"streamed {size / 1e6:.0f}MB of JSON in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Publish-to-delivery latency through the hub with in-process clients (no network or WebSocket framing)."""
+import asyncio
+import gc
+import random
+import time
+from typing import Dict, List
+
+import orjson
+
+from market_data import MarketHub, now_ms
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def main(connections: int = 10_000, n_symbols: int = 100, per_client: int = 5, rounds: int = 50,
+               ticks_per_round: int = 50, slow_fraction: float = 0.01):
+    gc_pauses = [0.0, 0.0]
+
+    def track_gc(phase, info):
+        if phase == "start":
+            gc_pauses[1] = time.perf_counter()
+        else:
+            gc_pauses[0] += time.perf_counter() - gc_pauses[1]
+
+    rng = random.Random(1)
+    symbols = [f"SYM{i}" for i in range(n_symbols)]
+    hub = MarketHub(max_connections=connections)
+    latencies: Dict[bool, List[float]] = {False: [], True: []}
+    published_at = 0.0
+    idle: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def client(slow: bool):
+        subscribe = orjson.dumps({"action": "subscribe", "symbols": rng.sample(symbols, per_client)}).decode()
+        messages = [subscribe]
+
+        async def send(frame: str):
+            if slow:
+                await asyncio.sleep(0.2)
+            latencies[slow].append(time.perf_counter() - published_at)
+
+        async def receive() -> str:
+            if messages:
+                return messages.pop()
+            return await idle
+
+        send.slow = slow
+        return receive, send
+
+    tasks = [asyncio.create_task(hub.serve(*client(rng.random() < slow_fraction))) for _ in range(connections)]
+    await asyncio.sleep(1)
+    fast = [subscriber for subscriber in hub._clients if not subscriber.send.slow]
+    latencies[False].clear()
+    latencies[True].clear()
+    gc.callbacks.append(track_gc)
+    started = time.perf_counter()
+
+    publish = []
+    for _ in range(rounds):
+        batch = [{"s": rng.choice(symbols), "p": 100.0, "v": 1, "t": now_ms()} for _ in range(ticks_per_round)]
+        published_at = time.perf_counter()
+        hub.publish(batch)
+        publish.append(time.perf_counter() - published_at)
+        # Slow clients are deliberately not waited for: they must not hold up anyone else.
+        while any(subscriber.pending for subscriber in fast):
+            await asyncio.sleep(0.005)
+        await asyncio.sleep(0.05)
+
+    elapsed = time.perf_counter() - started
+    gc.callbacks.remove(track_gc)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await hub.stop()
+    print(f"{connections:,} connections x {per_client} symbols of {n_symbols}, {ticks_per_round} ticks per round, "
+          f"{slow_fraction:.0%} slow clients")
+    print(f"  publish (broadcaster) p50 {_percentile(publish, 0.5) * 1000:.1f}ms  max {max(publish) * 1000:.1f}ms")
+    for slow, label in ((False, "fast"), (True, "slow")):
+        if latencies[slow]:
+            print(f"  {label} clients: delivery p50 {_percentile(latencies[slow], 0.5) * 1000:.1f}ms  "
+                  f"p99 {_percentile(latencies[slow], 0.99) * 1000:.1f}ms over {len(latencies[slow]):,} frames")
+    print(f"  garbage collection: {gc_pauses[0]:.2f}s of {elapsed:.2f}s")
+    print(f"  {hub.stats()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
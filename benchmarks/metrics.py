@@ -0,0 +1,36 @@
+"""Per-request overhead of MetricsMiddleware and the slow-request profiler over a bare ASGI app."""
+import asyncio
+import time
+
+from metrics import MetricsMiddleware, SlowRequestProfiler
+
+
+def main(n_requests: int = 20000):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    async def noop_send(message):
+        pass
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def run(target) -> float:
+        scope = {"type": "http", "method": "GET", "path": "/api/blog/posts"}
+        started = time.perf_counter()
+        for _ in range(n_requests):
+            await target(dict(scope), receive, noop_send)
+        return (time.perf_counter() - started) / n_requests
+
+    async def compare():
+        bare = await run(app)
+        instrumented = await run(MetricsMiddleware(app, SlowRequestProfiler(enabled=True)))
+        print(f"bare: {bare * 1e6:.1f}us/request, instrumented: {instrumented * 1e6:.1f}us/request")
+        print(f"added per request: {(instrumented - bare) * 1e6:.1f}us")
+
+    asyncio.run(compare())
+
+
+if __name__ == "__main__":
+    main()
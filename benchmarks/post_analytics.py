@@ -0,0 +1,49 @@
+"""Mongo writes per view with per-view ``$inc`` versus coalesced flushes, at a steady view rate."""
+import asyncio
+import random
+import time
+
+from post_analytics import ViewRecorder
+
+
+def main(n_views: int = 1_000_000, n_posts: int = 200, n_visitors: int = 50_000, views_per_second: int = 2_000,
+         flush_interval: float = 5.0):
+    class CountingCollection:
+        def __init__(self):
+            self.operations = 0
+            self.round_trips = 0
+
+        async def bulk_write(self, operations, ordered=True):
+            self.operations += len(operations)
+            self.round_trips += 1
+
+    async def run():
+        rng = random.Random(1)
+        # Zipf-like popularity: a few posts take most of the traffic.
+        weights = [1 / (rank + 1) for rank in range(n_posts)]
+        slugs = rng.choices([f"post-{i}" for i in range(n_posts)], weights, k=n_views)
+        visitors = [f"visitor-{rng.randrange(n_visitors)}" for _ in range(n_views)]
+        collection = CountingCollection()
+        recorder = ViewRecorder(collection, flush_interval)
+        per_flush = int(views_per_second * flush_interval)
+        started = time.perf_counter()
+        for start in range(0, n_views, per_flush):
+            for slug, visitor in zip(slugs[start:start + per_flush], visitors[start:start + per_flush]):
+                recorder.record(slug, visitor)
+            await recorder.flush()
+        elapsed = time.perf_counter() - started
+
+        exact = len(set(zip(slugs, visitors)))
+        estimated = sum(sketch.count() for sketch in recorder._sketches.values())
+        print(f"{n_views:,} views over {n_posts} posts at {views_per_second}/s, flushing every {flush_interval}s")
+        print(f"  per-view $inc:  {n_views:,} writes, {n_views:,} round trips")
+        print(f"  coalesced:      {collection.operations:,} writes, {collection.round_trips:,} round trips "
+              f"({n_views / collection.operations:.0f}x fewer writes)")
+        print(f"  record + flush: {elapsed / n_views * 1e6:.2f}us per view")
+        print(f"  unique (post, visitor) pairs: exact {exact:,}, HLL {estimated:,} ({estimated / exact - 1:+.1%})")
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""Per-hit cost of the in-memory limiter under thread contention, one shard versus sixteen."""
+import random
+import threading
+import time
+
+from rate_limit import RateLimiter
+
+
+def main(n_keys: int = 50_000, n_hits: int = 400_000, n_threads: int = 8):
+    for shards in (1, 16):
+        limiter = RateLimiter("bench", 10, 60, shards=shards, max_keys=n_keys // 2)
+        keys = [f"10.0.{i // 256}.{i % 256}" for i in range(n_keys)]
+        per_thread = n_hits // n_threads
+
+        def worker(seed: int):
+            rng = random.Random(seed)
+            for _ in range(per_thread):
+                limiter.hit(keys[rng.randrange(n_keys)])
+
+        threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(n_threads)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        print(f"{shards:>2} shard(s), {n_threads} threads: {elapsed / n_hits * 1e6:.2f}us/hit, {limiter.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""CPU and bytes per blog response: stdlib encoding, orjson, compression per request, and cached variants."""
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, TypeAdapter
+
+from response_cache import ENCODERS, CachedResponse
+from serialization import dumps
+
+
+def main(n_requests: int = 2000):
+    class Post(BaseModel):
+        post_id: str
+        title: str
+        slug: str
+        excerpt: str
+        content: str
+        author: str
+        image_url: str
+        published_at: datetime
+        tags: List[str]
+
+    class Summary(BaseModel):
+        post_id: str
+        title: str
+        slug: str
+        excerpt: str
+        author: str
+        image_url: str
+        published_at: datetime
+        tags: List[str]
+
+    rng = random.Random(7)
+    words = "trend support resistance breakout volume momentum candle stop loss position size risk reward".split()
+    now = datetime.now(timezone.utc)
+    docs = [
+        {
+            "post_id": f"post_{i}",
+            "title": " ".join(rng.choices(words, k=8)).title(),
+            "slug": f"post-{i}",
+            "excerpt": " ".join(rng.choices(words, k=25)),
+            "content": " ".join(rng.choices(words, k=1500)),
+            "author": "Trading Academy Team",
+            "image_url": "https://images.unsplash.com/photo-1611974789855-9c2a0a7236a3?w=800",
+            "published_at": now - timedelta(days=i),
+            "tags": rng.sample(words, 3),
+        }
+        for i in range(20)
+    ]
+    routes = {
+        "get_blog_posts": (lambda: [Summary(**doc) for doc in docs], List[Summary]),
+        "get_blog_post": (lambda: Post(**docs[0]), Post),
+    }
+
+    def measure(fn) -> float:
+        started = time.process_time()
+        for _ in range(n_requests):
+            fn()
+        return (time.process_time() - started) / n_requests * 1e6
+
+    for route, (build, model) in routes.items():
+        adapter = TypeAdapter(model)
+
+        def stdlib_path():
+            # What FastAPI does by default: response_model re-validation, jsonable_encoder, json.dumps.
+            content = adapter.validate_python(adapter.dump_python(build()))
+            return json.dumps(jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+        body = stdlib_path()
+        cached = CachedResponse(dumps(build()), None, {}, 60)
+        rows = [
+            ("jsonable_encoder + json", stdlib_path, len(body)),
+            ("orjson, no re-validation", lambda: dumps(build()), len(cached.body)),
+            ("orjson + gzip per request", lambda: ENCODERS["gzip"](dumps(build())), len(cached.encoded_body("gzip"))),
+        ]
+        for encoding, encode in ENCODERS.items():
+            rows.append((f"{encoding} on a cache miss", lambda e=encode: e(cached.body), len(encode(cached.body))))
+        cached.precompress()
+        for encoding in ENCODERS:
+            rows.append((f"cached, {encoding} precompressed", lambda e=encoding: cached.to_response(None, e),
+                         len(cached.encoded_body(encoding))))
+        print(route)
+        for label, fn, size in rows:
+            print(f"  {label:<28} {measure(fn):8.1f}us cpu/request {size:8d} bytes")
+
+
+if __name__ == "__main__":
+    main()
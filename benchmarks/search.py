@@ -0,0 +1,41 @@
+"""Index build time and query latency, whole-word and prefix, over a Zipf-distributed vocabulary."""
+import itertools
+import random
+import time
+
+from search import SearchIndex, post_fields
+
+
+def main(n_posts: int = 50000, n_queries: int = 2000):
+    rng = random.Random(7)
+    vocabulary = [f"{word}{i}" for i in range(4000) for word in ("trend", "risk", "chart", "stop", "volume")]
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    index = SearchIndex()
+    started = time.perf_counter()
+    for i in range(n_posts):
+        post = {
+            "title": " ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=8)),
+            "excerpt": " ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=25)),
+            "content": " ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=150)),
+            "tags": rng.choices(vocabulary, cum_weights=cum_weights, k=3),
+        }
+        index.upsert(f"post_{i}", post_fields(post), {"post_id": f"post_{i}"})
+    index.warm()
+    print(f"indexed {n_posts} posts in {time.perf_counter() - started:.1f}s")
+
+    for prefix in (False, True):
+        timings = []
+        for _ in range(n_queries):
+            words = rng.choices(vocabulary, cum_weights=cum_weights, k=2)
+            query = " ".join(words)[:-2] if prefix else " ".join(words)
+            started = time.perf_counter()
+            index.search(query, 10, prefix=prefix)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        p50 = timings[len(timings) // 2]
+        p99 = timings[int(len(timings) * 0.99)]
+        print(f"prefix={prefix}: p50={p50:.2f}ms p99={p99:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Boot ``n_workers`` server processes at once against MONGO_URL/DB_NAME and time startup."""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+
+def _cold_start_worker(index: int, results):
+    import server
+
+    async def boot():
+        started = time.perf_counter()
+        for handler in server.app.router.on_startup:
+            await handler()
+        serving = time.perf_counter() - started
+        await server.ready.wait()
+        ready = time.perf_counter() - started
+        for handler in server.app.router.on_shutdown:
+            await handler()
+        return serving, ready
+
+    serving, ready = asyncio.run(boot())
+    results.put((index, server.startup_report.get("role"), serving, ready))
+
+
+def main(n_workers: int = 8, reset: bool = False):
+    if reset:
+        async def drop():
+            client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+            await client.drop_database(os.environ['DB_NAME'])
+            client.close()
+
+        asyncio.run(drop())
+
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=_cold_start_worker, args=(i, results)) for i in range(n_workers)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    timings = sorted(results.get() for _ in workers)
+    for worker in workers:
+        worker.join()
+    total = time.perf_counter() - started
+    for index, role, serving, ready in timings:
+        print(f"worker {index}: {role:<10} serving after {serving * 1000:8.1f}ms, ready after {ready * 1000:8.1f}ms")
+    print(f"all {n_workers} workers ready in {total * 1000:.1f}ms (including interpreter start and imports)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure multi-worker cold start")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--reset", action="store_true", help="drop DB_NAME first to time a first deploy")
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).resolve().parent.parent / "backend" / ".env")
+    logging.basicConfig(level=logging.INFO)
+    main(args.workers, args.reset)
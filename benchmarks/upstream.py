@@ -0,0 +1,63 @@
+"""Session-exchange latency with a new HTTP client per call versus the shared pooled client."""
+import asyncio
+import time
+
+import httpx
+
+from upstream import SessionExchangeClient
+
+
+async def _stub_server(port: int):
+    body = b'{"email":"stub@example.com","name":"Stub","picture":null,"session_token":"stub"}'
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                request = await reader.readuntil(b"\r\n\r\n")
+                if not request:
+                    break
+                await asyncio.sleep(0.002)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(body)}\r\n\r\n".encode()
+                    + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", port)
+
+
+def main(n_requests: int = 500, port: int = 18765):
+    url = f"http://127.0.0.1:{port}/session-data"
+
+    async def per_request_client(i: int):
+        async with httpx.AsyncClient() as client:
+            await client.get(url, headers={"X-Session-ID": f"s{i}"})
+
+    async def run():
+        server = await _stub_server(port)
+        shared = SessionExchangeClient(url, cache_ttl=0)
+        for label, call in (("new client per call", per_request_client), ("shared pooled client", None)):
+            timings = []
+            for i in range(n_requests):
+                started = time.perf_counter()
+                if call is None:
+                    await shared.exchange(f"s{i}")
+                else:
+                    await call(i)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            print(f"{label}: p50={timings[len(timings) // 2]:.2f}ms p99={timings[int(len(timings) * 0.99)]:.2f}ms")
+        await shared.aclose()
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from backtest import OHLCV, PriceStore, run_chunk, synthetic_prices
+
+COMBO = {"fast": 5, "slow": 20, "stop_loss": 0.02, "take_profit": 0.0, "risk_fraction": 0.01}
+
+
+def write_csv(path, prices):
+    np.savetxt(path, prices, delimiter=",", header=",".join(OHLCV), comments="")
+
+
+def test_concurrent_rebuilds_of_one_symbol_do_not_collide(tmp_path):
+    pytest.importorskip("pandas")
+    write_csv(tmp_path / "SPY.csv", synthetic_prices(2000))
+    store = PriceStore(tmp_path)
+    barrier = threading.Barrier(8)
+    paths, errors = [], []
+
+    def rebuild():
+        barrier.wait()
+        try:
+            paths.append(store.array_path("SPY"))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=rebuild) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert set(paths) == {store.cache_dir / "SPY.npy"}
+    assert os.listdir(store.cache_dir) == ["SPY.npy"]
+    assert np.load(paths[0]).shape == (2000, 5)
+
+
+def test_pool_workers_remap_an_array_rebuilt_from_newer_data(tmp_path):
+    pytest.importorskip("pandas")
+    store = PriceStore(tmp_path)
+    write_csv(tmp_path / "SPY.csv", synthetic_prices(500, seed=1))
+    path = str(store.array_path("SPY"))
+    before = run_chunk(path, [COMBO], {})[0]
+    write_csv(tmp_path / "SPY.csv", synthetic_prices(500, seed=2))
+    source = tmp_path / "SPY.csv"
+    later = os.stat(path).st_mtime + 10
+    os.utime(source, (later, later))
+    assert str(store.array_path("SPY")) == path
+    after = run_chunk(path, [COMBO], {})[0]
+    assert after != before
+    assert after == run_chunk(path, [COMBO], {})[0]
@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("markdown_it")
+pytest.importorskip("yaml")
+
+from blog_content import BlogImporter, ContentError, build_post, make_variants, scan_post
+
+
+def write_post(directory, name, text):
+    path = directory / name
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_raw_html_is_escaped_and_unsafe_links_are_dropped(tmp_path):
+    path = write_post(tmp_path, "unsafe.md", (
+        "---\ntitle: Unsafe\n---\n"
+        "<script>alert(1)</script>\n\n"
+        "[click](javascript:alert(1)) [docs](https://example.com) [about](/about)\n\n"
+        '![chart](https://cdn.example.com/chart.png "Chart")\n'
+    ))
+    html = build_post(scan_post(path, str(tmp_path)), {}, "/media")["content_html"]
+    assert "<script>" not in html
+    assert "&lt;script&gt;alert(1)&lt;/script&gt;" in html
+    assert 'href="javascript:' not in html
+    assert '<a href="https://example.com" rel="nofollow noopener">docs</a>' in html
+    assert '<a href="/about">about</a>' in html
+    assert 'alt="chart"' in html and 'loading="lazy"' in html
+
+
+def test_toc_anchors_are_unique_and_only_cover_h2_and_h3(tmp_path):
+    path = write_post(tmp_path, "toc.md", (
+        "---\ntitle: Toc\nexcerpt: Set by hand\n---\n"
+        "# Title\n\n## Risk *first*\n\n### Position `size`\n\n## Risk first\n\n#### Too deep\n\nBody text here.\n"
+    ))
+    post = build_post(scan_post(path, str(tmp_path)), {}, "/media")
+    assert post["toc"] == [
+        {"level": 2, "id": "risk-first", "title": "Risk first"},
+        {"level": 3, "id": "position-size", "title": "Position size"},
+        {"level": 2, "id": "risk-first-2", "title": "Risk first"},
+    ]
+    assert '<h2 id="risk-first-2">' in post["content_html"]
+    assert (post["slug"], post["excerpt"], post["reading_time_minutes"]) == ("toc", "Set by hand", 1)
+
+
+def test_scan_rejects_missing_title_and_images_outside_the_root(tmp_path):
+    with pytest.raises(ContentError):
+        scan_post(write_post(tmp_path, "untitled.md", "---\nslug: untitled\n---\nBody\n"), str(tmp_path))
+    (tmp_path / "posts").mkdir()
+    (tmp_path / "secret.png").write_bytes(b"not an image")
+    outside = write_post(tmp_path / "posts", "escape.md", "---\ntitle: Escape\n---\n![x](../secret.png)\n")
+    with pytest.raises(ContentError, match="Image not found"):
+        scan_post(outside, str(tmp_path / "posts"))
+
+
+def test_variants_are_never_upscaled_and_reused_by_content_hash(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    Image.new("RGB", (1200, 800), "navy").save(tmp_path / "chart.jpg")
+    Image.new("RGBA", (300, 300), (0, 0, 0, 0)).save(tmp_path / "logo.png")
+    media = tmp_path / "media"
+
+    chart = make_variants(str(tmp_path / "chart.jpg"), str(media))
+    assert [width for _, width in chart["webp"]] == [480, 960, 1200]
+    assert (chart["width"], chart["height"]) == (1200, 800)
+    assert chart["fallback"].endswith("-1200.jpg")
+    with Image.open(media / chart["webp"][0][0]) as smallest:
+        assert smallest.size == (480, 320)
+
+    logo = make_variants(str(tmp_path / "logo.png"), str(media))
+    assert [width for _, width in logo["webp"]] == [300]
+    assert logo["fallback"].endswith(".png")
+
+    written = {path.name: path.stat().st_mtime_ns for path in media.iterdir()}
+    assert make_variants(str(tmp_path / "chart.jpg"), str(media)) == chart
+    assert {path.name: path.stat().st_mtime_ns for path in media.iterdir()} == written
+
+
+def test_import_renders_images_then_skips_unchanged_posts(tmp_path):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    Image = pytest.importorskip("PIL.Image")
+    source = tmp_path / "posts"
+    (source / "img").mkdir(parents=True)
+    Image.new("RGB", (640, 480), "green").save(source / "img" / "chart.jpg")
+    write_post(source, "risk.md", "---\ntitle: Risk\nimage: img/chart.jpg\n---\n## Stops\n\n![Stop chart](img/chart.jpg)\n")
+    write_post(source, "plain.md", "---\ntitle: Plain\n---\nNothing to see.\n")
+    write_post(source, "broken.md", "---\ntitle: Broken\n---\n![gone](img/missing.png)\n")
+
+    async def run():
+        collection = mongomock_motor.AsyncMongoMockClient(tz_aware=True)["test"].blog_posts
+        importer = BlogImporter(collection, tmp_path / "media", "/media/", max_workers=1)
+        try:
+            first = await importer.import_directory(source)
+            unchanged = await importer.import_directory(source)
+            write_post(source, "plain.md", "---\ntitle: Plain\n---\nSomething to see.\n")
+            edited = await importer.import_directory(source)
+            forced = await importer.import_directory(source, force=True)
+        finally:
+            await importer.close()
+        return first, unchanged, edited, forced, await collection.find_one({"slug": "risk"}, {"_id": 0})
+
+    first, unchanged, edited, forced, risk = asyncio.run(run())
+    assert sorted(first["created"]) == ["plain", "risk"]
+    assert (first["images"], [error["file"] for error in first["errors"]]) == (1, ["broken.md"])
+    assert (unchanged["created"], unchanged["updated"], unchanged["unchanged"]) == ([], [], 2)
+    assert (edited["updated"], edited["unchanged"]) == (["plain"], 1)
+    assert sorted(forced["updated"]) == ["plain", "risk"]
+
+    assert risk["image"]["src"] == risk["image_url"]
+    assert risk["image_url"].startswith("/media/") and risk["image_url"].endswith("-640.jpg")
+    assert (risk["image"]["width"], risk["image"]["height"]) == (640, 480)
+    assert '<picture><source type="image/webp"' in risk["content_html"]
+    assert 'alt="Stop chart"' in risk["content_html"] and 'width="640" height="480"' in risk["content_html"]
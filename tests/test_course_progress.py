@@ -0,0 +1,115 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from pymongo import UpdateOne
+
+from course_progress import ProgressCache, ProgressIngestor, merge_progress, progress_update, resume_point
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def event(event_id, lesson_id, position, minutes, completed=False, course_id="course"):
+    return {"event_id": event_id, "course_id": course_id, "lesson_id": lesson_id, "position_seconds": position,
+            "completed": completed, "at": T0 + timedelta(minutes=minutes)}
+
+
+def partial(lesson_id, position, minutes, completed=False):
+    at = T0 + timedelta(minutes=minutes)
+    lesson = {"position_seconds": position, "updated_at": at}
+    if completed:
+        lesson.update(completed=True, completed_at=at)
+    return {"lessons": {lesson_id: lesson}, "updated_at": at, "last_lesson_id": lesson_id,
+            "last_position_seconds": position}
+
+
+class RecordingCollection:
+    def __init__(self):
+        self.operations = []
+
+    async def bulk_write(self, operations, ordered=True):
+        self.operations.extend(operations)
+
+
+def test_merge_keeps_furthest_position_first_completion_and_latest_resume_point():
+    progress = {"course_id": "course"}
+    merge_progress(progress, partial("l1", 300, minutes=10, completed=True))
+    merge_progress(progress, partial("l1", 120, minutes=20))
+    merge_progress(progress, partial("l2", 60, minutes=5))
+
+    assert progress["lessons"]["l1"]["position_seconds"] == 300
+    assert progress["lessons"]["l1"]["completed_at"] == T0 + timedelta(minutes=10)
+    assert progress["lessons"]["l1"]["updated_at"] == T0 + timedelta(minutes=20)
+    # The older l2 partial arrived last but does not move the resume point back.
+    assert resume_point({"course": progress}) == {
+        "course_id": "course", "lesson_id": "l1", "position_seconds": 120, "updated_at": T0 + timedelta(minutes=20),
+    }
+
+
+def test_submit_coalesces_per_course_and_drops_retried_events():
+    async def run():
+        collection = RecordingCollection()
+        ingestor = ProgressIngestor(collection, ProgressCache())
+        first = ingestor.submit("user", [event("e1", "l1", 30, 1), event("e2", "l1", 60, 2)])
+        retried = ingestor.submit("user", [event("e2", "l1", 60, 2), event("e3", "l2", 10, 3, course_id="other")])
+        assert ingestor.pending == 2
+        await ingestor.flush()
+        return first, retried, collection.operations, ingestor
+
+    first, retried, operations, ingestor = asyncio.run(run())
+    assert first == {"accepted": 2, "duplicates": 0}
+    assert retried == {"accepted": 1, "duplicates": 1}
+    assert len(operations) == 2
+    assert ingestor.pending == 0 and ingestor.writes == 2
+
+
+def test_failed_flush_is_merged_back_into_pending():
+    class FailingCollection:
+        async def bulk_write(self, operations, ordered=True):
+            raise ConnectionError("mongo down")
+
+    async def run():
+        ingestor = ProgressIngestor(FailingCollection(), ProgressCache())
+        ingestor.submit("user", [event("e1", "l1", 30, 1)])
+        await ingestor.flush()
+        ingestor.submit("user", [event("e2", "l1", 90, 2)])
+        return ingestor
+
+    ingestor = asyncio.run(run())
+    assert ingestor.errors == 1
+    assert ingestor.pending == 1
+    pending = ingestor._pending["user"]["course"]
+    assert pending["lessons"]["l1"]["position_seconds"] == 90
+    assert pending["last_position_seconds"] == 90
+
+
+def test_cached_progress_sees_own_events_before_flush():
+    async def run():
+        cache = ProgressCache()
+        ingestor = ProgressIngestor(RecordingCollection(), cache)
+        cache.set("user", {})
+        ingestor.submit("user", [event("e1", "l3", 42, 7)])
+        return await ingestor.load("user")
+
+    courses = asyncio.run(run())
+    assert courses["course"]["last_lesson_id"] == "l3"
+    assert courses["course"]["lessons"]["l3"]["position_seconds"] == 42
+
+
+def test_out_of_order_flushes_from_two_workers_commute():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+
+    async def run():
+        collection = mongomock_motor.AsyncMongoMockClient(tz_aware=True)["test"].course_progress
+        key = {"user_id": "user", "course_id": "course"}
+        # The worker holding the newer events flushes first.
+        for update in (partial("l2", 50, minutes=5, completed=True), partial("l1", 30, minutes=1)):
+            await collection.bulk_write([UpdateOne(key, progress_update(update), upsert=True)])
+        return await collection.find_one(key, {"_id": 0})
+
+    doc = asyncio.run(run())
+    assert doc["last_lesson_id"] == "l2"
+    assert doc["last_position_seconds"] == 50
+    assert doc["updated_at"] == T0 + timedelta(minutes=5)
+    assert doc["lessons"]["l1"]["position_seconds"] == 30
+    assert doc["lessons"]["l2"]["completed"] is True
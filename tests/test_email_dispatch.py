@@ -0,0 +1,118 @@
+import asyncio
+import email
+from datetime import timedelta
+from email.policy import default
+
+import pytest
+
+from email_dispatch import (
+    EmailDispatcher,
+    Mailer,
+    Message,
+    MessageTemplate,
+    SmtpConnection,
+    SmtpPool,
+    SmtpSink,
+    new_job,
+    utcnow,
+)
+
+RECIPIENTS = ["a@x.com", "b@x.com", "fail@x.com", "c@y.com", "defer@y.com", "d@z.com", "e@x.com"]
+
+
+@pytest.mark.parametrize("extensions", [("PIPELINING", "CHUNKING"), ("PIPELINING",), ()])
+def test_mailer_delivers_in_every_server_mode(extensions):
+    async def run():
+        sink = SmtpSink(extensions=extensions, keep=True)
+        await sink.start()
+        pool = SmtpPool(lambda: SmtpConnection("127.0.0.1", sink.port), size=2, max_messages=3)
+        mailer = Mailer(pool, "news@example.com", chunk_size=2, max_attempts=2, retry_delay=0.01)
+        template = MessageTemplate("news@example.com", "Hello", "Hi {name},\n.leading dot\n.\nend", "example.com")
+        messages = [Message(r, template.render(r, f"job.{i}", "Bob")) for i, r in enumerate(RECIPIENTS)]
+        try:
+            failed = await mailer.deliver(messages)
+        finally:
+            await pool.close()
+            await sink.stop()
+        return sink, mailer, failed
+
+    sink, mailer, failed = asyncio.run(run())
+    assert sorted((m.recipient, m.error.code, m.attempts) for m in failed) == [
+        ("defer@y.com", 451, 2), ("fail@x.com", 550, 1)
+    ]
+    assert sorted(recipient for recipient, _ in sink.messages) == sorted(set(RECIPIENTS) - {"fail@x.com", "defer@y.com"})
+    for recipient, body in sink.messages:
+        message = email.message_from_bytes(body, policy=default)
+        assert message["To"] == recipient
+        assert ".leading dot\n.\nend" in message.get_content().replace("\r\n", "\n")
+    assert (mailer.sent, mailer.refused, mailer.deferred) == (5, 1, 1)
+
+
+def test_transient_refusals_are_deferred_then_retried():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+
+    async def run():
+        db = mongomock_motor.AsyncMongoMockClient(tz_aware=True)["test"]
+        await db.email_leads.insert_many([{"email": r, "name": "Lead"} for r in RECIPIENTS])
+        sink = SmtpSink()
+        await sink.start()
+        pool = SmtpPool(lambda: SmtpConnection("127.0.0.1", sink.port), size=2)
+        mailer = Mailer(pool, "news@example.com", max_attempts=2, retry_delay=0.01)
+        dispatcher = EmailDispatcher(db.email_jobs, db.email_leads, db.email_failures, db.email_deferred, mailer,
+                                     page_size=3, defer_delay=60)
+        job = new_job("newsletter", "Hello", "Hi {name}")
+        await db.email_jobs.insert_one(job)
+
+        async def run_claimed():
+            claimed = await dispatcher.claim()
+            await dispatcher.run_job(claimed)
+            return await db.email_jobs.find_one({"job_id": job["job_id"]})
+
+        try:
+            first = await run_claimed()
+            deferred = await db.email_deferred.find_one({"job_id": job["job_id"]})
+            # The retry falls due, and the greylisting server accepts it.
+            due = utcnow() - timedelta(seconds=1)
+            await db.email_deferred.update_one({"_id": deferred["_id"]}, {"$set": {
+                "email": "greylisted@y.com", "next_attempt_at": due}})
+            await db.email_jobs.update_one({"job_id": job["job_id"]}, {"$set": {"next_run_at": due}})
+            second = await run_claimed()
+        finally:
+            await pool.close()
+            await sink.stop()
+        return first, deferred, second, await db.email_deferred.count_documents({}), sink.received
+
+    first, deferred, second, remaining, received = asyncio.run(run())
+    assert (first["status"], first["leads_done"]) == ("queued", True)
+    assert (first["sent"], first["failed"], first["deferred"]) == (5, 1, 1)
+    assert first["next_run_at"] == deferred["next_attempt_at"]
+    assert (deferred["email"], deferred["code"], deferred["deferrals"]) == ("defer@y.com", 451, 1)
+    assert (second["status"], second["sent"], second["failed"], second["deferred"]) == ("done", 6, 1, 0)
+    assert (remaining, received) == (0, 6)
+
+
+def test_deferral_gives_up_after_max_defer():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+
+    async def run():
+        db = mongomock_motor.AsyncMongoMockClient(tz_aware=True)["test"]
+        await db.email_leads.insert_one({"email": "defer@y.com"})
+        sink = SmtpSink()
+        await sink.start()
+        pool = SmtpPool(lambda: SmtpConnection("127.0.0.1", sink.port), size=1)
+        mailer = Mailer(pool, "news@example.com", max_attempts=1)
+        dispatcher = EmailDispatcher(db.email_jobs, db.email_leads, db.email_failures, db.email_deferred, mailer,
+                                     defer_delay=0, max_defer=0)
+        job = new_job("newsletter", "Hello", "Hi {name}")
+        await db.email_jobs.insert_one(job)
+        try:
+            await dispatcher.run_job(await dispatcher.claim())
+        finally:
+            await pool.close()
+            await sink.stop()
+        return (await db.email_jobs.find_one({"job_id": job["job_id"]}),
+                await db.email_failures.find_one({}), await db.email_deferred.count_documents({}))
+
+    job, failure, remaining = asyncio.run(run())
+    assert (job["status"], job["sent"], job["failed"], job["deferred"]) == ("done", 0, 1, 0)
+    assert (failure["email"], failure["code"], remaining) == ("defer@y.com", 451, 0)
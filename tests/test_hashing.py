@@ -0,0 +1,34 @@
+import asyncio
+import threading
+
+import pytest
+
+from hashing import HashPoolSaturated, PasswordHasher
+
+
+def test_cancelled_caller_keeps_its_job_counted_until_it_finishes():
+    release = threading.Event()
+
+    async def run():
+        hasher = PasswordHasher(max_workers=1, max_queue=0)
+        try:
+            task = asyncio.create_task(hasher._run(release.wait))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            # The worker is still busy, so there is no room for another job.
+            during = hasher.in_flight
+            with pytest.raises(HashPoolSaturated):
+                await asyncio.wait_for(hasher._run(sum, [1, 2]), 1)
+            release.set()
+            for _ in range(100):
+                if not hasher.in_flight:
+                    break
+                await asyncio.sleep(0.01)
+            return during, hasher.in_flight, await hasher._run(sum, [1, 2])
+        finally:
+            release.set()
+            hasher.shutdown()
+
+    assert asyncio.run(run()) == (1, 0, 3)
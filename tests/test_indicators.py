@@ -0,0 +1,84 @@
+import math
+
+import numpy as np
+import pytest
+
+from indicators import (INDICATORS, IndicatorCache, IndicatorError, Series, _reference, _rolling_moments, compute,
+                        render, stream)
+
+LABELS = {"sma": "sma_20", "ema": "ema_20", "rsi": "rsi_14", "macd": "macd_12_26_9.signal",
+          "bollinger": "bollinger_20_2.upper", "atr": "atr_14"}
+
+
+@pytest.fixture(scope="module")
+def series():
+    rng = np.random.default_rng(3)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, 20_000)))
+    spread = np.abs(rng.normal(0, 0.005, len(close))) * close
+    return Series({"high": close + spread, "low": close - spread, "close": close})
+
+
+@pytest.mark.parametrize("name", sorted(LABELS))
+def test_matches_naive_reference(series, name):
+    fast = compute(series, [(name, None)], IndicatorCache())[LABELS[name]]
+    slow = np.array(_reference(name, *(series.columns[column].tolist() for column in ("high", "low", "close"))))
+    assert np.array_equal(np.isnan(fast), np.isnan(slow))
+    valid = ~np.isnan(slow)
+    assert np.allclose(fast[valid], slow[valid], rtol=1e-9, atol=1e-9)
+
+
+def test_rolling_moments_across_block_boundaries():
+    values = np.random.default_rng(5).normal(1e6, 1, 1000)
+    mean, variance = _rolling_moments(values, 7, block=64)
+    windows = np.lib.stride_tricks.sliding_window_view(values, 7)
+    assert np.isnan(mean[:6]).all()
+    assert np.allclose(mean[6:], windows.mean(axis=1))
+    assert np.allclose(variance[6:], windows.var(axis=1), atol=1e-6)
+
+
+def test_results_are_memoized_per_series_and_params(series):
+    cache = IndicatorCache()
+    compute(series, [("rsi", None), ("rsi", {"period": 14})], cache)
+    compute(series, [("rsi", {"period": 7})], cache)
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_stream_produces_the_rendered_document(series):
+    columns = compute(series, [(name, None) for name in INDICATORS], IndicatorCache())
+    assert b"".join(stream(series.rows, columns, chunk_rows=999)) == render(series.rows, columns)
+
+
+@pytest.mark.parametrize("data", [
+    {"close": 5},
+    {"close": "1,2,3"},
+    {"close": [[1, 2], [3, 4]]},
+    {"close": [1, 2, None, 4, 5, 6]},
+    {"close": [1, 2, float("inf")]},
+    {"open": [1, 2, 3]},
+    {"close": [1, 2, 3], "high": [1, 2]},
+])
+def test_invalid_series_raise_indicator_error(data):
+    with pytest.raises(IndicatorError):
+        Series.from_mapping(data, max_rows=100)
+
+
+@pytest.mark.parametrize("content, filename", [
+    (b"", "prices.csv"),
+    (b'close\n1\n"2', "prices.csv"),
+    (b"close,open\n1,2\n,3\n", "prices.csv"),
+    (b"close\n1\nabc\n", "prices.csv"),
+    (b"not parquet", "prices.parquet"),
+])
+def test_unreadable_uploads_raise_indicator_error(content, filename):
+    pytest.importorskip("pandas")
+    with pytest.raises(IndicatorError):
+        Series.from_upload(content, filename, max_rows=100)
+
+
+def test_csv_upload():
+    pytest.importorskip("pandas")
+    series = Series.from_upload(b"Date,Close,High,Low\n2024-01-01,1,2,0.5\n2024-01-02,2,3,1.5\n", "prices.csv", 100)
+    assert series.rows == 2
+    assert sorted(series.columns) == ["close", "high", "low"]
+    assert math.isclose(compute(series, [("sma", {"period": 2})], IndicatorCache())["sma_2"][1], 1.5)
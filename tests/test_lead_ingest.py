@@ -0,0 +1,145 @@
+import asyncio
+
+import pytest
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from lead_ingest import LeadIngestor, dedupe_leads, import_leads_csv, write_leads
+
+
+class Result:
+    def __init__(self, upserted_count):
+        self.upserted_count = upserted_count
+
+
+class FlakyCollection:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.batches = []
+        self.docs = {}
+
+    async def bulk_write(self, operations, ordered=True):
+        if self.failures:
+            self.failures -= 1
+            raise AutoReconnect("primary stepped down")
+        self.batches.append(len(operations))
+        upserted = 0
+        for operation in operations:
+            email = operation._filter["email"]
+            if email not in self.docs:
+                self.docs[email] = operation._doc["$setOnInsert"]
+                upserted += 1
+        return Result(upserted)
+
+
+async def ingest(collection, emails, **kwargs):
+    ingestor = LeadIngestor(collection, flush_interval=0.01, **kwargs)
+    ingestor.start()
+    for email in emails:
+        ingestor.submit(email)
+    await asyncio.sleep(0.3)
+    await ingestor.stop()
+    return ingestor
+
+
+def test_submissions_are_coalesced_into_one_bulk_write():
+    collection = FlakyCollection()
+    ingestor = asyncio.run(ingest(collection, ["a@example.com", "b@example.com", "a@example.com"]))
+    assert collection.batches == [2]
+    assert set(collection.docs) == {"a@example.com", "b@example.com"}
+    assert collection.docs["a@example.com"]["welcome_pending"] is True
+    assert ingestor.upserted == 2
+
+
+def test_resubmitting_a_queued_email_returns_the_queued_lead():
+    async def run():
+        ingestor = LeadIngestor(FlakyCollection(), flush_interval=60)
+        first = ingestor.submit("a@example.com", "Ann")
+        again = ingestor.submit("a@example.com", "Someone else")
+        return first, again, ingestor.queued("a@example.com"), ingestor.pending
+
+    first, again, queued, pending = asyncio.run(run())
+    assert again is first and queued is first
+    assert (first["name"], pending) == ("Ann", 1)
+
+
+def test_queued_leads_are_forgotten_once_written():
+    collection = FlakyCollection(failures=1)
+    ingestor = asyncio.run(ingest(collection, ["a@example.com"]))
+    assert ingestor.queued("a@example.com") is None
+    assert list(collection.docs) == ["a@example.com"]
+
+
+def test_csv_import_reads_in_batches_and_skips_invalid_rows():
+    collection = FlakyCollection()
+    lines = ["email,name\n"] + [f"user{i}@example.com,User {i}\n" for i in range(5)] + [
+        "not-an-email,Nobody\n", "user0@example.com,Duplicate\n", ",\n",
+    ]
+    result = asyncio.run(import_leads_csv(collection, iter(lines), batch_size=3))
+    assert result == {"imported": 5, "skipped": 2}
+    assert collection.batches == [3, 2, 1]
+    assert collection.docs["user0@example.com"]["name"] == "User 0"
+
+
+def test_failed_flush_is_retried_not_dropped():
+    collection = FlakyCollection(failures=2)
+    ingestor = asyncio.run(ingest(collection, [f"user{i}@example.com" for i in range(5)]))
+    assert len(collection.docs) == 5
+    assert ingestor.errors == 2
+    assert ingestor.pending == 0
+
+
+def test_stop_flushes_queued_leads():
+    async def run():
+        collection = FlakyCollection()
+        ingestor = LeadIngestor(collection, flush_interval=60)
+        ingestor.start()
+        ingestor.submit("late@example.com")
+        await ingestor.stop()
+        return collection
+
+    assert list(asyncio.run(run()).docs) == ["late@example.com"]
+
+
+def test_permanent_document_errors_are_dropped():
+    class RejectingCollection:
+        async def bulk_write(self, operations, ordered=True):
+            raise BulkWriteError({"nUpserted": 1, "writeErrors": [
+                {"index": 1, "code": 11000, "errmsg": "duplicate key"},
+                {"index": 2, "code": 121, "errmsg": "Document failed validation"},
+            ]})
+
+    leads = [{"email": f"user{i}@example.com"} for i in range(3)]
+    assert asyncio.run(write_leads(RejectingCollection(), leads)) == 1
+
+
+def test_write_concern_errors_propagate_for_retry():
+    class UnacknowledgedCollection:
+        async def bulk_write(self, operations, ordered=True):
+            raise BulkWriteError({"nUpserted": 0, "writeErrors": [], "writeConcernErrors": [{"code": 64}]})
+
+    with pytest.raises(BulkWriteError):
+        asyncio.run(write_leads(UnacknowledgedCollection(), [{"email": "a@example.com"}]))
+
+
+def test_dedupe_keeps_earliest_lead_and_sent_welcome():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+
+    async def run():
+        collection = mongomock_motor.AsyncMongoMockClient()["test"].email_leads
+        await collection.insert_many([
+            {"email": "a@example.com", "name": "first", "welcome_pending": True},
+            {"email": "a@example.com", "name": "second"},
+            {"email": "b@example.com", "welcome_pending": True},
+            {"email": "b@example.com", "welcome_pending": True},
+            {"email": "c@example.com"},
+        ])
+        removed = await dedupe_leads(collection)
+        return removed, [doc async for doc in collection.find({}, {"_id": 0}).sort("email")]
+
+    removed, leads = asyncio.run(run())
+    assert removed == 2
+    assert leads == [
+        {"email": "a@example.com", "name": "first"},
+        {"email": "b@example.com", "welcome_pending": True},
+        {"email": "c@example.com"},
+    ]
@@ -0,0 +1,91 @@
+import asyncio
+
+import orjson
+
+from market_data import MarketHub
+
+
+def tick(symbol, price):
+    return {"s": symbol, "p": price, "v": 1, "t": 0}
+
+
+class Client:
+    """An in-process connection that subscribes to ``symbols`` and records what it is sent."""
+
+    def __init__(self, *symbols, stalled=False):
+        self.messages = [orjson.dumps({"action": "subscribe", "symbols": list(symbols)}).decode()]
+        self.frames = []
+        self.gate = asyncio.Event()
+        self.stalled = stalled
+        if not stalled:
+            self.gate.set()
+
+    async def receive(self):
+        if self.messages:
+            return self.messages.pop()
+        return await asyncio.get_running_loop().create_future()
+
+    async def send(self, frame):
+        # A stalled client is one whose socket buffer never drains.
+        await self.gate.wait()
+        self.frames.append(orjson.loads(frame))
+
+    def ticks(self):
+        return [[(t["s"], t["p"]) for t in frame["data"]] for frame in self.frames if frame["type"] == "ticks"]
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_a_slow_client_gets_the_latest_tick_per_symbol():
+    async def run():
+        hub = MarketHub()
+        hub.publish([tick("AAPL", 1.0)])
+        client = Client("AAPL", "MSFT")
+        client.gate.clear()
+        task = asyncio.create_task(hub.serve(client.receive, client.send))
+        # The writer is now blocked sending the snapshot; everything published meanwhile waits in its outbox.
+        await settle()
+        hub.publish([tick("AAPL", 2.0), tick("MSFT", 5.0), tick("AAPL", 3.0), tick("AAPL", 4.0), tick("TSLA", 9.0)])
+        client.gate.set()
+        await settle()
+        stats = hub.stats()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await hub.stop()
+        return client, stats, hub.stats()
+
+    client, stats, closed = asyncio.run(run())
+    assert client.frames[0] == {"type": "subscribed", "symbols": ["AAPL", "MSFT"]}
+    assert client.ticks() == [[("AAPL", 1.0)], [("AAPL", 4.0), ("MSFT", 5.0)]]
+    assert stats == {"connections": 1, "symbols": 2, "published": 6, "conflated": 2, "slow_disconnects": 0}
+    # A closed connection's conflation still counts.
+    assert closed["conflated"] == 2 and closed["connections"] == 0 and closed["symbols"] == 0
+
+
+def test_a_stalled_client_is_disconnected_without_holding_up_the_others():
+    async def run():
+        hub = MarketHub(send_timeout=0.1)
+        stalled, fast = Client("AAPL", stalled=True), Client("AAPL")
+        stalled_task = asyncio.create_task(hub.serve(stalled.receive, stalled.send))
+        fast_task = asyncio.create_task(hub.serve(fast.receive, fast.send))
+        await settle()
+        hub.publish([tick("AAPL", 1.0)])
+        await settle()
+        delivered = fast.ticks()
+        await asyncio.wait_for(stalled_task, 1)
+        hub.publish([tick("AAPL", 2.0)])
+        await settle()
+        stats = hub.stats()
+        fast_task.cancel()
+        await asyncio.gather(fast_task, return_exceptions=True)
+        await hub.stop()
+        return delivered, fast, stalled, stats
+
+    delivered, fast, stalled, stats = asyncio.run(run())
+    assert delivered == [[("AAPL", 1.0)]]
+    assert fast.ticks() == [[("AAPL", 1.0)], [("AAPL", 2.0)]]
+    assert stalled.frames == []
+    assert stats["slow_disconnects"] == 1 and stats["connections"] == 1
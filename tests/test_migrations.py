@@ -0,0 +1,85 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from pymongo.errors import AutoReconnect
+
+from migrations import ISO_DATES_MIGRATION, migrate_iso_dates
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+class CrashingUsers:
+    """``users`` whose bulk writes fail after ``writes`` batches, like a primary stepping down mid-run."""
+
+    def __init__(self, collection, writes):
+        self.collection = collection
+        self.writes = writes
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    async def bulk_write(self, operations, **kwargs):
+        if self.writes == 0:
+            raise AutoReconnect("primary stepped down")
+        self.writes -= 1
+        return await self.collection.bulk_write(operations, **kwargs)
+
+
+class Database:
+    def __init__(self, db, users=None):
+        self.db = db
+        self.users = users or db.users
+
+    def __getattr__(self, name):
+        return self.db[name]
+
+    def __getitem__(self, name):
+        return self.users if name == "users" else self.db[name]
+
+
+def users(n):
+    return [{"_id": i, "created_at": f"2025-01-{i % 28 + 1:02d}T12:00:00"} for i in range(n)]
+
+
+def test_strings_become_utc_dates_and_a_completed_run_is_not_repeated():
+    async def run():
+        db = mongomock_motor.AsyncMongoMockClient(tz_aware=True)["test"]
+        native = datetime(2024, 6, 1, tzinfo=timezone.utc)
+        await db.users.insert_many(users(3) + [{"_id": 3, "created_at": native}])
+        await db.user_sessions.insert_one({"_id": 1, "expires_at": "2025-02-01T00:00:00+02:00", "created_at": native})
+        first = await migrate_iso_dates(db, batch_size=2)
+        await db.users.insert_one({"_id": 9, "created_at": "2025-03-01T00:00:00"})
+        second = await migrate_iso_dates(db, batch_size=2)
+        return (first, second, [doc async for doc in db.users.find().sort("_id")],
+                await db.user_sessions.find_one({"_id": 1}), await db.migrations.find_one({"_id": ISO_DATES_MIGRATION}))
+
+    first, second, stored, session, marker = asyncio.run(run())
+    assert first == {"users": 3, "user_sessions": 1, "blog_posts": 0, "email_leads": 0}
+    assert second == {}
+    assert stored[0]["created_at"] == datetime(2025, 1, 1, 12, tzinfo=timezone.utc)
+    assert stored[3]["created_at"] == datetime(2024, 6, 1, tzinfo=timezone.utc)
+    assert stored[4]["created_at"] == "2025-03-01T00:00:00"
+    assert session["expires_at"] == datetime(2025, 1, 31, 22, tzinfo=timezone.utc)
+    assert marker["converted"] == first
+
+
+def test_a_crashed_run_resumes_after_its_last_checkpoint():
+    async def run():
+        db = mongomock_motor.AsyncMongoMockClient(tz_aware=True)["test"]
+        await db.users.insert_many(users(5))
+        with pytest.raises(AutoReconnect):
+            await migrate_iso_dates(Database(db, CrashingUsers(db.users, writes=1)), batch_size=2)
+        checkpoint = await db.migrations.find_one({"_id": f"{ISO_DATES_MIGRATION}:users"})
+        completed = await db.migrations.find_one({"_id": ISO_DATES_MIGRATION})
+        # Had the checkpoint been ignored, the resumed run would rescan documents 0 and 1.
+        await db.users.update_many({"_id": {"$lte": 1}}, {"$set": {"created_at": "2000-01-01T00:00:00"}})
+        resumed = await migrate_iso_dates(db, batch_size=2)
+        return checkpoint, completed, resumed, [doc["created_at"] async for doc in db.users.find().sort("_id")]
+
+    checkpoint, completed, resumed, dates = asyncio.run(run())
+    assert checkpoint["last_id"] == 1
+    assert completed is None
+    assert resumed["users"] == 3
+    assert dates[:2] == ["2000-01-01T00:00:00"] * 2
+    assert all(isinstance(value, datetime) for value in dates[2:])
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+from pymongo.errors import AutoReconnect
+
+from post_analytics import READ, VIEW, HyperLogLog, ViewRecorder, popular_posts
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+class FlakyStats:
+    """``post_stats_daily`` whose first ``failures`` bulk writes fail."""
+
+    def __init__(self, collection, failures=0):
+        self.collection = collection
+        self.failures = failures
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    async def bulk_write(self, operations, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise AutoReconnect("primary stepped down")
+        return await self.collection.bulk_write(operations, **kwargs)
+
+
+def stats_collection():
+    return mongomock_motor.AsyncMongoMockClient(tz_aware=True)["test"].post_stats_daily
+
+
+def test_hyperloglog_estimates_distinct_items_and_merges_losslessly():
+    a, b, union = HyperLogLog(), HyperLogLog(), HyperLogLog()
+    for i in range(20_000):
+        (a if i % 2 else b).add(f"visitor{i}")
+        union.add(f"visitor{i}")
+    assert a.add("visitor1") is None  # a repeat never raises a register
+    merged = HyperLogLog()
+    merged.merge({str(index): rank for index, rank in enumerate(a.registers)})
+    merged.merge({str(index): rank for index, rank in enumerate(b.registers)})
+    assert merged.registers == union.registers
+    # 3 standard errors of 1.04 / sqrt(1024).
+    assert abs(union.count() - 20_000) < 0.1 * 20_000
+    assert HyperLogLog().count() == 0
+
+
+def test_views_from_several_workers_add_up_and_visitors_are_deduplicated():
+    async def run():
+        collection = stats_collection()
+        workers = [ViewRecorder(collection), ViewRecorder(collection)]
+        for i in range(300):
+            # Every visitor is seen by both workers; each read follows a view.
+            for worker in workers:
+                worker.record("risk", f"visitor{i % 100}", VIEW)
+            workers[i % 2].record("risk", f"visitor{i % 100}", READ)
+        workers[0].record("psychology", "visitor1", VIEW)
+        for worker in workers:
+            await worker.flush()
+        return await popular_posts(collection, days=1, limit=10), [worker.writes for worker in workers]
+
+    ranked, writes = asyncio.run(run())
+    assert [(post["slug"], post[VIEW], post[READ]) for post in ranked] == [("risk", 600, 300), ("psychology", 1, 0)]
+    assert 90 <= ranked[0]["unique_visitors"] <= 110
+    assert ranked[1]["unique_visitors"] == 1
+    # One upsert per (post, day), however many views it carries.
+    assert writes == [2, 1]
+
+
+def test_a_failed_flush_keeps_its_counts_for_the_next_one():
+    async def run():
+        collection = FlakyStats(stats_collection(), failures=1)
+        recorder = ViewRecorder(collection)
+        for i in range(50):
+            recorder.record("risk", f"visitor{i}")
+        await recorder.flush()
+        failed = (recorder.errors, recorder.pending, await collection.count_documents({}))
+        for i in range(50, 60):
+            recorder.record("risk", f"visitor{i}")
+        recorder.record("risk", "visitor0", READ)
+        await recorder.flush()
+        return failed, recorder, await popular_posts(collection, days=1, limit=1)
+
+    failed, recorder, ranked = asyncio.run(run())
+    assert failed == (1, 1, 0)
+    assert (recorder.flushes, recorder.pending) == (1, 0)
+    assert (ranked[0][VIEW], ranked[0][READ]) == (60, 1)
+    assert 55 <= ranked[0]["unique_visitors"] <= 65
+
+
+def test_stop_flushes_what_is_still_in_memory():
+    async def run():
+        collection = stats_collection()
+        recorder = ViewRecorder(collection, flush_interval=60)
+        recorder.start()
+        recorder.record("risk", "visitor")
+        await recorder.stop()
+        return await collection.find_one({"slug": "risk"})
+
+    stored = asyncio.run(run())
+    assert stored[VIEW] == 1 and stored["expires_at"] is not None
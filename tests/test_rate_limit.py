@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+
+import rate_limit
+from rate_limit import RateLimiter, RateLimits, RedisRateLimiter, client_address, parse_networks, parse_rate
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    return clock
+
+
+def test_parse_rate():
+    assert parse_rate("10/60") == (10, 60.0)
+    assert parse_rate("5") == (5, 1.0)
+
+
+def test_bursts_up_to_limit_then_refills(clock):
+    limiter = RateLimiter("login", 3, 60)
+    assert [limiter.hit("a") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.hit("a") == pytest.approx(20.0)
+    assert limiter.hit("b") == 0.0
+    clock.now += 20
+    assert limiter.hit("a") == 0.0
+    assert limiter.hit("a") > 0
+    assert limiter.rejected == 2
+
+
+def test_flooding_new_keys_never_blocks_new_users(clock):
+    limiter = RateLimiter("signup", 1, 3600, shards=1, max_keys=3)
+    assert [limiter.hit(f"attacker{i}") for i in range(10)] == [0.0] * 10
+    assert limiter.hit("new-user") == 0.0
+    assert len(limiter) == 3
+    assert limiter.early_evictions == limiter.evictions == 8
+
+
+def test_a_throttled_key_that_keeps_retrying_stays_throttled(clock):
+    limiter = RateLimiter("login_email", 2, 300, shards=1, max_keys=3)
+    limiter.hit("victim@example.com")
+    limiter.hit("victim@example.com")
+    for i in range(10):
+        # Each retry makes the bucket most recently used again.
+        assert limiter.hit("victim@example.com") > 0
+        limiter.hit(f"attacker{i}@example.com")
+    assert "victim@example.com" in limiter._shards[0][1]
+
+
+def test_evicting_a_refilled_bucket_is_not_early(clock):
+    limiter = RateLimiter("signup", 1, 60, shards=1, max_keys=2)
+    limiter.hit("a")
+    limiter.hit("b")
+    clock.now += 60
+    assert limiter.hit("c") == 0.0
+    assert (limiter.evictions, limiter.early_evictions) == (1, 0)
+    assert len(limiter) == 2
+
+
+def test_disabled_limits_allow_everything():
+    limits = RateLimits({"login_ip": "1/60"}, enabled=False)
+    assert asyncio.run(limits.check("login_ip", "1.2.3.4")) == 0.0
+    assert asyncio.run(limits.check("login_ip", "1.2.3.4")) == 0.0
+
+
+def test_shared_tier_fails_open_when_redis_is_down():
+    pytest.importorskip("redis")
+
+    async def run():
+        # Nothing listens on port 1, so every shared check fails to connect.
+        limits = RateLimits({"login_ip": "2/60"}, redis_url="redis://127.0.0.1:1/0")
+        try:
+            results = [await limits.check("login_ip", "1.2.3.4") for _ in range(3)]
+            return results, limits.shared_errors()
+        finally:
+            await limits.close()
+
+    results, errors = asyncio.run(run())
+    assert results[:2] == [0.0, 0.0]
+    assert results[2] > 0  # the per-worker limit still applies
+    assert errors == 2
+
+
+def test_shared_tier_allows_then_denies_with_retry_after_across_workers(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    import redis.asyncio
+
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis.asyncio, "from_url", lambda url, **kwargs: fakeredis.FakeAsyncRedis(server=server))
+
+    async def run():
+        # Two workers sharing one store.
+        workers = [RedisRateLimiter("login_ip", 2, 60, "redis://shared") for _ in range(2)]
+        try:
+            waits = [await workers[0].hit("1.2.3.4"), await workers[1].hit("1.2.3.4"),
+                     await workers[0].hit("1.2.3.4"), await workers[1].hit("5.6.7.8")]
+            ttl = await workers[0].redis.pttl("ta:ratelimit:login_ip:1.2.3.4")
+            return waits, ttl, workers[0].errors
+        finally:
+            for worker in workers:
+                await worker.close()
+
+    waits, ttl, errors = asyncio.run(run())
+    assert waits[:2] == [0.0, 0.0]
+    # The next token is one emission interval (30s) after the first hit.
+    assert 29 <= waits[2] <= 30
+    assert waits[3] == 0.0
+    assert 59_000 <= ttl <= 60_000
+    assert errors == 0
+
+
+TRUSTED = parse_networks("10.0.0.0/8, 127.0.0.1")
+
+
+def test_client_address_ignores_forwarded_for_from_untrusted_peers():
+    assert client_address("203.0.113.7", "1.1.1.1", TRUSTED) == "203.0.113.7"
+    assert client_address("203.0.113.7", "1.1.1.1", []) == "203.0.113.7"
+
+
+def test_client_address_takes_the_first_untrusted_hop_from_the_right():
+    assert client_address("10.0.0.5", "203.0.113.7", TRUSTED) == "203.0.113.7"
+    # The client prepended a forged hop; the proxies appended the real one.
+    assert client_address("10.0.0.5", "1.1.1.1, 203.0.113.7, 127.0.0.1", TRUSTED) == "203.0.113.7"
+    assert client_address("10.0.0.5", "not-an-ip", TRUSTED) == "not-an-ip"
+    assert client_address("10.0.0.5", None, TRUSTED) == "10.0.0.5"
+    assert client_address("10.0.0.5", "10.1.1.1", TRUSTED) == "10.1.1.1"
@@ -0,0 +1,117 @@
+from datetime import datetime, timezone
+
+import pytest
+
+import response_cache
+from response_cache import CachedResponse, ResponseCache
+
+BODY = b'{"posts": []}'
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache.time, "monotonic", clock)
+    return clock
+
+
+def test_etag_is_the_body_hash_and_matches_weak_and_listed_tags():
+    entry = CachedResponse(BODY, datetime(2026, 1, 2, 3, 4, 5), {"X-Next-Cursor": "abc"}, 60)
+    assert entry.etag == CachedResponse(BODY, None, {}, 60).etag
+    assert entry.etag != CachedResponse(BODY + b" ", None, {}, 60).etag
+    assert entry.headers["Last-Modified"] == "Fri, 02 Jan 2026 03:04:05 GMT"
+    assert entry.headers["X-Next-Cursor"] == "abc"
+    assert entry.matches(entry.etag)
+    assert entry.matches("W/" + entry.etag)
+    assert entry.matches('"stale", ' + entry.etag)
+    assert entry.matches("*")
+    assert not entry.matches('"stale"')
+    assert not entry.matches(None)
+
+
+def test_matching_request_gets_304_with_validators_and_no_body():
+    entry = CachedResponse(BODY, datetime(2026, 1, 2, tzinfo=timezone.utc), {}, 60)
+    response = entry.to_response(entry.etag)
+    assert (response.status_code, response.body) == (304, b"")
+    assert response.headers["etag"] == entry.etag
+    assert response.headers["cache-control"] == "public, max-age=60"
+    assert "last-modified" in response.headers
+    fresh = entry.to_response('"stale"')
+    assert (fresh.status_code, fresh.body) == (200, BODY)
+
+
+def test_entries_expire_after_max_age_and_on_version_bump(clock):
+    cache = ResponseCache(max_age=60)
+    cache.store("listing", BODY)
+    assert cache.get("listing") is not None
+    clock.now += 61
+    assert cache.get("listing") is None
+    cache.store("listing", BODY)
+    cache.bump_version()
+    assert cache.get("listing") is None
+    assert cache.stats() == {"version": 1, "size": 0, "hits": 1, "misses": 2}
+
+
+def test_least_recently_used_entry_is_dropped_first(clock):
+    cache = ResponseCache(maxsize=2)
+    cache.store("a", BODY)
+    cache.store("b", BODY)
+    cache.get("a")
+    cache.store("c", BODY)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+LARGE = b'{"content": "' + b"risk reward " * 200 + b'"}'
+
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, None),
+    ("", None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("gzip;q=0", None),
+    ("gzip;q=0, *", "br" if response_cache.brotli else None),
+    ("*;q=0.5", next(iter(response_cache.ENCODERS))),
+    ("deflate, GZIP;q=0.8", "gzip"),
+    ("gzip;q=oops", None),
+])
+def test_negotiation_follows_server_preference_among_accepted_codings(accept, expected):
+    assert response_cache.negotiate_encoding(accept) == expected
+
+
+def test_encoded_responses_decode_to_the_body_and_tag_their_coding():
+    import gzip
+
+    entry = CachedResponse(LARGE, None, {}, 60)
+    response = entry.to_response(None, "gzip")
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["etag"] == entry.etag[:-1] + '-gzip"'
+    assert gzip.decompress(response.body) == LARGE
+    # Revalidating with the encoded variant's tag still matches.
+    assert entry.to_response(response.headers["etag"], "gzip").status_code == 304
+    identity = entry.to_response(None, None)
+    assert "content-encoding" not in identity.headers and identity.body == LARGE
+
+
+def test_small_bodies_go_out_uncompressed():
+    response = CachedResponse(BODY, None, {}, 60).to_response(None, "gzip, br")
+    assert "content-encoding" not in response.headers and response.body == BODY
+
+
+def test_precompressed_bodies_are_served_as_is():
+    entry = CachedResponse(LARGE, None, {}, 60)
+    entry.precompress()
+    for encoding, encode in response_cache.PRECOMPRESS_ENCODERS.items():
+        assert entry.to_response(None, encoding).body == encode(LARGE)
+    if response_cache.brotli is not None:
+        assert response_cache.brotli.decompress(entry.to_response(None, "br").body) == LARGE
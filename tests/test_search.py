@@ -0,0 +1,70 @@
+import random
+
+from search import POSTINGS_BUDGET, SearchIndex
+
+VOCABULARY = [f"term{i}" for i in range(400)]
+# Zipf-like, so the first few dozen terms appear in most posts.
+WEIGHTS = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+
+
+def build(docs, budget):
+    index = SearchIndex(postings_budget=budget)
+    for post_id, fields in docs.items():
+        index.upsert(post_id, fields, {"post_id": post_id})
+    return index
+
+
+def ranked(index, query, limit=10):
+    return [summary["post_id"] for _, summary in index.search(query, limit)]
+
+
+def corpus(n_posts, seed=3):
+    rng = random.Random(seed)
+    return {
+        f"post{i}": {
+            "title": " ".join(rng.choices(VOCABULARY, WEIGHTS, k=6)),
+            "content": " ".join(rng.choices(VOCABULARY, WEIGHTS, k=rng.randint(50, 400))),
+        }
+        for i in range(n_posts)
+    }
+
+
+def test_truncation_misses_a_post_strong_on_every_term_but_top_on_none():
+    docs = {
+        "alpha": {"content": "alpha " * 20},
+        "beta": {"content": "beta " * 20},
+        "both": {"content": "alpha beta " * 5},
+    }
+    docs.update({f"filler{i}": {"content": "gamma"} for i in range(20)})
+    # One posting per term: each term's single strongest post.
+    assert "both" not in ranked(build(docs, 2), "alpha beta")
+    assert ranked(build(docs, None), "alpha beta")[0] == "both"
+
+
+def test_truncated_ranking_is_exact_while_every_term_fits_its_share():
+    docs = corpus(POSTINGS_BUDGET // 2)
+    truncated, exhaustive = build(docs, POSTINGS_BUDGET), build(docs, None)
+    for query in ("term0 term1", "term3 term40", "term7"):
+        assert ranked(truncated, query) == ranked(exhaustive, query)
+
+
+def test_single_term_queries_are_exact_at_any_budget():
+    docs = corpus(1000)
+    truncated, exhaustive = build(docs, 10), build(docs, None)
+    for query in ("term0", "term5", "term120"):
+        assert ranked(truncated, query) == ranked(exhaustive, query)
+
+
+def test_recall_of_common_multi_term_queries_against_exhaustive_ranking():
+    docs = corpus(3000)
+    truncated, exhaustive = build(docs, POSTINGS_BUDGET), build(docs, None)
+    rng = random.Random(5)
+    common, rare = [], []
+    for _ in range(50):
+        for terms, recalls in ((VOCABULARY[:60], common), (VOCABULARY[200:], rare)):
+            query = " ".join(rng.sample(terms, 3))
+            expected = set(ranked(exhaustive, query))
+            recalls.append(len(set(ranked(truncated, query)) & expected) / len(expected))
+    # The documented trade-off: common terms lose some of the top 10, rare ones nothing.
+    assert 0.75 <= sum(common) / len(common) < 1.0
+    assert sum(rare) / len(rare) == 1.0
@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import session_cache
+from session_cache import SessionCache
+
+LATER = datetime.now(timezone.utc) + timedelta(days=1)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(session_cache.time, "monotonic", clock)
+    return clock
+
+
+def test_hit_until_ttl_then_miss(clock):
+    cache = SessionCache(ttl=60)
+    cache.set("token", "alice", "user-a", LATER)
+    assert cache.get("token") == "alice"
+    clock.now += 61
+    assert cache.get("token") is None
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_entry_never_outlives_its_session(clock):
+    cache = SessionCache(ttl=60)
+    cache.set("token", "alice", "user-a", datetime.now(timezone.utc) - timedelta(seconds=1))
+    assert cache.get("token") is None
+
+
+def test_invalidate_user_evicts_every_token_of_that_user_only(clock):
+    cache = SessionCache()
+    cache.set("phone", "alice", "user-a", LATER)
+    cache.set("laptop", "alice", "user-a", LATER)
+    cache.set("other", "bob", "user-b", LATER)
+    cache.invalidate_user("user-a")
+    assert cache.get("phone") is None
+    assert cache.get("laptop") is None
+    assert cache.get("other") == "bob"
+    cache.invalidate_user("user-a")
+
+
+def test_invalidate_one_token(clock):
+    cache = SessionCache()
+    cache.set("phone", "alice", "user-a", LATER)
+    cache.set("laptop", "alice", "user-a", LATER)
+    cache.invalidate("phone")
+    cache.invalidate("unknown")
+    assert cache.get("phone") is None
+    assert cache.get("laptop") == "alice"
+
+
+def test_reused_token_is_no_longer_evicted_with_its_previous_user(clock):
+    cache = SessionCache()
+    cache.set("token", "alice", "user-a", LATER)
+    cache.set("token", "bob", "user-b", LATER)
+    cache.invalidate_user("user-a")
+    assert cache.get("token") == "bob"
+    cache.invalidate_user("user-b")
+    assert cache.get("token") is None
+
+
+def test_least_recently_used_entry_is_evicted_first(clock):
+    cache = SessionCache(maxsize=2)
+    cache.set("a", "alice", "user-a", LATER)
+    cache.set("b", "bob", "user-b", LATER)
+    cache.get("a")
+    cache.set("c", "carol", "user-c", LATER)
+    assert cache.get("b") is None
+    assert cache.get("a") == "alice"
+    assert cache.get("c") == "carol"
+    assert cache.stats()["evictions"] == 1
+    # The evicted token no longer counts against its user.
+    cache.invalidate_user("user-b")
+    assert len(cache) == 2
+
+
+def test_entries_cached_before_a_synced_revocation_are_dropped(clock, monkeypatch):
+    revoked_at = {}
+    cache = SessionCache(is_revoked=lambda user_id, cached_at: cached_at <= revoked_at.get(user_id, 0.0))
+    monkeypatch.setattr(session_cache.time, "time", lambda: 5000.0)
+    cache.set("phone", "alice", "user-a", LATER)
+    cache.set("other", "bob", "user-b", LATER)
+    # Another worker's logout, pulled in by the revocation sync.
+    revoked_at["user-a"] = 5001.0
+    assert cache.get("phone") is None
+    assert cache.get("other") == "bob"
+    # A session cached after the logout (a fresh login) is served.
+    monkeypatch.setattr(session_cache.time, "time", lambda: 5002.0)
+    cache.set("laptop", "alice", "user-a", LATER)
+    assert cache.get("laptop") == "alice"
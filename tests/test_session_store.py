@@ -0,0 +1,98 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from session_store import MongoSessionStore, RedisSessionStore, SessionStore
+
+
+def test_session_store_is_abstract():
+    with pytest.raises(TypeError):
+        SessionStore()
+
+    class Partial(SessionStore):
+        async def get(self, session_token):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_mongo_store_roundtrip_and_delete_user():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+
+    async def run():
+        store = MongoSessionStore(mongomock_motor.AsyncMongoMockClient(tz_aware=True)["test"].user_sessions)
+        expires_at = datetime.now(timezone.utc).replace(microsecond=0) + timedelta(days=7)
+        await store.create("token-a", "user-1", expires_at)
+        await store.create("token-b", "user-1", expires_at)
+        await store.create("token-c", "user-2", expires_at)
+        await store.create("token-c", "user-2", expires_at + timedelta(days=1), replace=True)
+        found = await store.get("token-a")
+        replaced = await store.get("token-c")
+        await store.delete_user("user-1")
+        return found, replaced, await store.get("token-b"), await store.get("token-c")
+
+    found, replaced, deleted, kept = asyncio.run(run())
+    assert found["user_id"] == "user-1"
+    assert replaced["expires_at"] - found["expires_at"] == timedelta(days=1)
+    assert deleted is None
+    assert kept["user_id"] == "user-2"
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    import redis.asyncio
+
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis.asyncio, "from_url",
+                        lambda url, **kwargs: fakeredis.FakeAsyncRedis(server=server, **kwargs))
+
+
+def test_redis_store_roundtrip_ttl_and_scripted_delete_user(fake_redis):
+    async def run():
+        store = RedisSessionStore("redis://sessions")
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        try:
+            await store.create("token-a", "user-1", now + timedelta(days=1))
+            await store.create("token-b", "user-1", now + timedelta(days=7))
+            await store.create("token-c", "user-2", now + timedelta(days=7))
+            await store.create("token-c", "user-2", now + timedelta(days=8), replace=True)
+            found = await store.get("token-a")
+            replaced = await store.get("token-c")
+            ttls = {
+                "token-a": await store.redis.ttl("ta:session:token-a"),
+                # Pushed out to the newest session, never pulled back in.
+                "user-1": await store.redis.ttl("ta:user_sessions:user-1"),
+            }
+            await store.delete_user("user-1")
+            left = sorted(await store.redis.keys("ta:*"))
+            return found, replaced, ttls, await store.get("token-b"), left, await store.get("token-c")
+        finally:
+            await store.close()
+
+    found, replaced, ttls, deleted, left, kept = asyncio.run(run())
+    assert found["user_id"] == "user-1"
+    assert replaced["expires_at"] - found["expires_at"] == timedelta(days=7)
+    assert 86_000 < ttls["token-a"] <= 86_400
+    assert 6 * 86_400 < ttls["user-1"] <= 7 * 86_400
+    assert deleted is None
+    assert left == ["ta:session:token-c", "ta:user_sessions:user-2"]
+    assert kept["user_id"] == "user-2"
+
+
+def test_redis_store_drops_expired_sessions(fake_redis):
+    async def run():
+        store = RedisSessionStore("redis://sessions")
+        try:
+            await store.create("token-a", "user-1", datetime.now(timezone.utc) + timedelta(days=1))
+            # What the TTL does once it runs out.
+            await store.redis.pexpire("ta:session:token-a", 1)
+            await asyncio.sleep(0.01)
+            return await store.get("token-a")
+        finally:
+            await store.close()
+
+    assert asyncio.run(run()) is None
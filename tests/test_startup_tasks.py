@@ -0,0 +1,91 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from startup_tasks import LOCK_ID, StartupLease, StartupStep, pending_required_steps, run_startup_steps
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+def make_db():
+    return mongomock_motor.AsyncMongoMockClient()["test"]
+
+
+def test_lease_is_exclusive_until_released():
+    async def run():
+        db = make_db()
+        first = StartupLease(db.migrations, "worker-a")
+        second = StartupLease(db.migrations, "worker-b")
+        assert await first.acquire()
+        assert not await second.acquire()
+        await first.release()
+        assert await second.acquire()
+        await second.release()
+
+    asyncio.run(run())
+
+
+def test_expired_lease_can_be_taken_over():
+    async def run():
+        db = make_db()
+        await db.migrations.insert_one(
+            {"_id": LOCK_ID, "owner": "dead-worker", "expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)}
+        )
+        lease = StartupLease(db.migrations, "worker-a")
+        assert await lease.acquire()
+        assert (await db.migrations.find_one({"_id": LOCK_ID}))["owner"] == "worker-a"
+        assert not await StartupLease(db.migrations, "dead-worker").renew()
+        await lease.release()
+
+    asyncio.run(run())
+
+
+def test_steps_run_once_and_followers_see_pending_steps():
+    calls = []
+    started = asyncio.Event()
+    finish = asyncio.Event()
+
+    async def slow_seed(db):
+        calls.append("seed")
+        started.set()
+        await finish.wait()
+
+    async def optional(db):
+        raise RuntimeError("flaky")
+
+    steps = [StartupStep(1, "seed", slow_seed), StartupStep(2, "optional", optional, required=False)]
+
+    async def run():
+        db = make_db()
+        leader = asyncio.create_task(run_startup_steps(db, steps, owner="worker-a"))
+        await started.wait()
+        follower = await run_startup_steps(db, steps, owner="worker-b")
+        assert follower["role"] == "follower"
+        assert await pending_required_steps(db, steps) == ["startup:0001:seed"]
+        finish.set()
+        report = await leader
+        assert report == {"role": "leader", "applied": ["startup:0001:seed"]}
+        assert await pending_required_steps(db, steps) == []
+        # The failed optional step is retried by the next worker to boot.
+        again = await run_startup_steps(db, steps, owner="worker-c")
+        assert again == {"role": "leader", "applied": []}
+
+    asyncio.run(run())
+    assert calls == ["seed"]
+
+
+def test_required_step_failure_fails_startup_and_stays_pending():
+    async def broken(db):
+        raise RuntimeError("cannot build index")
+
+    steps = [StartupStep(1, "indexes", broken)]
+
+    async def run():
+        db = make_db()
+        with pytest.raises(RuntimeError):
+            await run_startup_steps(db, steps, owner="worker-a")
+        assert await pending_required_steps(db, steps) == ["startup:0001:indexes"]
+        assert await db.migrations.find_one({"_id": LOCK_ID}) is None
+
+    asyncio.run(run())
@@ -0,0 +1,53 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from token_revocations import RevocationList
+
+
+def test_a_logout_on_one_worker_reaches_another_on_sync():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+
+    async def run():
+        collection = mongomock_motor.AsyncMongoMockClient(tz_aware=True)["test"].token_revocations
+        here, there = (RevocationList(collection, retention=timedelta(days=7)) for _ in range(2))
+        issued = time.time() - 60
+        await here.revoke("user-a")
+        before = there.is_revoked("user-a", issued)
+        await there.sync()
+        return here, there, issued, before
+
+    here, there, issued, before = asyncio.run(run())
+    assert here.is_revoked("user-a", issued)
+    assert not before
+    assert there.is_revoked("user-a", issued)
+    # Tokens issued after the logout, and other users' tokens, still pass.
+    assert not there.is_revoked("user-a", time.time() + 1)
+    assert not there.is_revoked("user-b", issued)
+
+
+def test_sync_is_incremental_and_forgets_revocations_past_retention():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+
+    async def run():
+        collection = mongomock_motor.AsyncMongoMockClient(tz_aware=True)["test"].token_revocations
+        revocations = RevocationList(collection, retention=timedelta(hours=1))
+        now = datetime.now(timezone.utc)
+        await collection.insert_many([
+            {"user_id": "recent", "revoked_at": now - timedelta(minutes=5), "expires_at": now + timedelta(minutes=55)},
+            {"user_id": "expired", "revoked_at": now - timedelta(hours=2), "expires_at": now - timedelta(hours=1)},
+        ])
+        await revocations.sync()
+        first = set(revocations._revoked_at)
+        # A later revocation of the same user moves its cutoff forward on the next sync.
+        await collection.update_one({"user_id": "recent"}, {"$set": {"revoked_at": now}})
+        revocations._revoked_at["stale"] = time.time() - 7200
+        await revocations.sync()
+        return first, revocations, now
+
+    first, revocations, now = asyncio.run(run())
+    assert first == {"recent"}
+    assert set(revocations._revoked_at) == {"recent"}
+    assert revocations.is_revoked("recent", (now - timedelta(minutes=1)).timestamp())
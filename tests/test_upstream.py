@@ -0,0 +1,126 @@
+import asyncio
+
+import httpx
+import pytest
+
+import upstream
+from upstream import CircuitBreaker, SessionExchangeClient, UpstreamRejected, UpstreamUnavailable
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(upstream.time, "monotonic", clock)
+    return clock
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.min_calls):
+        breaker.record(False)
+    assert breaker.state == "open"
+
+
+def test_opens_on_failure_rate_and_fails_fast(clock):
+    breaker = CircuitBreaker(threshold=0.5, min_calls=4)
+    for success in (True, True, False):
+        breaker.record(success)
+    assert breaker.state == "closed"
+    breaker.record(False)
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_old_outcomes_leave_the_window(clock):
+    breaker = CircuitBreaker(threshold=0.5, min_calls=4, window=30)
+    for _ in range(3):
+        breaker.record(False)
+    clock.now += 31
+    for _ in range(3):
+        breaker.record(True)
+    breaker.record(False)
+    assert breaker.state == "closed"
+
+
+def test_half_open_allows_one_trial_then_closes_or_reopens(clock):
+    breaker = CircuitBreaker(min_calls=2, reset_timeout=15)
+    open_breaker(breaker)
+    clock.now += 15
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+    breaker.record(False)
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    clock.now += 15
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == "closed"
+    assert breaker.allow() and breaker.allow()
+
+
+def client_for(handler, breaker):
+    client = SessionExchangeClient("http://upstream.test/session-data", breaker=breaker)
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+def test_cancelled_trial_releases_the_half_open_slot():
+    breaker = CircuitBreaker(min_calls=2, reset_timeout=0)
+    open_breaker(breaker)
+
+    async def hang(request):
+        await asyncio.sleep(60)
+
+    async def ok(request):
+        return httpx.Response(200, json={"email": "a@example.com"})
+
+    async def run():
+        slow = client_for(hang, breaker)
+        task = asyncio.create_task(slow.exchange("s1"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert breaker.state == "half_open"
+        return await client_for(ok, breaker).exchange("s2")
+
+    assert asyncio.run(run()) == {"email": "a@example.com"}
+    assert breaker.state == "closed"
+
+
+def test_exchange_records_outcomes_and_caches_success():
+    calls = []
+
+    async def handler(request):
+        calls.append(request.headers["X-Session-ID"])
+        session_id = request.headers["X-Session-ID"]
+        if session_id.startswith("garbled"):
+            return httpx.Response(200, text="<html>Bad gateway</html>" if session_id == "garbled" else "[1, 2]")
+        status = {"good": 200, "bad": 401, "down": 503}[session_id]
+        return httpx.Response(status, json={"session": session_id})
+
+    breaker = CircuitBreaker(min_calls=100)
+    client = client_for(handler, breaker)
+
+    async def run():
+        assert await client.exchange("good") == {"session": "good"}
+        assert await client.exchange("good") == {"session": "good"}
+        with pytest.raises(UpstreamRejected):
+            await client.exchange("bad")
+        with pytest.raises(UpstreamUnavailable):
+            await client.exchange("down")
+        for session_id in ("garbled", "garbled-list"):
+            with pytest.raises(UpstreamUnavailable):
+                await client.exchange(session_id)
+
+    asyncio.run(run())
+    assert calls == ["good", "bad", "down", "garbled", "garbled-list"]
+    assert [ok for _, ok in breaker._outcomes] == [True, True, False, False, False]